@@ -0,0 +1,117 @@
+"""Compare the in-process & shared memory result caches.
+
+Measures the time per `get` (hit & miss) & `set` of each cache in one
+process, then the combined hit rate of several forked workers answering
+queries for the same set of keys, where each worker stores the output of
+its misses.
+
+Usage:
+    python benchmarks/cache.py [--number N] [--workers N] [--keys N]
+"""
+
+# Standard Library
+import os
+import sys
+import random
+import timeit
+import argparse
+from pathlib import Path
+from multiprocessing import Pipe
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Project
+from hyperglass_agent.cache import ResultCache, SharedResultCache  # noqa: E402
+
+MAX_SIZE = 64 * 1024 ** 2
+VALUE_SIZES = (1024, 16 * 1024)
+
+
+def make_key(index):
+    """Create a cache key shaped like `cache.cache_key`'s."""
+    return ("frr", "ipv4_default", "default", "bgp_route", None, f"10.{index}.0.0/16")
+
+
+def make_caches(slot_size):
+    """Create one cache of each backend."""
+    return {
+        "memory": ResultCache(max_size=MAX_SIZE),
+        "shared": SharedResultCache(max_size=MAX_SIZE, slot_size=slot_size),
+    }
+
+
+def time_operations(number):
+    """Print the time per operation of each cache."""
+    print(f"{'backend':<9}{'value':>8}{'get hit':>12}{'get miss':>12}{'set':>12}")
+
+    for value_size in VALUE_SIZES:
+        value = "x" * value_size
+        for name, cache in make_caches(slot_size=64 * 1024).items():
+            keys = [make_key(i) for i in range(256)]
+            missing = make_key(1000)
+            for key in keys:
+                cache.set(key, value, 60)
+
+            results = []
+            for statement in (
+                lambda cache=cache, key=keys[7]: cache.get(key),
+                lambda cache=cache, key=missing: cache.get(key),
+                lambda cache=cache, key=keys[7], value=value: cache.set(key, value, 60),
+            ):
+                seconds = min(timeit.repeat(statement, number=number, repeat=3))
+                results.append(f"{seconds / number * 1e6:.2f}us")
+
+            print(f"{name:<9}{value_size:>8}" + "".join(f"{r:>12}" for r in results))
+
+
+def worker(cache, keys, queries, seed, conn):
+    """Answer random queries, caching misses, & send the hit count."""
+    # Only picks keys, & must be reproducible from a seed.
+    rng = random.Random(seed)  # noqa: S311
+    value = "x" * 1024
+    hits = 0
+    for _ in range(queries):
+        key = make_key(rng.randrange(keys))
+        if cache.get(key) is None:
+            cache.set(key, value, 60)
+        else:
+            hits += 1
+    conn.send(hits)
+    conn.close()
+
+
+def hit_rates(workers, keys, queries):
+    """Print the combined hit rate of forked workers sharing each cache."""
+    print(f"\n{workers} workers, {keys} keys, {queries} queries per worker")
+
+    for name, cache in make_caches(slot_size=4096).items():
+        receivers = []
+        for index in range(workers):
+            receiver, sender = Pipe(duplex=False)
+            if os.fork() == 0:
+                worker(cache, keys, queries, index, sender)
+                os._exit(0)
+            receivers.append(receiver)
+
+        hits = sum(receiver.recv() for receiver in receivers)
+        for _ in range(workers):
+            os.wait()
+
+        print(f"{name:<9}hit rate {hits / (workers * queries):.1%}")
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    time_operations(args.number)
+    hit_rates(args.workers, args.keys, args.queries)
+
+
+if __name__ == "__main__":
+    main()
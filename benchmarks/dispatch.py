@@ -0,0 +1,111 @@
+"""Measure per-request command construction overhead.
+
+Compares the original lookup path (attrgetter on the command model, target
+formatter map, pydantic `query.dict()` & `str.format`) with the prepared
+executors built by `hyperglass_agent.dispatch.build_dispatch`.
+
+Usage:
+    python benchmarks/dispatch.py [--number N]
+"""
+
+# Standard Library
+import sys
+import timeit
+import argparse
+import operator
+from types import SimpleNamespace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Project
+from hyperglass_agent.dispatch import target_format_map  # noqa: E402
+from hyperglass_agent.dispatch import parser_map, build_dispatch  # noqa: E402
+from hyperglass_agent.constants import SUPPORTED_QUERY  # noqa: E402
+from hyperglass_agent.models.request import Request  # noqa: E402
+from hyperglass_agent.models.commands import Commands  # noqa: E402
+
+TARGETS = {
+    "bgp_route": "192.0.2.0/24",
+    "bgp_aspath": "_65000_",
+    "bgp_community": "65000:1",
+    "ping": "192.0.2.1",
+    "traceroute": "192.0.2.1",
+}
+
+
+def legacy_command(mode, commands, query, target):
+    """Construct a command as `execute.run_query` did before dispatch."""
+    query.target = target
+    parser_map[mode]
+    target_formatter = target_format_map[mode].get(query.query_type)
+
+    if target_formatter is not None:
+        query.target = target_formatter(query.target)
+
+    command_raw = operator.attrgetter(".".join([mode, query.afi, query.query_type]))(
+        commands
+    )
+
+    return command_raw.format(**query.dict())
+
+
+def dispatch_command(dispatch, query, target):
+    """Construct a command with a prepared executor."""
+    query.target = target
+    executor = dispatch[(query.afi, query.query_type)]
+    executor.parser
+    return executor.command(query)
+
+
+def main():
+    """Run the benchmark & print the per-request cost of each path."""
+    cli = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cli.add_argument("--number", type=int, default=100_000)
+    args = cli.parse_args()
+
+    commands = Commands()
+    ttl = SimpleNamespace(**{query_type: 0 for query_type in SUPPORTED_QUERY})
+    deadline = SimpleNamespace(**{query_type: 1 for query_type in SUPPORTED_QUERY})
+
+    print(f"{'mode':<6}{'query_type':<16}{'legacy':>12}{'dispatch':>12}{'speedup':>10}")
+
+    for mode in ("frr", "bird"):
+        params = SimpleNamespace(
+            mode=mode,
+            structured=False,
+            cache=SimpleNamespace(ttl=ttl),
+            deadline=deadline,
+        )
+        dispatch = build_dispatch(params, commands)
+
+        for query_type, target in TARGETS.items():
+            query = Request(
+                query_type=query_type,
+                vrf="default",
+                afi="ipv4_default",
+                source="192.0.2.254",
+                target=target,
+            )
+            legacy = timeit.timeit(
+                lambda mode=mode, query=query, target=target: legacy_command(
+                    mode, commands, query, target
+                ),
+                number=args.number,
+            )
+            prepared = timeit.timeit(
+                lambda dispatch=dispatch, query=query, target=target: (
+                    dispatch_command(dispatch, query, target)
+                ),
+                number=args.number,
+            )
+            print(
+                f"{mode:<6}{query_type:<16}"
+                f"{legacy / args.number * 1e6:>10.2f}us"
+                f"{prepared / args.number * 1e6:>10.2f}us"
+                f"{legacy / prepared:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+"""Measure end-to-end `/query/` latency, throughput & peak memory.
+
+Starts an agent against the stand-in daemons in `daemons/`, which answer
+from generated tables of `--routes` routes per IP version (see `tables.py`),
+& sends signed queries of each query type from `--concurrency` concurrent
+clients, using the load generator of the `hyperglass-agent bench` command.
+Latency percentiles, throughput, errors & the peak RSS of the agent's
+processes are reported for each query type.
+
+Results are saved as JSON to `--output`, by default a file in `baselines/`
+named after the options. If the file already exists, the previous results are
+compared to the new results before they are replaced. Any other results file
+may be compared with `--compare`.
+
+Usage:
+    python benchmarks/query.py [--mode frr|bird] [--routes 10k|100k|1m|N]
+        [--pool] [--rib] [--cache] [--structured] [--workers N]
+        [--set KEY=VALUE ...] [--requests N] [--concurrency N]
+        [--output FILE] [--compare FILE]
+"""
+
+# Standard Library
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import datetime
+import platform
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from ipaddress import ip_address
+
+# Third Party
+import jwt
+import yaml
+import httpx
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Third Party
+from tables import (  # noqa: E402
+    BASES,
+    SIZES,
+    ORIGINS,
+    HOST_BITS,
+    COMMUNITIES,
+    FIRST_ORIGIN,
+    COMMUNITY_ASN,
+    SIZE_VARIABLE,
+)
+
+# Project
+from hyperglass_agent.cli.bench import run_load  # noqa: E402
+
+BENCHMARKS = Path(__file__).resolve().parent
+DAEMONS = BENCHMARKS / "daemons"
+
+AGENT_COMMAND = "from hyperglass_agent.api import web; web.start()"
+
+QUERY_TYPES = ("bgp_route", "bgp_aspath", "bgp_community")
+
+SECRET = "benchmark"
+PORT = 18080
+
+# Seconds between samples of the agent's memory usage.
+RSS_INTERVAL = 0.05
+
+# Metrics compared between runs, & whether a higher value is better.
+COMPARED = (
+    ("p50", False),
+    ("p90", False),
+    ("p99", False),
+    ("throughput", True),
+    ("peak_rss", False),
+)
+
+# Changes smaller than this fraction are not marked as better or worse.
+CHANGE_THRESHOLD = 0.05
+
+
+def agent_config(args, size, directory):
+    """Create the agent's configuration.
+
+    Arguments:
+        args {Namespace} -- Parsed arguments
+        size {int} -- Routes per IP version
+        directory {Path} -- Agent directory
+
+    Returns:
+        {dict} -- Configuration
+    """
+    config = {
+        "mode": args.mode,
+        "secret": SECRET,
+        "listen_address": "127.0.0.1",
+        "port": args.port,
+        "workers": args.workers,
+        "structured": args.structured,
+        "metrics": True,
+        "ssl": {"enable": False},
+        "logging": {"directory": str(directory)},
+        "pool": {
+            "enable": args.pool,
+            "vtysh": "vtysh -u",
+            "bird_socket": str(directory / "bird.ctl"),
+        },
+        "rib": {"enable": args.rib},
+        "cache": {"enable": args.cache},
+    }
+
+    for setting in args.set:
+        path, _, value = setting.partition("=")
+        *parents, name = path.split(".")
+        section = config
+        for parent in parents:
+            section = section.setdefault(parent, {})
+        section[name] = yaml.safe_load(value)
+
+    return config
+
+
+def label(args, size):
+    """Name a set of options, i.e. `frr-100k-pool-cache`."""
+    names = {count: name for name, count in SIZES.items()}
+    parts = [args.mode, names.get(size, str(size))]
+    parts.extend(o for o in ("pool", "rib", "cache", "structured") if getattr(args, o))
+    if args.afi != "ipv4_default":
+        parts.append(args.afi)
+    if args.workers > 1:
+        parts.append(f"{args.workers}workers")
+    return "-".join(parts)
+
+
+class Agent:
+    """Agent process & stand-in BIRD control socket, if used."""
+
+    def __init__(self, args, size, directory):
+        """Configure an unstarted agent.
+
+        Arguments:
+            args {Namespace} -- Parsed arguments
+            size {int} -- Routes per IP version
+            directory {Path} -- Agent directory
+        """
+        self.args = args
+        self.directory = directory
+        self.log_path = directory / "agent.log"
+        self.url = f"http://127.0.0.1:{args.port}"
+        self.proc = None
+        self.socket_proc = None
+
+        with (directory / "config.yaml").open("w") as file:
+            yaml.safe_dump(agent_config(args, size, directory), file)
+
+        # SSL is disabled, but the certificate & key must exist.
+        for name in ("agent_cert.pem", "agent_key.pem"):
+            (directory / name).touch()
+
+        # The stand-ins are run with the interpreter running the benchmark.
+        paths = (str(DAEMONS), os.path.dirname(sys.executable), os.environ["PATH"])
+        self.env = dict(
+            os.environ,
+            PATH=os.pathsep.join(paths),
+            hyperglass_agent_directory=str(directory),
+            **{SIZE_VARIABLE: str(size)},
+        )
+
+    def start(self, timeout):
+        """Start the agent & wait for it to be ready.
+
+        Arguments:
+            timeout {float} -- Seconds to wait
+
+        Raises:
+            RuntimeError: Raised if the agent exits or is not ready in time.
+
+        Returns:
+            {float} -- Seconds taken to start
+        """
+        if self.args.mode == "bird" and self.args.pool:
+            self.socket_proc = subprocess.Popen(
+                (str(DAEMONS / "birdsock"), str(self.directory / "bird.ctl")),
+                env=self.env,
+            )
+
+        started = time.monotonic()
+        with self.log_path.open("w") as log:
+            self.proc = subprocess.Popen(
+                (sys.executable, "-c", AGENT_COMMAND),
+                cwd=str(BENCHMARKS.parent),
+                env=self.env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+
+        while not self.ready():
+            if self.proc.poll() is not None or time.monotonic() - started > timeout:
+                self.stop()
+                raise RuntimeError(f"Agent did not start:\n{self.log_path.read_text()}")
+            time.sleep(0.1)
+
+        return time.monotonic() - started
+
+    def ready(self):
+        """Determine if the agent is answering requests.
+
+        If table snapshots are enabled, the agent is not ready until it has
+        loaded the snapshot of the queried table, which it reports in its
+        metrics.
+
+        Returns:
+            {bool} -- True if ready
+        """
+        try:
+            response = httpx.get(f"{self.url}/metrics", timeout=5)
+        except (OSError, httpx.HTTPError):
+            return False
+
+        if response.status_code != 200:
+            return False
+        if not self.args.rib:
+            return True
+
+        snapshot = f'hyperglass_agent_rib_snapshot{{afi="{self.args.afi}"'
+        return any(line.startswith(snapshot) for line in response.text.splitlines())
+
+    def stop(self):
+        """Stop the agent & the control socket."""
+        for proc in (self.proc, self.socket_proc):
+            if proc is not None and proc.poll() is None:
+                proc.send_signal(signal.SIGINT)
+                try:
+                    proc.wait(30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+
+    def rss(self):
+        """Get the memory used by the agent's processes, excluding stand-ins.
+
+        Returns:
+            {int} -- Total resident set size in bytes
+        """
+        total = 0
+        try:
+            parent = psutil.Process(self.proc.pid)
+            for proc in [parent] + parent.children(recursive=True):
+                if not any(arg.startswith(str(DAEMONS)) for arg in proc.cmdline()):
+                    total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+        return total
+
+
+class PeakRss(threading.Thread):
+    """Sample the memory used by the agent, keeping the peak."""
+
+    def __init__(self, agent):
+        """Initialize an unstarted sampler."""
+        super().__init__(daemon=True)
+        self.agent = agent
+        self.peak = 0
+        self.running = True
+
+    def run(self):
+        """Sample until stopped."""
+        while self.running:
+            self.peak = max(self.peak, self.agent.rss())
+            time.sleep(RSS_INTERVAL)
+
+    def stop(self):
+        """Stop sampling.
+
+        Returns:
+            {int} -- Peak resident set size in bytes
+        """
+        self.running = False
+        self.join()
+        return max(self.peak, self.agent.rss())
+
+
+def make_target(query_type, version, size, rng):
+    """Create a random query target which matches routes in the tables."""
+    if query_type == "bgp_route":
+        route = BASES[version] + (rng.randrange(size) << HOST_BITS[version])
+        return str(ip_address(route + rng.randrange(1, 1 << HOST_BITS[version])))
+    if query_type == "bgp_aspath":
+        return f"_{FIRST_ORIGIN + rng.randrange(ORIGINS)}_"
+    return f"{COMMUNITY_ASN}:{rng.randrange(COMMUNITIES)}"
+
+
+def sign(payload):
+    """Encode a request payload as the hyperglass frontend does."""
+    now = datetime.datetime.utcnow()
+    claims = {
+        "payload": payload,
+        "nbf": now,
+        "iat": now,
+        "exp": now + datetime.timedelta(seconds=60),
+    }
+    encoded = jwt.encode(claims, SECRET, algorithm="HS256")
+    return encoded.decode() if isinstance(encoded, bytes) else encoded
+
+
+def decode(encoded):
+    """Decode a response JWT's payload."""
+    return jwt.decode(encoded, SECRET, algorithms=["HS256"])["payload"]
+
+
+def make_queries(args, query_type, size):
+    """Generate random queries of one type which match routes in the tables.
+
+    Arguments:
+        args {Namespace} -- Parsed arguments
+        query_type {str} -- Query type
+        size {int} -- Routes per IP version
+
+    Returns:
+        {Generator} -- Unvalidated queries
+    """
+    # Only picks query targets, & must be reproducible from a seed.
+    rng = random.Random(args.seed)  # noqa: S311
+    version = 6 if args.afi.startswith("ipv6") else 4
+    while True:
+        yield {
+            "query_type": query_type,
+            "vrf": "default",
+            "afi": args.afi,
+            "source": None,
+            "target": make_target(query_type, version, size, rng),
+        }
+
+
+def git_commit():
+    """Get the commit being benchmarked, if known."""
+    try:
+        completed = subprocess.run(
+            ("git", "rev-parse", "--short", "HEAD"),
+            cwd=str(BENCHMARKS),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.decode().strip()
+
+
+def print_results(results):
+    """Print the results of each query type."""
+    print(
+        f"{'query type':<15}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'q/s':>9}"
+        f"{'errors':>8}{'bytes':>10}{'peak MB':>9}"
+    )
+    for query_type, result in results.items():
+        values = [
+            f"{result[key]:.2f}" if result[key] is not None else "-"
+            for key in ("p50", "p90", "p99")
+        ]
+        row = f"{query_type:<15}" + "".join(f"{value:>9}" for value in values)
+        row += f"{result['throughput']:>9.1f}{sum(result['errors'].values()):>8}"
+        row += f"{result['output_bytes']:>10}{result['peak_rss'] / 2 ** 20:>9.1f}"
+        print(row)
+
+
+def compare(previous, current):
+    """Print the change of each compared metric from a previous run.
+
+    Arguments:
+        previous {dict} -- Previous results
+        current {dict} -- Current results
+    """
+    print(f"\nCompared to {previous['created']} ({previous.get('commit')}):")
+    if previous["options"] != current["options"]:
+        print("  warning: options differ from the previous run")
+
+    for query_type, result in current["results"].items():
+        old = previous["results"].get(query_type)
+        if old is None:
+            continue
+        changes = []
+        for key, higher_is_better in COMPARED:
+            if not old.get(key) or result.get(key) is None:
+                continue
+            change = (result[key] - old[key]) / old[key]
+            marker = " "
+            if abs(change) >= CHANGE_THRESHOLD:
+                marker = "+" if (change > 0) == higher_is_better else "-"
+            changes.append(f"{key} {change:+.1%}{marker}")
+        print(f"  {query_type:<15}" + "  ".join(changes))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("frr", "bird"), default="frr")
+    parser.add_argument("--routes", default="10k", help="10k, 100k, 1m or a number")
+    parser.add_argument("--afi", default="ipv4_default")
+    parser.add_argument("--pool", action="store_true")
+    parser.add_argument("--rib", action="store_true")
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--structured", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Set a config value, i.e. limits.enable=false",
+    )
+    parser.add_argument(
+        "--query-types", nargs="+", choices=QUERY_TYPES, default=QUERY_TYPES
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args()
+
+    size = SIZES.get(args.routes.lower()) or int(args.routes)
+    output = args.output or BENCHMARKS / "baselines" / f"{label(args, size)}.json"
+    previous_path = args.compare or (output if output.exists() else None)
+
+    options = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "compare", "port", "timeout", "startup_timeout")
+    }
+    options["routes"] = size
+    # Compare options as they are read from previous results.
+    options = json.loads(json.dumps(options))
+
+    with tempfile.TemporaryDirectory() as directory:
+        agent = Agent(args, size, Path(directory))
+        startup = agent.start(args.startup_timeout)
+        try:
+            print(f"{label(args, size)}: agent started in {startup:.1f}s")
+            idle_rss = agent.rss()
+            loop = asyncio.get_event_loop()
+            results = {}
+
+            for query_type in args.query_types:
+                sampler = PeakRss(agent)
+                sampler.start()
+                result = loop.run_until_complete(
+                    run_load(
+                        f"{agent.url}/query/",
+                        make_queries(args, query_type, size),
+                        sign=sign,
+                        decode=decode,
+                        requests=args.requests,
+                        concurrency=args.concurrency,
+                        timeout=args.timeout,
+                    )
+                )
+                results[query_type] = dict(
+                    result.summary()[query_type], peak_rss=sampler.stop()
+                )
+        finally:
+            agent.stop()
+
+    current = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "startup_seconds": startup,
+        "idle_rss": idle_rss,
+        "results": results,
+    }
+
+    print_results(results)
+
+    if previous_path is not None:
+        compare(json.loads(previous_path.read_text()), current)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(current, indent=2) + "\n")
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""Generated route tables replayed by the stand-in daemons in `daemons/`.
+
+Route `index` of a table is the same regardless of the table's size, so
+tables are never stored: the stand-ins compute the routes matching each
+command. Each IP version has a table of `size` routes:
+
+- IPv4 route `index` is the /24 `16.0.0.0 + index * 256`, & IPv6 route
+  `index` is the /56 `2001:db8:: + (index << 72)`.
+- Its AS path is one of `UPSTREAMS` followed by the origin AS,
+  `FIRST_ORIGIN + index % ORIGINS`, so each origin has `size / ORIGINS`
+  routes.
+- It has the community `65000:{index % COMMUNITIES}`, so each community has
+  `size / COMMUNITIES` routes.
+
+The size of the tables is read from the `HYPERGLASS_BENCH_ROUTES` environment
+variable by the stand-ins.
+"""
+
+# Standard Library
+import re
+import json
+import time
+from datetime import datetime
+from ipaddress import ip_network
+from collections import namedtuple
+
+SIZES = {"10k": 10000, "100k": 100000, "1m": 1000000}
+
+SIZE_VARIABLE = "HYPERGLASS_BENCH_ROUTES"
+
+BASES = {4: int(ip_network("16.0.0.0/8")[0]), 6: int(ip_network("2001:db8::/32")[0])}
+PREFIX_LENGTHS = {4: 24, 6: 56}
+HOST_BITS = {4: 8, 6: 72}
+
+UPSTREAMS = (174, 1299, 3356, 6939)
+NEXT_HOPS = {
+    4: ("192.0.2.1", "192.0.2.2", "192.0.2.3", "192.0.2.4"),
+    6: tuple(f"2001:db8:ffff::{hop}" for hop in range(1, 5)),
+}
+FIRST_ORIGIN = 64512
+ORIGINS = 1000
+COMMUNITY_ASN = 65000
+COMMUNITIES = 100
+
+# Routes were last updated up to a day after this time.
+UPDATED = 1577836800
+
+# Rows of output written at a time when dumping a table.
+CHUNK_ROUTES = 1000
+
+BIRD_BANNER = "BIRD 2.0.7 ready."
+
+# Preamble of FRR's `show bgp ...` table & detail output.
+FRR_PREAMBLE = (
+    "BGP table version is 1, local router ID is 192.0.2.254, vrf id 0\n"
+    "Default local pref 100, local AS 65000\n"
+)
+
+# Legend & column headings preceding the rows of FRR's table output.
+FRR_TABLE_HEADER = (
+    "Status codes:  s suppressed, d damped, h history, * valid, > best, "
+    "= multipath,\n"
+    "               i internal, r RIB-failure, S Stale, R Removed\n"
+    "Nexthop codes: @NNN nexthop's vrf id, < announce-nh-self\n"
+    "Origin codes:  i - IGP, e - EGP, ? - incomplete\n"
+    "\n"
+    "   Network          Next Hop            Metric LocPrf Weight Path\n"
+)
+
+Route = namedtuple(
+    "Route",
+    (
+        "version",
+        "prefix",
+        "network",
+        "length",
+        "next_hop",
+        "as_path",
+        "community",
+        "med",
+        "updated",
+    ),
+)
+
+FRR_SHOW = re.compile(
+    r"^show bgp (?:vrf \S+ )?ipv(?P<version>[46]) unicast"
+    r"(?: (?P<query>.*?))??(?P<json> json)?$"
+)
+BIRD_SHOW_ROUTE = re.compile(
+    r"^show route all(?: table master(?P<version>[46]))?(?: where (?P<filter>.*))?$"
+)
+
+
+def table_size(environ):
+    """Get the table size set for the stand-ins.
+
+    Arguments:
+        environ {dict} -- Environment variables
+
+    Returns:
+        {int} -- Routes per IP version
+    """
+    return int(environ.get(SIZE_VARIABLE, SIZES["10k"]))
+
+
+def route(version, index):
+    """Generate a route.
+
+    Arguments:
+        version {int} -- IP version
+        index {int} -- Route number
+
+    Returns:
+        {Route} -- Route
+    """
+    network = ip_network(
+        (BASES[version] + (index << HOST_BITS[version]), PREFIX_LENGTHS[version])
+    )
+    upstream = index % len(UPSTREAMS)
+    return Route(
+        version=version,
+        prefix=str(network),
+        network=str(network.network_address),
+        length=network.prefixlen,
+        next_hop=NEXT_HOPS[version][upstream],
+        as_path=(UPSTREAMS[upstream], FIRST_ORIGIN + index % ORIGINS),
+        community=(COMMUNITY_ASN, index % COMMUNITIES),
+        med=index % 10,
+        updated=UPDATED + index % 86400,
+    )
+
+
+def target_route(target, size):
+    """Find the route containing an address or prefix.
+
+    Arguments:
+        target {str} -- Address or prefix
+        size {int} -- Routes per IP version
+
+    Returns:
+        {Route|None} -- Route, or None if not in the table
+    """
+    try:
+        network = ip_network(target, strict=False)
+    except ValueError:
+        return None
+
+    version = network.version
+    if network.prefixlen < PREFIX_LENGTHS[version]:
+        return None
+
+    index = (int(network[0]) - BASES[version]) >> HOST_BITS[version]
+    if 0 <= index < size:
+        return route(version, index)
+    return None
+
+
+def origin_routes(version, asn, size):
+    """Generate the routes originated by an AS."""
+    if FIRST_ORIGIN <= asn < FIRST_ORIGIN + ORIGINS:
+        for index in range(asn - FIRST_ORIGIN, size, ORIGINS):
+            yield route(version, index)
+
+
+def community_routes(version, community, size):
+    """Generate the routes with a community."""
+    asn, value = community
+    if asn == COMMUNITY_ASN and 0 <= value < COMMUNITIES:
+        for index in range(value, size, COMMUNITIES):
+            yield route(version, index)
+
+
+def all_routes(version, size):
+    """Generate every route of a table."""
+    for index in range(size):
+        yield route(version, index)
+
+
+def matching_routes(version, query_type, target, size):
+    """Generate the routes of a table matching a query.
+
+    Arguments:
+        version {int} -- IP version
+        query_type {str|None} -- Query type, or None for every route
+        target {str} -- Query target, in any format containing its numbers
+        size {int} -- Routes per IP version
+
+    Returns:
+        {iter} -- Routes
+    """
+    numbers = [int(number) for number in re.findall(r"\d+", target)]
+
+    if query_type is None:
+        return all_routes(version, size)
+
+    if query_type == "bgp_route":
+        found = target_route(target, size)
+        return iter((found,) if found and found.version == version else ())
+
+    if query_type == "bgp_aspath" and numbers:
+        return origin_routes(version, numbers[-1], size)
+
+    if query_type == "bgp_community" and len(numbers) >= 2:
+        return community_routes(version, tuple(numbers[:2]), size)
+
+    return iter(())
+
+
+def chunks(rows, joiner="\n"):
+    """Join rows of output into chunks of `CHUNK_ROUTES` rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_ROUTES:
+            yield joiner.join(chunk) + joiner
+            chunk = []
+    if chunk:
+        yield joiner.join(chunk) + joiner
+
+
+def frr_entry(route):
+    """Format a route as `show bgp ... {prefix}` does."""
+    updated = time.strftime("%a %b %d %H:%M:%S %Y", time.localtime(route.updated))
+    as_path = " ".join(map(str, route.as_path))
+    community = "{}:{}".format(*route.community)
+    return (
+        f"BGP routing table entry for {route.prefix}\n"
+        "Paths: (1 available, best #1, table default)\n"
+        "  Advertised to non peer-group peers:\n"
+        f"  {route.next_hop}\n"
+        f"  {as_path}\n"
+        f"    {route.next_hop} from {route.next_hop} ({route.next_hop})\n"
+        f"      Origin IGP, metric {route.med}, valid, external, best\n"
+        f"      Community: {community}\n"
+        f"      Last update: {updated}\n"
+    )
+
+
+def frr_row(route):
+    """Format a route as a row of `show bgp ...` table output.
+
+    The network & next hop columns are 17 & 16 characters wide; longer
+    values are followed by a line break & the indentation of the next column.
+    """
+    network = route.prefix.ljust(17)
+    if len(route.prefix) >= 17:
+        network = route.prefix + "\n" + " " * 20
+
+    next_hop = route.next_hop.ljust(16)
+    if len(route.next_hop) >= 16:
+        next_hop = route.next_hop + "\n" + " " * 36
+
+    as_path = " ".join(map(str, route.as_path))
+    return f"*> {network}{next_hop}{route.med:>10}{'':>7}{0:>7} {as_path} i"
+
+
+def frr_table(routes, size):
+    """Format routes as `show bgp ... regexp|community {target}` does.
+
+    Nothing is output if no routes match.
+
+    Arguments:
+        routes {iter} -- Matching routes
+        size {int} -- Routes per IP version, i.e. the table's total paths
+
+    Returns:
+        {iter} -- Chunks of output
+    """
+    displayed = 0
+
+    def rows():
+        nonlocal displayed
+        for route in routes:
+            displayed += 1
+            yield frr_row(route)
+
+    for index, chunk in enumerate(chunks(rows())):
+        if index == 0:
+            yield FRR_PREAMBLE + FRR_TABLE_HEADER
+        yield chunk
+
+    if displayed:
+        yield f"\nDisplayed  {displayed} routes and {size} total paths\n"
+
+
+def frr_path(route):
+    """Format a route as a path of FRR's JSON table output."""
+    return {
+        "valid": True,
+        "bestpath": True,
+        "pathFrom": "external",
+        "prefix": route.network,
+        "prefixLen": route.length,
+        "network": route.prefix,
+        "metric": route.med,
+        "weight": 0,
+        "path": " ".join(map(str, route.as_path)),
+        "origin": "IGP",
+        "community": {"string": "{}:{}".format(*route.community)},
+        "nexthops": [{"ip": route.next_hop, "used": True}],
+    }
+
+
+def frr_prefix_json(route):
+    """Format a route as `show bgp ... {prefix} json` does."""
+    path = frr_path(route)
+    path["aspath"] = {"string": path.pop("path")}
+    path["bestpath"] = {"overall": True}
+    path["lastUpdate"] = {"epoch": route.updated}
+    return json.dumps({"prefix": route.prefix, "paths": [path]})
+
+
+def frr_table_json(routes):
+    """Format routes as `show bgp ... regexp {target} json` does."""
+    table = {route.prefix: [frr_path(route)] for route in routes}
+    return json.dumps({"tableVersion": 1, "routerId": "192.0.2.254", "routes": table})
+
+
+def frr_reply(command, size):
+    """Generate the output of a vtysh command.
+
+    Arguments:
+        command {str} -- vtysh command
+        size {int} -- Routes per IP version
+
+    Returns:
+        {iter} -- Chunks of output
+    """
+    match = FRR_SHOW.match(command.strip())
+    if match is None:
+        return iter(("% Unknown command: " + command + "\n",))
+
+    version = int(match.group("version"))
+    query = (match.group("query") or "").split(None, 1)
+    as_json = match.group("json") is not None
+
+    if query == ["summary"]:
+        return iter((json.dumps({f"ipv{version}Unicast": {"tableVersion": 1}}),))
+
+    if query == ["detail"]:
+        routes = all_routes(version, size)
+        return iter((FRR_PREAMBLE, *chunks(map(frr_entry, routes), "")))
+
+    if query and query[0] in ("regexp", "community"):
+        query_type = "bgp_aspath" if query[0] == "regexp" else "bgp_community"
+        routes = matching_routes(version, query_type, query[-1], size)
+        if as_json:
+            return iter((frr_table_json(routes),))
+        return frr_table(routes, size)
+
+    found = target_route(query[0], size) if query else None
+    if found is None or found.version != version:
+        return iter(("{}" if as_json else "% Network not in table\n",))
+    return iter((frr_prefix_json(found) if as_json else frr_entry(found),))
+
+
+def bird_route(route):
+    """Format a route as `show route all` does, as a list of lines."""
+    since = datetime.fromtimestamp(route.updated).strftime("%Y-%m-%d %H:%M:%S")
+    as_path = " ".join(map(str, route.as_path))
+    return [
+        f"{route.prefix:<20} unicast [peer{route.as_path[0]} {since}] * (100) "
+        f"[AS{route.as_path[-1]}i]",
+        f"\tvia {route.next_hop} on eth0",
+        "\tType: BGP univ",
+        "\tBGP.origin: IGP",
+        f"\tBGP.as_path: {as_path}",
+        f"\tBGP.next_hop: {route.next_hop}",
+        f"\tBGP.med: {route.med}",
+        "\tBGP.local_pref: 100",
+        "\tBGP.community: ({},{})".format(*route.community),
+    ]
+
+
+def bird_protocols():
+    """Format the output of `show protocols all`, as a list of lines."""
+    lines = ["Name       Proto      Table      State  Since         Info"]
+    for upstream in UPSTREAMS:
+        lines.extend(
+            (
+                f"peer{upstream:<6} BGP        ---        up     2020-01-01    "
+                "Established",
+                "  BGP state:          Established",
+            )
+        )
+        for version in (4, 6):
+            lines.extend(
+                (
+                    f"  Channel ipv{version}",
+                    "    State:          UP",
+                    f"    Table:          master{version}",
+                    "    Route change stats:     received   rejected   filtered",
+                    "      Import updates:              1          0          0",
+                    "      Import withdraws:            0          0        ---",
+                )
+            )
+    return lines
+
+
+def bird_routes(versions, query_type, where, size):
+    """Format the routes matching a `show route` filter, as lines."""
+    target = where.split()[0] if query_type == "bgp_route" else where
+    for version in versions:
+        routes = matching_routes(version, query_type, target, size)
+        for index, found in enumerate(routes):
+            if index == 0:
+                yield f"Table master{version}:"
+            yield from bird_route(found)
+
+
+def bird_show_protocols(match, size):
+    """Reply to `show protocols all`."""
+    return 1002, bird_protocols()
+
+
+def bird_show_route(match, size):
+    """Reply to `show route all`, optionally of one table & with a filter."""
+    where = match.group("filter") or ""
+    query_type = next(
+        (name for name, matches in BIRD_FILTERS.items() if matches(where)), None
+    )
+    if where and query_type is None:
+        return BIRD_SYNTAX_ERROR
+
+    versions = (4, 6)
+    if match.group("version") is not None:
+        versions = (int(match.group("version")),)
+
+    return 1007, bird_routes(versions, query_type, where, size)
+
+
+# Query types of `show route` filters, & how to recognise them.
+BIRD_FILTERS = {
+    "bgp_route": lambda where: where.endswith("~ net"),
+    "bgp_aspath": lambda where: "bgp_path" in where,
+    "bgp_community": lambda where: "bgp_community" in where,
+}
+
+# Replies to the commands the stand-in understands.
+BIRD_COMMANDS = (
+    (re.compile(r"^show protocols all$"), bird_show_protocols),
+    (BIRD_SHOW_ROUTE, bird_show_route),
+)
+
+BIRD_SYNTAX_ERROR = (9001, ["syntax error, unexpected CF_SYM_UNDEFINED"])
+
+
+def bird_reply(command, size):
+    """Generate the output of a BIRD command.
+
+    Arguments:
+        command {str} -- BIRD command
+        size {int} -- Routes per IP version
+
+    Returns:
+        {tuple} -- BIRD reply code & iterable of output lines
+    """
+    command = command.strip()
+    for pattern, reply in BIRD_COMMANDS:
+        match = pattern.match(command)
+        if match is not None:
+            return reply(match, size)
+    return BIRD_SYNTAX_ERROR
@@ -0,0 +1,236 @@
+"""Run the web server in multiple worker processes."""
+
+# Standard Library
+import os
+import time
+import signal
+import socket
+import asyncio
+
+# Project
+from hyperglass_agent.log import log
+from hyperglass_agent.exceptions import ConfigError, HyperglassAgentError
+
+# Workers which exit within this many seconds of starting are restarted after
+# a delay, which doubles each time up to MAX_RESTART_DELAY.
+MIN_UPTIME = 5
+MAX_RESTART_DELAY = 30
+
+# Seconds to wait for workers to exit after they are asked to stop.
+SHUTDOWN_TIMEOUT = 30
+
+# Signals forwarded from the supervisor to all workers.
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+def reuseport_socket(host, port):
+    """Create a socket bound to an address shared with other processes.
+
+    Arguments:
+        host {str} -- Listen address
+        port {int} -- Listen port
+
+    Raises:
+        ConfigError: Raised if SO_REUSEPORT is not supported.
+
+    Returns:
+        {socket} -- Bound socket
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise ConfigError("Multiple workers require SO_REUSEPORT support")
+
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+    except OSError as err:
+        sock.close()
+        raise ConfigError(
+            "Unable to listen on {host}:{port}: {err}", host=host, port=port, err=err
+        ) from None
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Fork web server workers which each listen on their own socket.
+
+    All sockets are bound to the same address with SO_REUSEPORT, so the
+    kernel balances connections between workers. Workers which exit are
+    restarted until the supervisor receives SIGINT or SIGTERM, which it
+    forwards to all workers. SIGHUP is forwarded to all workers, which each
+    reload the config, & workers restarted afterwards read the config again
+    before starting.
+
+    Workers are forked, rather than spawned, from a supervisor which has
+    already loaded the configuration. Each worker inherits the supervisor's
+    loguru sinks, and since they are added with `enqueue=True`, messages from
+    every worker are written by the supervisor's sink threads only.
+    """
+
+    def __init__(self, config, workers):
+        """Initialize a supervisor with no running workers.
+
+        Arguments:
+            config {uvicorn.Config} -- Server configuration
+            workers {int} -- Number of workers
+        """
+        self.config = config
+        self.workers = workers
+        self.should_exit = False
+        self.reloaded = False
+        self._pids = {}
+        self._started = [0.0] * workers
+        self._delays = [0] * workers
+
+    def _serve(self, index):
+        """Run a worker in a forked process, then exit it.
+
+        Arguments:
+            index {int} -- Worker number
+        """
+        code = 1
+        try:
+            # Signals from the terminal are only sent to the supervisor, which
+            # forwards them once.
+            os.setpgid(0, 0)
+            for signum in STOP_SIGNALS:
+                signal.signal(signum, signal.SIG_DFL)
+
+            # Each worker handles SIGHUP once its server has started.
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+            if self.reloaded:
+                from hyperglass_agent.execute import refresh_runtime
+
+                try:
+                    refresh_runtime()
+                except HyperglassAgentError as err:
+                    log.error("Unable to reload config in worker {}: {}", index, err)
+
+            self._run_server(index)
+            code = 0
+        except Exception as err:
+            log.critical("Worker {} failed: {!r}", index, err)
+        finally:
+            os._exit(code)
+
+    def _run_server(self, index):
+        """Run a worker's server until it is stopped.
+
+        Arguments:
+            index {int} -- Worker number
+        """
+        import uvicorn
+
+        # Never reuse the event loop of the supervisor.
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+        sock = reuseport_socket(self.config.host, self.config.port)
+        log.info("Worker {} started (pid {})", index, os.getpid())
+        uvicorn.Server(self.config).run(sockets=[sock])
+
+    def _spawn(self, index):
+        """Fork a worker.
+
+        Arguments:
+            index {int} -- Worker number
+        """
+        pid = os.fork()
+        if pid == 0:
+            self._serve(index)
+        self._pids[pid] = index
+        self._started[index] = time.monotonic()
+
+    def _handle_exit(self, signum, frame):
+        self.should_exit = True
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _handle_reload(self, signum, frame):
+        self.reloaded = True
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _restart(self, index, status):
+        """Restart an exited worker, delaying if it exited soon after starting.
+
+        Arguments:
+            index {int} -- Worker number
+            status {int} -- Exit status from os.waitpid
+        """
+        uptime = time.monotonic() - self._started[index]
+
+        delay = 0
+        if uptime < MIN_UPTIME:
+            delay = min(max(self._delays[index] * 2, 1), MAX_RESTART_DELAY)
+        self._delays[index] = delay
+
+        log.warning(
+            "Worker {} exited with status {} after {:.1f}s, restarting in {}s",
+            index,
+            status,
+            uptime,
+            delay,
+        )
+        time.sleep(delay)
+
+        if not self.should_exit:
+            self._spawn(index)
+
+    def _stop(self):
+        """Wait for workers to exit, killing any which don't in time."""
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        while self._pids and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.1)
+            else:
+                self._pids.pop(pid, None)
+
+        for pid in self._pids:
+            log.warning("Worker pid {} did not exit, killing", pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self._pids.clear()
+
+    def run(self):
+        """Start all workers & restart them as they exit until stopped.
+
+        Raises:
+            ConfigError: Raised if the listen address can't be bound.
+        """
+        # Fail before forking if no worker could bind the address.
+        reuseport_socket(self.config.host, self.config.port).close()
+
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, self._handle_exit)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        log.info("Starting {} workers (pid {})", self.workers, os.getpid())
+
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while not self.should_exit:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            index = self._pids.pop(pid, None)
+            if index is not None and not self.should_exit:
+                self._restart(index, status)
+
+        self._stop()
+        log.info("All workers stopped")
@@ -2,22 +2,56 @@
 
 # Standard Library
 import json
+import time
+import signal
+import asyncio
 
 # Third Party
 from fastapi import FastAPI, HTTPException
 from pydantic import ValidationError
 from fastapi.exceptions import RequestValidationError
-from starlette.responses import JSONResponse
+from starlette.requests import Request as HTTPRequest
+from starlette.responses import Response, JSONResponse, StreamingResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 # Project
 from hyperglass_agent import __title__, __version__, __description__
-from hyperglass_agent.log import log
+from hyperglass_agent.log import log, log_payload
 from hyperglass_agent.config import APP_PATH, params
-from hyperglass_agent.execute import run_query
+from hyperglass_agent.execute import (
+    reload,
+    run_query,
+    stream_query,
+    stop_backends,
+    start_backends,
+    current_runtime,
+)
+from hyperglass_agent.metrics import (
+    CONTENT_TYPE,
+    render,
+    count_error,
+    timed_stage,
+    observe_stage,
+    observe_output,
+    query_in_flight,
+)
 from hyperglass_agent.payload import jwt_decode, jwt_encode
-from hyperglass_agent.exceptions import HyperglassAgentError
-from hyperglass_agent.models.request import Request, EncodedRequest
+from hyperglass_agent.exceptions import (
+    QueryError,
+    ClientDisconnected,
+    HyperglassAgentError,
+    RetryableHyperglassError,
+)
+from hyperglass_agent.structured import dumps
+from hyperglass_agent.models.request import (
+    Request,
+    AdminRequest,
+    BatchRequest,
+    EncodedRequest,
+)
+
+# Seconds between checks for a disconnected client while a query executes.
+DISCONNECT_POLL_INTERVAL = 0.5
 
 CERT_PATH = APP_PATH / "agent_cert.pem"
 KEY_PATH = APP_PATH / "agent_key.pem"
@@ -44,6 +78,29 @@ api = FastAPI(
 )
 
 
+async def reload_config():
+    """Reload the config file, keeping the active config if it is invalid."""
+    try:
+        await reload()
+    except HyperglassAgentError as err:
+        log.error("Unable to reload config, keeping the active config: {}", err)
+
+
+@api.on_event("startup")
+async def startup():
+    """Start persistent daemon sessions before accepting queries."""
+    await start_backends()
+    asyncio.get_event_loop().add_signal_handler(
+        signal.SIGHUP, lambda: asyncio.ensure_future(reload_config())
+    )
+
+
+@api.on_event("shutdown")
+async def shutdown():
+    """Stop persistent daemon sessions."""
+    await stop_backends()
+
+
 @api.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request, exc):
     """Handle application errors.
@@ -56,7 +113,11 @@ async def http_exception_handler(request, exc):
         {str} -- JSON response
     """
     log.error(str(exc.detail))
-    return JSONResponse(content={"error": str(exc.detail)}, status_code=exc.status_code)
+    return JSONResponse(
+        content={"error": str(exc.detail)},
+        status_code=exc.status_code,
+        headers=getattr(exc, "headers", None),
+    )
 
 
 @api.exception_handler(RequestValidationError)
@@ -74,44 +135,506 @@ async def validation_exception_handler(request, exc):
     return JSONResponse(content={"error": str(exc)}, status_code=400)
 
 
+def http_error(err):
+    """Convert an agent error to an HTTP error.
+
+    Arguments:
+        err {HyperglassAgentError} -- Agent error
+
+    Returns:
+        {HTTPException} -- HTTP error
+    """
+    if isinstance(err, RetryableHyperglassError):
+        return HTTPException(
+            status_code=err.code,
+            detail=str(err),
+            headers={"Retry-After": str(err.retry_after)},
+        )
+    return HTTPException(status_code=err.code, detail=str(err))
+
+
+def describe_query(query):
+    """Describe a query in a request summary.
+
+    Arguments:
+        query {Request} -- Validated query, or None if it is invalid
+
+    Returns:
+        {str} -- Query type, AFI, VRF & target
+    """
+    if query is None:
+        return "invalid query"
+    return f"{query.query_type} {query.afi} {query.vrf} {query.target}"
+
+
+def describe_error(err):
+    """Describe an error returned to a client in a request summary.
+
+    Arguments:
+        err {Exception} -- Validation or agent error
+
+    Returns:
+        {str} -- Status code & exception class
+    """
+    code = 400 if isinstance(err, ValidationError) else err.code
+    return f"error {code} {type(err).__name__}"
+
+
+def log_summary(endpoint, description, outcome, started):
+    """Log a one-line summary of a request at INFO.
+
+    Arguments:
+        endpoint {str} -- Endpoint name
+        description {str} -- Query description
+        outcome {str} -- Output size, or error
+        started {float} -- Monotonic time the request was received
+    """
+    elapsed = (time.monotonic() - started) * 1000
+    log.opt(depth=1).info(
+        "{} {}: {} in {:.1f} ms", endpoint, description, outcome, elapsed
+    )
+
+
+async def decode_query(query, runtime):
+    """Decode and validate an encoded request.
+
+    Arguments:
+        query {EncodedRequest} -- Encoded JWT
+        runtime {Runtime} -- Runtime answering the request
+
+    Returns:
+        {Request} -- Validated query
+    """
+    log_payload("Raw Query JSON: ", query.json)
+
+    start = time.monotonic()
+    decrypted_query = await jwt_decode(query.encoded, params=runtime.params)
+    decrypted_query = json.loads(decrypted_query)
+    decoded = time.monotonic()
+
+    log_payload("Decrypted Query: ", decrypted_query)
+
+    validated_query = Request(**decrypted_query)
+    observe_stage("jwt_decode", validated_query, decoded - start)
+    observe_stage("validate", validated_query, time.monotonic() - decoded)
+    return validated_query
+
+
+async def decode_batch(query, runtime):
+    """Decode and validate an encoded batch request.
+
+    Arguments:
+        query {EncodedRequest} -- Encoded JWT
+        runtime {Runtime} -- Runtime answering the request
+
+    Raises:
+        QueryError: Raised if the batch contains too many queries.
+
+    Returns:
+        {BatchRequest} -- Validated batch, with unvalidated queries
+    """
+    log_payload("Raw Batch JSON: ", query.json)
+
+    with timed_stage("jwt_decode", None):
+        decrypted_query = await jwt_decode(query.encoded, params=runtime.params)
+        decrypted_query = json.loads(decrypted_query)
+
+    log_payload("Decrypted Batch: ", decrypted_query)
+
+    if isinstance(decrypted_query, list):
+        decrypted_query = {"queries": decrypted_query}
+
+    batch = BatchRequest.parse_obj(decrypted_query)
+
+    maximum = runtime.params.limits.batch_size
+    if len(batch.queries) > maximum:
+        raise QueryError(
+            "Batch of {count} queries exceeds the maximum of {maximum}",
+            count=len(batch.queries),
+            maximum=maximum,
+        )
+    return batch
+
+
+async def run_batch_query(raw_query, runtime):
+    """Validate and run one query of a batch.
+
+    Arguments:
+        raw_query {dict} -- Unvalidated query
+        runtime {Runtime} -- Runtime answering the batch
+
+    Returns:
+        {dict} -- Query output, or error message & status code
+    """
+    validated_query = None
+    try:
+        with timed_stage("validate", None):
+            validated_query = Request(**raw_query)
+
+        with query_in_flight(validated_query):
+            output = await run_query(validated_query, runtime)
+
+        observe_output(validated_query, output)
+        return {"output": output}
+
+    except ValidationError as err_validation:
+        count_error(err_validation)
+        return {"error": str(err_validation), "code": 400}
+
+    except HyperglassAgentError as err_agent:
+        log.error(str(err_agent))
+        count_error(err_agent, validated_query)
+        return {"error": err_agent.message, "code": err_agent.code}
+
+
+async def run_until_disconnected(http_request, coro):
+    """Await a coroutine, cancelling it if the client disconnects first.
+
+    Arguments:
+        http_request {HTTPRequest} -- HTTP request
+        coro {coroutine} -- Coroutine to await
+
+    Raises:
+        ClientDisconnected: Raised if the client disconnects.
+
+    Returns:
+        {Any} -- Coroutine result
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise ClientDisconnected("Client disconnected, query cancelled")
+    finally:
+        task.cancel()
+
+
+async def until_disconnected(http_request, chunks):
+    """Iterate over an async generator, closing it if the client disconnects.
+
+    The client is checked while waiting for each item, and between items at
+    most every DISCONNECT_POLL_INTERVAL seconds.
+
+    Arguments:
+        http_request {HTTPRequest} -- HTTP request
+        chunks {AsyncGenerator} -- Async generator
+
+    Raises:
+        ClientDisconnected: Raised if the client disconnects.
+
+    Yields:
+        {Any} -- Items of the generator
+    """
+    polled = time.monotonic()
+    while True:
+        if time.monotonic() - polled >= DISCONNECT_POLL_INTERVAL:
+            polled = time.monotonic()
+            if await http_request.is_disconnected():
+                await chunks.aclose()
+                raise ClientDisconnected("Client disconnected, query cancelled")
+        try:
+            chunk = await run_until_disconnected(http_request, chunks.__anext__())
+        except StopAsyncIteration:
+            return
+        yield chunk
+
+
+def server_sent_event(event, data):
+    """Format a server-sent event.
+
+    Arguments:
+        event {str} -- Event type
+        data {str} -- Single-line event data
+
+    Returns:
+        {str} -- Formatted event
+    """
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def start_stream(query, runtime, http_request, started):
+    """Decode a streamed query, and wait for its first chunk of output.
+
+    Waiting for the first chunk means errors raised before any output is
+    received, such as a full queue, are returned as HTTP errors.
+
+    Arguments:
+        query {EncodedRequest} -- Encoded JWT
+        runtime {Runtime} -- Runtime answering the request
+        http_request {HTTPRequest} -- HTTP request
+        started {float} -- Monotonic time the request was received
+
+    Raises:
+        RequestValidationError: Raised if the query is invalid.
+        HTTPException: Raised if the query fails before any output.
+
+    Returns:
+        {tuple} -- Validated query, first chunk or None, remaining chunks
+    """
+    validated_query = None
+    try:
+        validated_query = await decode_query(query, runtime)
+        chunks = until_disconnected(
+            http_request, stream_query(validated_query, runtime)
+        )
+        try:
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+        return validated_query, first_chunk, chunks
+
+    except ValidationError as err_validation:
+        log_summary("stream", "invalid query", describe_error(err_validation), started)
+        count_error(err_validation)
+        raise RequestValidationError(str(err_validation))
+
+    except HyperglassAgentError as err_agent:
+        description = describe_query(validated_query)
+        log_summary("stream", description, describe_error(err_agent), started)
+        count_error(err_agent, validated_query)
+        raise http_error(err_agent)
+
+
+async def stream_events(validated_query, first_chunk, chunks, runtime, started):
+    """Encode streamed output as server-sent events.
+
+    Arguments:
+        validated_query {Request} -- Validated query
+        first_chunk {str|None} -- First chunk of output, if any
+        chunks {AsyncGenerator} -- Remaining chunks of output
+        runtime {Runtime} -- Runtime answering the request
+        started {float} -- Monotonic time the request was received
+
+    Yields:
+        {str} -- Server-sent events
+    """
+    accepted = validated_query.compression
+    signing = {"params": runtime.params}
+    sent = 0
+    outcome = "aborted"
+    try:
+        with query_in_flight(validated_query):
+            if first_chunk is not None:
+                encoded = await jwt_encode(first_chunk, accepted, **signing)
+                yield server_sent_event("output", encoded)
+                sent += len(first_chunk)
+                async for chunk in chunks:
+                    encoded = await jwt_encode(chunk, accepted, **signing)
+                    yield server_sent_event("output", encoded)
+                    sent += len(chunk)
+        outcome = f"{sent} characters"
+
+    except HyperglassAgentError as err_agent:
+        outcome = f"{describe_error(err_agent)} after {sent} characters"
+        count_error(err_agent, validated_query)
+        error = await jwt_encode(str(err_agent), **signing)
+        yield server_sent_event("error", error)
+
+    finally:
+        log_summary("stream", describe_query(validated_query), outcome, started)
+
+    yield server_sent_event("end", await jwt_encode("", **signing))
+
+
 @api.post("/query/", status_code=200, response_model=EncodedRequest)
-async def query_entrypoint(query: EncodedRequest):
+async def query_entrypoint(query: EncodedRequest, http_request: HTTPRequest):
     """Validate and process input request.
 
+    If the request lists the payload encodings it accepts in `compression`,
+    large output is compressed & base64-encoded before it is signed, and the
+    encoding used is set in the response's `encoding` claim.
+
     Arguments:
         query {dict} -- Encoded JWT
+        http_request {HTTPRequest} -- HTTP request
 
     Returns:
         {obj} -- JSON response
     """
+    runtime = current_runtime()
+    started = time.monotonic()
+    validated_query = None
+    outcome = "aborted"
     try:
-        log.debug(f"Raw Query JSON: {query.json()}")
+        validated_query = await decode_query(query, runtime)
 
-        decrypted_query = await jwt_decode(query.encoded)
-        decrypted_query = json.loads(decrypted_query)
+        with query_in_flight(validated_query):
+            query_output = await run_until_disconnected(
+                http_request, run_query(validated_query, runtime)
+            )
+
+        observe_output(validated_query, query_output)
+        log_payload("Query Output:\n", query_output)
+
+        with timed_stage("jwt_encode", validated_query):
+            encoded = await jwt_encode(
+                query_output, validated_query.compression, params=runtime.params
+            )
+        outcome = f"{len(query_output)} characters"
+        return {"encoded": encoded}
+
+    except ValidationError as err_validation:
+        outcome = describe_error(err_validation)
+        count_error(err_validation)
+        raise RequestValidationError(str(err_validation))
+
+    except HyperglassAgentError as err_agent:
+        outcome = describe_error(err_agent)
+        count_error(err_agent, validated_query)
+        raise http_error(err_agent)
 
-        log.debug(f"Decrypted Query: {decrypted_query}")
+    finally:
+        log_summary("query", describe_query(validated_query), outcome, started)
 
-        validated_query = Request(**decrypted_query)
-        query_output = await run_query(validated_query)
 
-        log.debug(f"Query Output:\n{query_output}")
+@api.post("/query/batch/", status_code=200, response_model=EncodedRequest)
+async def query_batch_entrypoint(query: EncodedRequest, http_request: HTTPRequest):
+    """Validate and process a batch of queries concurrently.
 
-        encoded = await jwt_encode(query_output)
+    The request payload is a JSON list of queries, or an object containing
+    `queries` & optionally `compression`. Queries are subject to the same
+    limits as individual queries. The response is a JSON list, in the order
+    of the queries, of objects containing either the query's `output`, or its
+    `error` & `code`.
+
+    Arguments:
+        query {dict} -- Encoded JWT
+        http_request {HTTPRequest} -- HTTP request
+
+    Returns:
+        {obj} -- JSON response
+    """
+    runtime = current_runtime()
+    started = time.monotonic()
+    description = "batch"
+    outcome = "aborted"
+    try:
+        batch = await decode_batch(query, runtime)
+        description = f"batch of {len(batch.queries)} queries"
+        results = await run_until_disconnected(
+            http_request,
+            asyncio.gather(*(run_batch_query(q, runtime) for q in batch.queries)),
+        )
+
+        with timed_stage("jwt_encode", None):
+            output = dumps(results)
+            encoded = await jwt_encode(output, batch.compression, params=runtime.params)
+
+        errors = sum("error" in result for result in results)
+        outcome = f"{errors} errors, {len(output)} characters"
         return {"encoded": encoded}
 
+    except ValidationError as err_validation:
+        outcome = describe_error(err_validation)
+        count_error(err_validation)
+        raise RequestValidationError(str(err_validation))
+
+    except HyperglassAgentError as err_agent:
+        outcome = describe_error(err_agent)
+        count_error(err_agent)
+        raise http_error(err_agent)
+
+    finally:
+        log_summary("batch", description, outcome, started)
+
+
+@api.post("/query/stream/", status_code=200)
+async def query_stream_entrypoint(query: EncodedRequest, http_request: HTTPRequest):
+    """Validate and process input request, streaming output as it is received.
+
+    Output is sent as server-sent events, each containing an individually
+    encoded JWT: `output` events contain the next chunk of output, an `error`
+    event contains an error that occurred after output started, and an `end`
+    event is always sent last. The query is cancelled if the client
+    disconnects.
+
+    Arguments:
+        query {dict} -- Encoded JWT
+        http_request {HTTPRequest} -- HTTP request
+
+    Returns:
+        {obj} -- Event stream response
+    """
+    runtime = current_runtime()
+    started = time.monotonic()
+    validated_query, first_chunk, chunks = await start_stream(
+        query, runtime, http_request, started
+    )
+    events = stream_events(validated_query, first_chunk, chunks, runtime, started)
+    return StreamingResponse(events, media_type="text/event-stream")
+
+
+@api.get("/metrics", include_in_schema=False)
+async def metrics_entrypoint():
+    """Expose query metrics & backend state in the Prometheus text format.
+
+    Raises:
+        HTTPException: Raised if metrics are disabled.
+
+    Returns:
+        {obj} -- Text response
+    """
+    if not params.metrics:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    runtime = current_runtime()
+    content = render(
+        result_cache=runtime.result_cache,
+        limiters=runtime.limiters,
+        rib_snapshots=runtime.rib_snapshots,
+    )
+    return Response(content=content, media_type=CONTENT_TYPE)
+
+
+@api.post("/admin/reload/", status_code=200, response_model=EncodedRequest)
+async def reload_entrypoint(query: EncodedRequest):
+    """Reload the config file, as on SIGHUP.
+
+    The request payload is a JSON object containing `action`, which must be
+    `reload`, signed with the active secret. The response is signed with the
+    same secret, and lists changed settings which need a restart to apply
+    in `restart_required`. With multiple workers, only the worker which
+    answers the request reloads; send SIGHUP to the supervisor to reload all
+    workers.
+
+    Arguments:
+        query {dict} -- Encoded JWT
+
+    Returns:
+        {obj} -- JSON response
+    """
+    runtime = current_runtime()
+    try:
+        decrypted = await jwt_decode(query.encoded, params=runtime.params)
+        request = AdminRequest.parse_raw(decrypted)
+
+        log.info("Config reload requested")
+        restart = await reload()
+
+        result = {"action": request.action, "restart_required": restart}
+        return {"encoded": await jwt_encode(dumps(result), params=runtime.params)}
+
     except ValidationError as err_validation:
         raise RequestValidationError(str(err_validation))
 
     except HyperglassAgentError as err_agent:
-        raise HTTPException(status_code=err_agent.code, detail=str(err_agent))
+        raise http_error(err_agent)
 
 
 def start():
     """Start the web server with Uvicorn ASGI."""
     import uvicorn
 
-    uvicorn.run(api, **API_PARAMS)
+    if params.workers > 1:
+        from hyperglass_agent.api.supervisor import Supervisor
+
+        config = uvicorn.Config(api, **API_PARAMS)
+        Supervisor(config, workers=params.workers).run()
+    else:
+        uvicorn.run(api, **API_PARAMS)
 
 
 if __name__ == "__main__":
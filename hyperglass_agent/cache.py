@@ -0,0 +1,743 @@
+"""In-memory cache of parsed query output."""
+
+# Standard Library
+import os
+import ast
+import sys
+import mmap
+import time
+import zlib
+import fcntl
+import struct
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+# Project
+from hyperglass_agent.log import log
+from hyperglass_agent.constants import AGENT_QUERY
+
+# Memory backed filesystem for the shared cache's file, where available. The
+# file is created exclusively & unlinked immediately by `TemporaryFile`, so it
+# is only reachable through the descriptor inherited by worker processes.
+SHARED_MEMORY_DIR = "/dev/shm"  # noqa: S108
+
+
+def cache_key(mode, query):
+    """Build a cache key for a query.
+
+    The VRF & target are used exactly as they are executed, since commands
+    are case sensitive & queries differing only in case may have different
+    output.
+
+    Arguments:
+        mode {str} -- Agent mode
+        query {object} -- Validated query object
+
+    Returns:
+        {tuple} -- Cache key
+    """
+    source = query.source.compressed if query.source is not None else None
+    return (mode, query.afi, query.vrf, query.query_type, source, query.target)
+
+
+def in_table(key, afi, vrf=None):
+    """Determine if a cache key is for a BGP query answered from a table.
+
+    Arguments:
+        key {tuple} -- Cache key
+        afi {str} -- AFI
+
+    Keyword Arguments:
+        vrf {str} -- VRF, or None to match any VRF (default: {None})
+
+    Returns:
+        {bool} -- True if the key is for a BGP query of the table
+    """
+    _, key_afi, key_vrf, query_type, _, _ = key
+    return (
+        key_afi == afi and query_type in AGENT_QUERY and (vrf is None or key_vrf == vrf)
+    )
+
+
+class ResultCache:
+    """LRU cache of query output, bounded by the total size of its entries.
+
+    Each entry expires after a time-to-live set when it is stored. When
+    storing an entry would exceed `max_size` bytes, the least recently used
+    entries are evicted until it fits.
+    """
+
+    def __init__(self, max_size):
+        """Initialize an empty cache.
+
+        Arguments:
+            max_size {int} -- Maximum total size of all entries in bytes
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        """Get the number of entries.
+
+        Returns:
+            {int} -- Number of entries
+        """
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Determine if a key has an unexpired entry.
+
+        Returns:
+            {bool} -- True if cached
+        """
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    @staticmethod
+    def _sizeof(key, value):
+        return sys.getsizeof(value) + sum(sys.getsizeof(i) for i in key)
+
+    def get(self, key):
+        """Get a cached value & mark it as recently used.
+
+        Arguments:
+            key {tuple} -- Cache key
+
+        Returns:
+            {str|None} -- Cached value, or None if not cached or expired
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires, _ = entry
+
+        if expires <= time.monotonic():
+            self.misses += 1
+            self.delete(key)
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl):
+        """Store a value, evicting least recently used entries if needed.
+
+        Values larger than the cache itself are not stored, & are counted as
+        skipped.
+
+        Arguments:
+            key {tuple} -- Cache key
+            value {str} -- Value to cache
+            ttl {int} -- Seconds until the entry expires
+        """
+        self.delete(key)
+
+        size = self._sizeof(key, value)
+
+        if ttl <= 0:
+            return
+
+        if size > self.max_size:
+            self.skipped += 1
+            log.debug("Not caching {} byte entry, larger than the cache", size)
+            return
+
+        while self.size + size > self.max_size:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self.size += size
+
+    def delete(self, key):
+        """Remove an entry, if it exists.
+
+        Arguments:
+            key {tuple} -- Cache key
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def invalidate(self, predicate):
+        """Remove all entries whose key matches a predicate.
+
+        Arguments:
+            predicate {function} -- Function accepting a key
+
+        Returns:
+            {int} -- Number of entries removed
+        """
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def clear(self):
+        """Remove all entries."""
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self):
+        """Get cache counters.
+
+        Returns:
+            {dict} -- Cache counters
+        """
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "skipped": self.skipped,
+        }
+
+
+class SharedResultCache:
+    """Cache of query output in shared memory, usable by forked workers.
+
+    The cache is a memory-mapped file divided into fixed-size slots, grouped
+    into sets of `WAYS` slots. A key is stored in the set chosen by its hash:
+    in the slot already holding the key, an empty slot, an expired slot, or
+    else the set's least recently used slot. An entry larger than a slot
+    spans several slots, in consecutive sets; the entry's remaining slots are
+    stored under part keys derived from its key. Evicting any slot of an
+    entry removes the entry's other slots.
+
+    Writers lock the set they write to with a POSIX record lock. Readers
+    don't lock: each slot starts with a sequence number, which is odd while
+    the slot is written, and a checksum of its contents, so a reader retries
+    or misses rather than return a partially written entry.
+
+    Hit, miss & skipped counters are per process. Entry, size & eviction
+    counters are shared by all processes; an entry spanning several slots is
+    counted once.
+    """
+
+    WAYS = 4
+    READ_RETRIES = 8
+
+    # Slot header: sequence, checksum, key hash, expiry, last use, key length
+    # & value length.
+    SLOT = struct.Struct("<IIQddII")
+    SEQUENCE = struct.Struct("<I")
+    FIELDS = struct.Struct("<IQddII")
+    USED = struct.Struct("<d")
+    USED_OFFSET = 24
+
+    # Cache header: entries, size & evictions.
+    COUNTERS = struct.Struct("<qqq")
+
+    # Start of an entry's value: number of slots it spans & checksum of the
+    # whole value, if it spans more than one.
+    PARTS = struct.Struct("<II")
+
+    def __init__(self, max_size, slot_size):
+        """Create the shared memory segment.
+
+        Workers must be forked after the cache is created in order to share
+        it.
+
+        Arguments:
+            max_size {int} -- Maximum total size of all slots in bytes
+            slot_size {int} -- Size of each slot in bytes; larger entries
+            span several slots
+        """
+        self.max_size = max_size
+        self.slot_size = slot_size - slot_size % 8
+        self.sets = max(max_size // (self.slot_size * self.WAYS), 1)
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+        directory = SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) else None
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._fd = self._file.fileno()
+
+        length = self.COUNTERS.size + self.sets * self.WAYS * self.slot_size
+        self._file.truncate(length)
+        self._buffer = mmap.mmap(self._fd, length)
+
+    def __len__(self):
+        """Get the number of entries, including expired entries not yet reused.
+
+        Returns:
+            {int} -- Number of entries
+        """
+        return self.COUNTERS.unpack_from(self._buffer, 0)[0]
+
+    def __contains__(self, key):
+        """Determine if a key has an unexpired entry.
+
+        Returns:
+            {bool} -- True if cached
+        """
+        encoded, key_hash = self._encode(key)
+        return self._find(encoded, key_hash)[0] is not None
+
+    @property
+    def size(self):
+        """Get the total size of all keys & values.
+
+        Returns:
+            {int} -- Size in bytes
+        """
+        return self.COUNTERS.unpack_from(self._buffer, 0)[1]
+
+    @classmethod
+    def _encode(cls, key):
+        # Keys are tuples of strings & None, whose repr is a literal.
+        return cls._hash(repr(key).encode())
+
+    @staticmethod
+    def _hash(encoded):
+        digest = hashlib.blake2b(encoded, digest_size=8).digest()
+        # Hash 0 marks an empty slot.
+        return encoded, int.from_bytes(digest, "little") or 1
+
+    @staticmethod
+    def _head_key(encoded):
+        """Get the encoded key of the entry a slot's key belongs to.
+
+        Returns:
+            {bytes} -- Encoded key of the entry's first slot
+        """
+        if encoded[:1] == b"(":
+            return encoded
+        return encoded.split(b":", 1)[1]
+
+    @staticmethod
+    def _part_key(encoded, key_hash, index):
+        """Get the encoded key & hash of one of an entry's slots.
+
+        The hashes of an entry's slots are consecutive, so that each is in a
+        different set. Part keys aren't tuple literals, so they aren't listed
+        by `keys`.
+
+        Returns:
+            {tuple} -- Encoded key & key hash
+        """
+        if index == 0:
+            return encoded, key_hash
+        return b"%d:" % index + encoded, (key_hash + index) % 2 ** 64 or 1
+
+    def _set_of(self, key_hash):
+        """Get a key's set.
+
+        Returns:
+            {tuple} -- Set number & offsets of its slots
+        """
+        index = key_hash % self.sets
+        start = self.COUNTERS.size + index * self.WAYS * self.slot_size
+        stop = start + self.WAYS * self.slot_size
+        return index, range(start, stop, self.slot_size)
+
+    def _lock(self, index):
+        # Lock byte 0 for the counters, or the byte after the set's number.
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, index)
+
+    def _unlock(self, index):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, index)
+
+    def _count(self, entries=0, size=0, evictions=0):
+        self._lock(0)
+        try:
+            counters = self.COUNTERS.unpack_from(self._buffer, 0)
+            self.COUNTERS.pack_into(
+                self._buffer,
+                0,
+                counters[0] + entries,
+                counters[1] + size,
+                counters[2] + evictions,
+            )
+        finally:
+            self._unlock(0)
+
+    def _read(self, offset, encoded, key_hash):
+        """Read a slot's value without locking.
+
+        Returns:
+            {tuple} -- View of the value & expiry, or None & 0 if the slot
+            doesn't hold the key
+        """
+        buffer = self._buffer
+        for _ in range(self.READ_RETRIES):
+            header = self.SLOT.unpack_from(buffer, offset)
+            sequence, checksum, slot_hash, expires, _, key_len, value_len = header
+
+            if sequence & 1:
+                continue
+            if slot_hash != key_hash:
+                break
+
+            start = offset + self.SLOT.size
+            data = buffer[start : start + key_len + value_len]
+
+            if self.SEQUENCE.unpack_from(buffer, offset)[0] != sequence:
+                continue
+            if zlib.crc32(data) == checksum and data[:key_len] == encoded:
+                return memoryview(data)[key_len:], expires
+            break
+
+        return None, 0
+
+    def _find(self, encoded, key_hash):
+        """Find a key's unexpired entry.
+
+        Returns:
+            {tuple} -- Slot offset & value, or None & None if not cached
+        """
+        now = time.monotonic()
+        for offset in self._set_of(key_hash)[1]:
+            value, expires = self._read(offset, encoded, key_hash)
+            if value is not None:
+                if expires > now:
+                    return offset, value
+                break
+        return None, None
+
+    def _write(self, offset, checksum, key_hash, expires, used, key_len, data):
+        """Write a slot, which must be locked."""
+        buffer = self._buffer
+        sequence = self.SEQUENCE.unpack_from(buffer, offset)[0]
+        self.SEQUENCE.pack_into(buffer, offset, (sequence + 1) & 0xFFFFFFFF)
+
+        start = offset + self.SLOT.size
+        buffer[start : start + len(data)] = data
+        self.FIELDS.pack_into(
+            buffer,
+            offset + self.SEQUENCE.size,
+            checksum,
+            key_hash,
+            expires,
+            used,
+            key_len,
+            len(data) - key_len,
+        )
+        self.SEQUENCE.pack_into(buffer, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    def _victim(self, slots, key_hash, now):
+        """Choose the slot of a locked set to store a key in.
+
+        Returns:
+            {tuple} -- Slot offset & header
+        """
+        headers = [(o, self.SLOT.unpack_from(self._buffer, o)) for o in slots]
+
+        for offset, header in headers:
+            if header[2] == key_hash:
+                return offset, header
+        for offset, header in headers:
+            if header[2] == 0:
+                return offset, header
+
+        # Expired entries first, then the least recently used.
+        return min(headers, key=lambda item: (item[1][3] > now, item[1][4]))
+
+    def _join(self, encoded, key_hash):
+        """Read & join the slots of a key's unexpired entry.
+
+        Returns:
+            {tuple} -- Offsets of the entry's slots & a view of its value, or
+            None & None if not cached
+        """
+        offset, head = self._find(encoded, key_hash)
+        if offset is None:
+            return None, None
+
+        parts, checksum = self.PARTS.unpack_from(head)
+        offsets = [offset]
+        chunks = [head[self.PARTS.size :]]
+
+        for index in range(1, parts):
+            offset, chunk = self._find(*self._part_key(encoded, key_hash, index))
+            if offset is None:
+                return None, None
+            offsets.append(offset)
+            chunks.append(chunk)
+
+        if parts == 1:
+            return offsets, chunks[0]
+
+        value = b"".join(chunks)
+        if zlib.crc32(value) != checksum:
+            # Slots written by different writes of the entry.
+            return None, None
+        return offsets, value
+
+    def get(self, key):
+        """Get a cached value & mark it as recently used.
+
+        Arguments:
+            key {tuple} -- Cache key
+
+        Returns:
+            {str|None} -- Cached value, or None if not cached or expired
+        """
+        offsets, value = self._join(*self._encode(key))
+
+        if offsets is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # A racing writer may overwrite this, which only affects eviction order.
+        now = time.monotonic()
+        for offset in offsets:
+            self.USED.pack_into(self._buffer, offset + self.USED_OFFSET, now)
+        return str(value, "utf-8")
+
+    def _split(self, encoded, key_hash, value):
+        """Split an encoded value into the slots it spans.
+
+        Returns:
+            {list|None} -- Key hash, key length & data of each slot, or None
+            if the value needs more slots than there are sets
+        """
+        capacity = self.slot_size - self.SLOT.size
+        bounds = []
+        position = 0
+
+        while position < len(value) or not bounds:
+            part_encoded = self._part_key(encoded, key_hash, len(bounds))[0]
+            size = capacity - len(part_encoded)
+            if not bounds:
+                size -= self.PARTS.size
+            if size < 0 or len(bounds) == self.sets:
+                return None
+
+            bounds.append((position, position + size))
+            position += size
+
+        view = memoryview(value)
+        checksum = zlib.crc32(value) if len(bounds) > 1 else 0
+        slots = []
+
+        for index, (start, stop) in enumerate(bounds):
+            part_encoded, part_hash = self._part_key(encoded, key_hash, index)
+            parts = b"" if index else self.PARTS.pack(len(bounds), checksum)
+            data = b"".join((part_encoded, parts, view[start:stop]))
+            slots.append((part_hash, len(part_encoded), data))
+
+        return slots
+
+    def _store(self, key_hash, key_len, data, expires, now):
+        """Store one slot of an entry.
+
+        Returns:
+            {int} -- Number of slots spanned by the entry the slot held, if
+            it was the first slot of the same key, or else 0
+        """
+        index, slots = self._set_of(key_hash)
+
+        self._lock(index + 1)
+        try:
+            offset, header = self._victim(slots, key_hash, now)
+            _, _, slot_hash, slot_expires, _, slot_key_len, value_len = header
+            start = offset + self.SLOT.size
+            replaced = self._buffer[start : start + slot_key_len + self.PARTS.size]
+            replaced_key = replaced[:slot_key_len]
+            self._write(offset, zlib.crc32(data), key_hash, expires, now, key_len, data)
+        finally:
+            self._unlock(index + 1)
+
+        first = int(data[:1] == b"(")
+        replaced_first = int(slot_hash != 0 and replaced[:1] == b"(")
+
+        if slot_hash == 0:
+            self._count(entries=first, size=len(data))
+        else:
+            evicted = int(slot_hash != key_hash and slot_expires > now)
+            self._count(
+                entries=first - replaced_first,
+                size=len(data) - slot_key_len - value_len,
+                evictions=evicted,
+            )
+
+        if slot_hash not in (0, key_hash):
+            self._remove_evicted(replaced_key, replaced, data[:key_len])
+
+        if slot_hash == key_hash and first and value_len >= self.PARTS.size:
+            return self.PARTS.unpack_from(replaced, slot_key_len)[0]
+        return 0
+
+    def _remove_evicted(self, encoded, replaced, key):
+        """Remove the other slots of the entry an overwritten slot belonged to.
+
+        Arguments:
+            encoded {bytes} -- Key of the overwritten slot
+            replaced {bytes} -- Start of the overwritten slot, from its key
+            key {bytes} -- Key of the slot written over it
+        """
+        head, head_hash = self._hash(self._head_key(encoded))
+
+        if head == self._head_key(key):
+            # A previous write of the entry being written, whose slots beyond
+            # the end of this one are removed by `set`.
+            return
+
+        if head != encoded:
+            self._delete(head, head_hash)
+            return
+
+        parts = self.PARTS.unpack_from(replaced, len(encoded))[0]
+        for index in range(1, parts):
+            self._delete_slot(*self._part_key(head, head_hash, index))
+
+    def set(self, key, value, ttl):
+        """Store a value, evicting entries of the sets it is stored in if needed.
+
+        Values which would span more slots than there are sets are not
+        stored, & are counted as skipped.
+
+        Arguments:
+            key {tuple} -- Cache key
+            value {str} -- Value to cache
+            ttl {int} -- Seconds until the entry expires
+        """
+        encoded, key_hash = self._encode(key)
+
+        if ttl <= 0:
+            self._delete(encoded, key_hash)
+            return
+
+        slots = self._split(encoded, key_hash, value.encode())
+
+        if slots is None:
+            self._delete(encoded, key_hash)
+            self.skipped += 1
+            log.debug(
+                "Not caching {} character entry, larger than the cache", len(value)
+            )
+            return
+
+        now = time.monotonic()
+
+        # The first slot is written last, so that it isn't found before the
+        # entry's other slots are written.
+        for part_hash, key_len, data in reversed(slots):
+            replaced = self._store(part_hash, key_len, data, now + ttl, now)
+
+        # Remove slots of the previous entry beyond the end of this one.
+        for index in range(len(slots), replaced):
+            self._delete_slot(*self._part_key(encoded, key_hash, index))
+
+    def _delete_slot(self, encoded, key_hash):
+        """Remove one slot of an entry, if it exists.
+
+        Returns:
+            {bytes|None} -- Value of the removed slot, or None
+        """
+        index, slots = self._set_of(key_hash)
+
+        self._lock(index + 1)
+        try:
+            for offset in slots:
+                value = self._read(offset, encoded, key_hash)[0]
+                if value is not None:
+                    header = self.SLOT.unpack_from(self._buffer, offset)
+                    self._write(offset, 0, 0, 0.0, 0.0, 0, b"")
+                    break
+            else:
+                return None
+        finally:
+            self._unlock(index + 1)
+
+        first = int(encoded[:1] == b"(")
+        self._count(entries=-first, size=-(header[5] + header[6]))
+        return value
+
+    def _delete(self, encoded, key_hash):
+        """Remove an entry & the other slots it spans, if it exists.
+
+        Returns:
+            {bool} -- True if an entry was removed
+        """
+        head = self._delete_slot(encoded, key_hash)
+        if head is None:
+            return False
+
+        if len(head) >= self.PARTS.size:
+            for index in range(1, self.PARTS.unpack_from(head)[0]):
+                self._delete_slot(*self._part_key(encoded, key_hash, index))
+        return True
+
+    def delete(self, key):
+        """Remove an entry, if it exists.
+
+        Arguments:
+            key {tuple} -- Cache key
+        """
+        self._delete(*self._encode(key))
+
+    def keys(self):
+        """Get the keys of all entries, including expired entries.
+
+        Returns:
+            {list} -- Cache keys
+        """
+        keys = []
+        for index in range(self.sets * self.WAYS):
+            offset = self.COUNTERS.size + index * self.slot_size
+            header = self.SLOT.unpack_from(self._buffer, offset)
+            if header[2] == 0:
+                continue
+            start = offset + self.SLOT.size
+            try:
+                key = self._buffer[start : start + header[5]].decode()
+                if not key.startswith("("):
+                    # Another slot of an entry spanning several slots.
+                    continue
+                keys.append(ast.literal_eval(key))
+            except (ValueError, SyntaxError):
+                # Written since its header was read.
+                continue
+        return keys
+
+    def invalidate(self, predicate):
+        """Remove all entries whose key matches a predicate.
+
+        Arguments:
+            predicate {function} -- Function accepting a key
+
+        Returns:
+            {int} -- Number of entries removed
+        """
+        return sum(
+            self._delete(*self._encode(key)) for key in self.keys() if predicate(key)
+        )
+
+    def clear(self):
+        """Remove all entries."""
+        for key in self.keys():
+            self.delete(key)
+
+    def stats(self):
+        """Get cache counters.
+
+        Returns:
+            {dict} -- Cache counters
+        """
+        entries, size, evictions = self.COUNTERS.unpack_from(self._buffer, 0)
+        return {
+            "entries": entries,
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": evictions,
+            "skipped": self.skipped,
+        }
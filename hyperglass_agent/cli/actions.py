@@ -10,8 +10,6 @@ from ipaddress import ip_address
 
 # Third Party
 from click import echo, style, prompt, confirm
-from inquirer import List as InquirerList
-from inquirer import Checkbox
 
 # Project
 from hyperglass_agent.util import get_addresses
@@ -23,6 +21,7 @@ from hyperglass_agent.cli.echo import (
     inquire,
     success,
     warning,
+    report_startup,
 )
 from hyperglass_agent.cli.static import CL, NL, WS, WARNING, E
 
@@ -149,6 +148,8 @@ def find_app_path() -> Path:
                 + "but you've chosen not to create one."
             )
         elif create:
+            from inquirer import List as InquirerList
+
             available_paths = [
                 InquirerList(
                     "selected",
@@ -264,6 +265,8 @@ subject alternative names to the SSL certificate. Please select any IP
 addresses over which hyperglass may communicate with hyperglass-agent."""
     )
 
+    from inquirer import Checkbox
+
     ips = [Checkbox("ips", message="Select IPs", choices=all_ips)]
     selected = [i.split("[")[0].strip() for i in inquire(ips)["ips"]]
     selected_ips = [ip_address(i) for i in selected]
@@ -445,7 +448,101 @@ def start_web_server() -> None:
             + WS[1]
             + NL[1]
         )
+        report_startup()
         start()
 
     except Exception as e:
         error("Failed to start web server: {e}", e=e)
+
+
+def agent_url() -> str:
+    """Get the URL of this agent's `/query/` endpoint from its configuration."""
+    from hyperglass_agent.config import params
+
+    scheme = "https" if params.ssl.enable else "http"
+
+    address = params.listen_address
+    if address.is_unspecified:
+        address = ip_address("::1" if address.version == 6 else "127.0.0.1")
+
+    host = f"[{address}]" if address.version == 6 else str(address)
+    return f"{scheme}://{host}:{params.port}/query/"
+
+
+def run_bench(
+    url: Optional[str],
+    mix: str,
+    targets: Iterable,
+    afi: str,
+    vrf: str,
+    requests: Optional[int],
+    duration: Optional[float],
+    concurrency: int,
+    rate: Optional[float],
+    timeout: float,
+    verify: bool,
+    as_json: bool,
+    seed: Optional[int],
+) -> None:
+    """Send signed queries to an agent & report latency, errors & throughput."""
+    import json
+    import asyncio
+    from hyperglass_agent.cli.bench import (
+        DEFAULT_REQUESTS,
+        run_load,
+        parse_mix,
+        make_queries,
+        parse_targets,
+        format_summary,
+    )
+
+    app_path = find_app_path()
+
+    # Loading the configuration requires the application path.
+    from hyperglass_agent.payload import _jwt_decode, _jwt_encode
+
+    try:
+        query_mix = parse_mix(mix)
+        query_targets = parse_targets(targets)
+    except ValueError as err:
+        error(str(err))
+
+    if url is None:
+        url = agent_url()
+
+    # The agent's certificate is usually self-signed.
+    cert_file = app_path / "agent_cert.pem"
+    if verify and url.startswith("https://") and cert_file.exists():
+        verify = str(cert_file)
+
+    if requests is None and duration is None:
+        requests = DEFAULT_REQUESTS
+
+    if not as_json:
+        info("Sending queries to {u}", u=url)
+
+    result = asyncio.get_event_loop().run_until_complete(
+        run_load(
+            url,
+            make_queries(query_mix, query_targets, afi=afi, vrf=vrf, seed=seed),
+            sign=_jwt_encode,
+            decode=_jwt_decode,
+            requests=requests,
+            duration=duration,
+            concurrency=concurrency,
+            rate=rate,
+            timeout=timeout,
+            verify=verify,
+        )
+    )
+    summary = result.summary()
+
+    if as_json:
+        echo(json.dumps(summary, indent=2))
+    else:
+        echo(NL[1] + format_summary(summary))
+        label(
+            "Sent {n} queries in {s} seconds",
+            n=summary["all"]["requests"],
+            s=f"{result.elapsed:.1f}",
+        )
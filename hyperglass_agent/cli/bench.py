@@ -0,0 +1,386 @@
+"""Send signed queries to an agent & measure their latency."""
+
+# Standard Library
+import json
+import time
+import random
+import asyncio
+from itertools import islice
+from collections import Counter, defaultdict
+
+# Project
+from hyperglass_agent.constants import SUPPORTED_QUERY
+from hyperglass_agent.exceptions import SecurityError
+
+DEFAULT_MIX = "bgp_route=8,bgp_aspath=1,bgp_community=1"
+
+DEFAULT_TARGETS = {
+    "bgp_route": "192.0.2.1",
+    "bgp_aspath": "_65000_",
+    "bgp_community": "65000:1",
+    "ping": "192.0.2.1",
+    "traceroute": "192.0.2.1",
+}
+
+DEFAULT_REQUESTS = 1000
+
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+
+def parse_mix(value):
+    """Parse query types & their relative weights, i.e. `bgp_route=8,ping=1`.
+
+    Arguments:
+        value {str} -- Comma separated query types, each optionally followed
+        by `=` & a weight (default 1)
+
+    Raises:
+        ValueError: Raised if a query type is unsupported or a weight is
+        invalid.
+
+    Returns:
+        {dict} -- Weight by query type
+    """
+    mix = {}
+    for item in value.split(","):
+        query_type, _, weight = item.strip().partition("=")
+        if query_type not in SUPPORTED_QUERY:
+            raise ValueError(f"Query type '{query_type}' is not supported")
+        mix[query_type] = float(weight or 1)
+        if mix[query_type] < 0:
+            raise ValueError(f"Weight of '{query_type}' must not be negative")
+
+    if not any(mix.values()):
+        raise ValueError("At least one query type must have a positive weight")
+    return mix
+
+
+def parse_targets(values):
+    """Parse query targets, i.e. `bgp_route=192.0.2.1`.
+
+    Query types without targets use their default target.
+
+    Arguments:
+        values {Iterable} -- Query targets, each prefixed by its query type
+        & `=`
+
+    Raises:
+        ValueError: Raised if a query type is unsupported.
+
+    Returns:
+        {dict} -- List of targets by query type
+    """
+    targets = {}
+    for value in values:
+        query_type, _, target = value.partition("=")
+        if query_type not in SUPPORTED_QUERY or not target:
+            raise ValueError(f"Target '{value}' is not QUERY_TYPE=TARGET")
+        targets.setdefault(query_type, []).append(target)
+
+    for query_type, target in DEFAULT_TARGETS.items():
+        targets.setdefault(query_type, [target])
+    return targets
+
+
+def make_queries(mix, targets, afi, vrf, seed=None):
+    """Generate random queries in the proportions of a mix.
+
+    Arguments:
+        mix {dict} -- Weight by query type
+        targets {dict} -- List of targets by query type
+        afi {str} -- Query AFI
+        vrf {str} -- Query VRF
+
+    Keyword Arguments:
+        seed {int} -- Random seed (default: {None})
+
+    Returns:
+        {Generator} -- Unvalidated queries
+    """
+    # Only picks load test queries, & must be reproducible from a seed.
+    rng = random.Random(seed)  # noqa: S311
+    query_types = list(mix)
+    weights = [mix[query_type] for query_type in query_types]
+
+    while True:
+        query_type = rng.choices(query_types, weights)[0]
+        yield {
+            "query_type": query_type,
+            "vrf": vrf,
+            "afi": afi,
+            "source": None,
+            "target": rng.choice(targets[query_type]),
+        }
+
+
+def percentile(ordered, fraction):
+    """Get a percentile of sorted values by the nearest rank method.
+
+    Arguments:
+        ordered {list} -- Sorted values
+        fraction {float} -- Percentile, between 0 & 1
+
+    Returns:
+        {float|None} -- Percentile, or None if there are no values
+    """
+    if not ordered:
+        return None
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class LoadResult:
+    """Latencies, output sizes & errors of queries, by query type."""
+
+    def __init__(self):
+        """Initialize a result with no queries."""
+        self.latencies = defaultdict(list)
+        self.sizes = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.elapsed = 0.0
+
+    def record(self, query_type, latency, output=None, error=None):
+        """Record the result of a query.
+
+        Arguments:
+            query_type {str} -- Query type
+            latency {float} -- Seconds taken
+
+        Keyword Arguments:
+            output {str} -- Output, if successful (default: {None})
+            error {str} -- Error name, if failed (default: {None})
+        """
+        if error is not None:
+            self.errors[query_type][error] += 1
+        else:
+            self.latencies[query_type].append(latency)
+            self.sizes[query_type].append(len(output))
+
+    def _summarize(self, latencies, sizes, errors):
+        ordered = sorted(latency * 1000 for latency in latencies)
+        summary = {
+            "requests": len(ordered) + sum(errors.values()),
+            "errors": dict(errors),
+        }
+        for name, fraction in PERCENTILES:
+            summary[name] = percentile(ordered, fraction)
+        summary.update(
+            {
+                "max": ordered[-1] if ordered else None,
+                "mean": sum(ordered) / len(ordered) if ordered else None,
+                "throughput": len(ordered) / self.elapsed if self.elapsed else 0.0,
+                "output_bytes": int(sum(sizes) / len(sizes)) if sizes else 0,
+            }
+        )
+        return summary
+
+    def summary(self):
+        """Summarize the result of each query type, & of all queries.
+
+        Latencies are in milliseconds, throughput is successful queries per
+        second & output size is the mean size of successful queries' output.
+
+        Returns:
+            {dict} -- Summary by query type, & `all`
+        """
+        query_types = sorted(set(self.latencies) | set(self.errors))
+        summary = {
+            query_type: self._summarize(
+                self.latencies[query_type],
+                self.sizes[query_type],
+                self.errors[query_type],
+            )
+            for query_type in query_types
+        }
+        summary["all"] = self._summarize(
+            [latency for q in query_types for latency in self.latencies[q]],
+            [size for q in query_types for size in self.sizes[q]],
+            sum((self.errors[q] for q in query_types), Counter()),
+        )
+        return summary
+
+
+async def run_load(
+    url,
+    queries,
+    sign,
+    decode=None,
+    requests=DEFAULT_REQUESTS,
+    duration=None,
+    concurrency=8,
+    rate=None,
+    timeout=60,
+    verify=True,
+):
+    """Send queries to an agent's `/query/` endpoint.
+
+    Without a rate, `concurrency` clients each send their next query when
+    the previous one completes. With a rate, queries are sent on schedule,
+    with at most `concurrency` in flight; the latency of a query is measured
+    from the time it was scheduled to be sent, so that delays waiting for a
+    slow agent are included.
+
+    Arguments:
+        url {str} -- URL of the `/query/` endpoint
+        queries {Iterable} -- Unvalidated queries
+        sign {callable} -- Encodes a payload string as a JWT
+
+    Keyword Arguments:
+        decode {callable} -- Decodes a response JWT's payload, or None to
+        not decode responses (default: {None})
+        requests {int} -- Maximum number of queries (default: {1000})
+        duration {float} -- Maximum seconds to send queries for (default:
+        {None})
+        concurrency {int} -- Maximum queries in flight (default: {8})
+        rate {float} -- Queries per second (default: {None})
+        timeout {float} -- Seconds to wait for each response (default: {60})
+        verify {bool|str} -- Verify the agent's certificate, or path of the
+        certificate to verify it with (default: {True})
+
+    Returns:
+        {LoadResult} -- Result
+    """
+    import httpx
+
+    result = LoadResult()
+    queries = islice(queries, requests)
+    started = time.perf_counter()
+    deadline = None if duration is None else started + duration
+
+    def expired():
+        return deadline is not None and time.perf_counter() >= deadline
+
+    async with httpx.AsyncClient(timeout=timeout, verify=verify) as session:
+
+        async def send(query, start):
+            output, error = await send_query(session, url, query, sign, decode)
+            latency = time.perf_counter() - start
+            result.record(query["query_type"], latency, output, error)
+
+        if rate is None:
+            await send_closed_loop(send, queries, concurrency, expired)
+        else:
+            await send_on_schedule(send, queries, concurrency, rate, expired)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def send_query(session, url, query, sign, decode=None):
+    """Sign & send a query.
+
+    Arguments:
+        session {httpx.AsyncClient} -- HTTP client
+        url {str} -- URL of the `/query/` endpoint
+        query {dict} -- Unvalidated query
+        sign {callable} -- Encodes a payload string as a JWT
+
+    Keyword Arguments:
+        decode {callable} -- Decodes a response JWT's payload, or None to
+        not decode responses (default: {None})
+
+    Returns:
+        {tuple} -- Output & error name, one of which is None
+    """
+    import httpx
+
+    try:
+        response = await session.post(url, json={"encoded": sign(json.dumps(query))})
+        if response.status_code != 200:
+            return None, f"HTTP {response.status_code}"
+
+        output = response.json()["encoded"]
+        if decode is not None:
+            output = decode(output)
+        return output, None
+
+    except (httpx.HTTPError, KeyError, ValueError, SecurityError) as err:
+        # Failed requests, & responses without a valid JWT, are counted as
+        # errors rather than ending the load test.
+        return None, type(err).__name__
+
+
+async def send_closed_loop(send, queries, concurrency, expired):
+    """Send queries from clients which each wait for their previous query.
+
+    Arguments:
+        send {callable} -- Sends a query, given the time it was sent
+        queries {Iterator} -- Unvalidated queries
+        concurrency {int} -- Number of clients
+        expired {callable} -- Whether to stop sending queries
+    """
+
+    async def client():
+        for query in queries:
+            if expired():
+                break
+            await send(query, time.perf_counter())
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+async def send_on_schedule(send, queries, concurrency, rate, expired):
+    """Send queries at a fixed rate, with a maximum number in flight.
+
+    Arguments:
+        send {callable} -- Sends a query, given the time it was scheduled
+        queries {Iterator} -- Unvalidated queries
+        concurrency {int} -- Maximum queries in flight
+        rate {float} -- Queries per second
+        expired {callable} -- Whether to stop sending queries
+    """
+    in_flight = asyncio.Semaphore(concurrency)
+    tasks = []
+    started = time.perf_counter()
+
+    for index, query in enumerate(queries):
+        scheduled = started + index / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if expired():
+            break
+
+        await in_flight.acquire()
+        task = asyncio.ensure_future(send(query, scheduled))
+        task.add_done_callback(lambda _: in_flight.release())
+        tasks.append(task)
+
+    await asyncio.gather(*tasks)
+
+
+def format_summary(summary):
+    """Format a load test summary as a table & error breakdown.
+
+    Arguments:
+        summary {dict} -- Summary from LoadResult.summary
+
+    Returns:
+        {str} -- Formatted summary
+    """
+
+    def number(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    lines = [
+        f"{'query type':<15}{'sent':>8}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}"
+        f"{'p99 ms':>10}{'max ms':>10}{'q/s':>9}"
+    ]
+    for query_type, result in summary.items():
+        values = [number(result[key]) for key in ("p50", "p90", "p99", "max")]
+        lines.append(
+            f"{query_type:<15}{result['requests']:>8}"
+            f"{sum(result['errors'].values()):>8}"
+            + "".join(f"{value:>10}" for value in values)
+            + f"{result['throughput']:>9.1f}"
+        )
+
+    errors = [
+        f"  {query_type:<15}{error:<24}{count:>8}"
+        for query_type, result in summary.items()
+        if query_type != "all"
+        for error, count in sorted(result["errors"].items())
+    ]
+    if errors:
+        lines.extend(("", "Errors:", *errors))
+
+    return "\n".join(lines)
@@ -7,11 +7,12 @@ from datetime import datetime, timedelta
 from functools import wraps
 
 # Third Party
-from click import group, style, option, confirm, help_option
+from click import IntRange, FloatRange, group, style, option, confirm, help_option
 
 # Project
 from hyperglass_agent.util import color_support
-from hyperglass_agent.cli.echo import error, label, warning
+from hyperglass_agent.cli.echo import error, label, warning, report_startup
+from hyperglass_agent.cli.bench import DEFAULT_MIX, DEFAULT_REQUESTS
 from hyperglass_agent.cli.static import WARNING
 
 # Define working directory
@@ -42,6 +43,15 @@ def _print_version(ctx, param, value):
     ctx.exit()
 
 
+def _profile_startup(ctx, param, value):
+    from hyperglass_agent import profiling
+
+    if not value or ctx.resilient_parsing:
+        return
+    profiling.enable()
+    ctx.call_on_close(report_startup)
+
+
 def catch(func):
     """Catch any unhandled exceptions."""
 
@@ -69,6 +79,14 @@ def catch(func):
     is_eager=True,
     help="hyperglass version",
 )
+@option(
+    "--profile-startup",
+    is_flag=True,
+    callback=_profile_startup,
+    expose_value=False,
+    is_eager=True,
+    help="Report the time taken by imports & config loading",
+)
 @help_option("-h", "--help", help="Show this help message")
 def cli():
     """Click command group."""
@@ -153,6 +171,91 @@ def _start_web_server():
     start_web_server()
 
 
+@cli.command("bench", help="Send queries to an agent & report latency")
+@option(
+    "-u",
+    "--url",
+    required=False,
+    type=str,
+    help="Agent query URL (default: this agent's /query/ endpoint)",
+)
+@option(
+    "-m",
+    "--mix",
+    default=DEFAULT_MIX,
+    show_default=True,
+    help="Query types & relative weights",
+)
+@option(
+    "-t",
+    "--target",
+    "targets",
+    multiple=True,
+    help="Query target as QUERY_TYPE=TARGET, may be repeated",
+)
+@option("-a", "--afi", default="ipv4_default", show_default=True, help="Query AFI")
+@option("--vrf", default="default", show_default=True, help="Query VRF")
+@option(
+    "-n",
+    "--requests",
+    type=IntRange(min=1),
+    help=f"Number of queries (default: {DEFAULT_REQUESTS}, unless --duration)",
+)
+@option("-d", "--duration", type=FloatRange(min=0), help="Seconds to send queries for")
+@option(
+    "-c",
+    "--concurrency",
+    type=IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Maximum queries in flight",
+)
+@option("-r", "--rate", type=FloatRange(min=0.1), help="Queries per second")
+@option("--timeout", type=float, default=60, show_default=True, help="Response timeout")
+@option("--no-verify", "verify", is_flag=True, default=True, flag_value=False)
+@option("--json", "as_json", is_flag=True, help="Print results as JSON")
+@option("--seed", type=int, help="Random seed for query selection")
+@catch
+def _bench(
+    url,
+    mix,
+    targets,
+    afi,
+    vrf,
+    requests,
+    duration,
+    concurrency,
+    rate,
+    timeout,
+    verify,
+    as_json,
+    seed,
+):
+    """Send signed queries to an agent & report latency, errors & throughput.
+
+    Without --rate, --concurrency clients each send a query as soon as their
+    previous query completes. With --rate, queries are sent on schedule with
+    at most --concurrency in flight.
+    """
+    from hyperglass_agent.cli.actions import run_bench
+
+    run_bench(
+        url=url,
+        mix=mix,
+        targets=targets,
+        afi=afi,
+        vrf=vrf,
+        requests=requests,
+        duration=duration,
+        concurrency=concurrency,
+        rate=rate,
+        timeout=timeout,
+        verify=verify,
+        as_json=as_json,
+        seed=seed,
+    )
+
+
 @cli.command("setup", help="Run the setup wizard")
 @option(
     "--no-config",
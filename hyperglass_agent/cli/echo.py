@@ -4,8 +4,6 @@ import re
 
 # Third Party
 from click import echo, style
-from inquirer import prompt
-from inquirer.themes import load_theme_from_dict
 
 # Project
 from hyperglass_agent.util import color_support
@@ -13,8 +11,20 @@ from hyperglass_agent.cli.static import Message
 from hyperglass_agent.cli.exceptions import CliError
 
 
+def report_startup():
+    """Print the startup profile, if startup is being profiled."""
+    from hyperglass_agent import profiling
+
+    report = profiling.finish()
+    if report is not None:
+        echo(report, err=True)
+
+
 def inquire(questions):
     """Run inquire.prompt() with a theme if supported."""
+    from inquirer import prompt
+    from inquirer.themes import load_theme_from_dict
+
     theme = None
 
     supports_color, num_colors = color_support()
@@ -0,0 +1,67 @@
+"""Share a single execution between identical concurrent queries."""
+
+# Standard Library
+import asyncio
+
+
+class _Call:
+    """In-flight execution & the number of callers waiting on it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the execution, and every caller for
+    that key, including the first, awaits the same result or exception.
+    A caller that is cancelled (for example, because its client
+    disconnected) stops waiting without affecting the others. The execution
+    itself is only cancelled once no callers are left waiting on it.
+    """
+
+    def __init__(self):
+        """Initialize with no in-flight executions."""
+        self._calls = {}
+
+    def __len__(self):
+        """Get the number of in-flight executions.
+
+        Returns:
+            {int} -- In-flight executions
+        """
+        return len(self._calls)
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def run(self, key, func, *args, **kwargs):
+        """Await the in-flight execution for a key, or start one.
+
+        Arguments:
+            key {Hashable} -- Key identifying identical calls
+            func {function} -- Coroutine function to execute
+
+        Returns:
+            {Any} -- Return value of func
+        """
+        call = self._calls.get(key)
+
+        if call is None:
+            call = _Call(asyncio.ensure_future(func(*args, **kwargs)))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
@@ -3,16 +3,26 @@
 # Standard Library
 import os
 from pathlib import Path
+from threading import Lock
+from collections import namedtuple
 
 # Third Party
 import yaml
 from pydantic import ValidationError
 
 # Project
-from hyperglass_agent.log import log, set_log_level, enable_file_logging
+from hyperglass_agent.log import (
+    log,
+    log_payload,
+    set_log_level,
+    set_max_payload,
+    enable_file_logging,
+)
 from hyperglass_agent.util import set_app_path
+from hyperglass_agent.profiling import phase
 from hyperglass_agent.exceptions import ConfigError, ConfigInvalid
 from hyperglass_agent.models.general import General
+from hyperglass_agent.nos_utils.bird import BIRD_VERSION_CACHE
 from hyperglass_agent.models.commands import Commands
 
 if os.environ.get("hyperglass_agent_directory") is None:
@@ -27,6 +37,11 @@ except KeyError:
 
 CONFIG_FILE = APP_PATH / "config.yaml"
 
+Config = namedtuple("Config", ("params", "commands"))
+
+_config = None
+_config_lock = Lock()
+
 
 def _get_config():
     """Read config file & load YAML to dict.
@@ -47,46 +62,139 @@ def _get_config():
         raise ConfigError("Config file not found.") from None
 
     except (yaml.YAMLError, yaml.MarkedYAMLError) as yaml_error:
-        raise ConfigError(yaml_error) from None
+        raise ConfigError("Invalid YAML: {error}", error=str(yaml_error)) from None
     return raw_config
 
 
-_raw_config = _get_config()
+def _validate_config(raw_config):
+    """Validate a loaded config file.
 
-# Read raw debug value from config to enable debugging quickly.
-set_log_level(logger=log, debug=_raw_config.get("debug", True))
+    Arguments:
+        raw_config {dict} -- Loaded config
 
-try:
-    _commands = _raw_config.pop("commands", None)
-    _user_config = General(**_raw_config)
-
-    if _commands is not None:
-        _user_commands = Commands.import_params(mode=_user_config.mode, **_commands)
-    else:
-        _user_commands = Commands.import_params(mode=_user_config.mode)
-
-except ValidationError as validation_errors:
-    _errors = validation_errors.errors()
-    for error in _errors:
-        raise ConfigInvalid(
-            field=": ".join([str(item) for item in error["loc"]]),
-            error_msg=error["msg"],
+    Raises:
+        ConfigInvalid: Raised if the config file is invalid.
+
+    Returns:
+        {Config} -- Validated params & commands
+    """
+    try:
+        user_commands = raw_config.pop("commands", None) or {}
+        user_config = General(**raw_config)
+        user_commands = Commands.import_params(
+            mode=user_config.mode,
+            bird_version_cache=APP_PATH / BIRD_VERSION_CACHE,
+            **user_commands,
         )
 
-params = _user_config
-commands = _user_commands
+    except ValidationError as validation_errors:
+        errors = validation_errors.errors()
+        for error in errors:
+            raise ConfigInvalid(
+                field=": ".join([str(item) for item in error["loc"]]),
+                error_msg=error["msg"],
+            )
 
-# Re-evaluate debug state after config is validated
-set_log_level(logger=log, debug=params.debug)
+    log_payload("Config: ", user_config.json)
+    log_payload("Commands: ", user_commands.json)
+    return Config(params=user_config, commands=user_commands)
+
+
+def _load_config():
+    """Read, validate & apply the config file.
+
+    Returns:
+        {Config} -- Validated params & commands
+    """
+    raw_config = _get_config()
+
+    # Read raw debug value from config to enable debugging quickly.
+    set_log_level(logger=log, debug=raw_config.get("debug", True))
+
+    config = _validate_config(raw_config)
+
+    # Re-evaluate debug state after config is validated
+    set_log_level(logger=log, debug=config.params.debug)
+
+    if config.params.logging is not False:
+        set_max_payload(config.params.logging.max_payload)
+
+        # Set up file logging once configuration parameters are initialized.
+        enable_file_logging(
+            logger=log,
+            log_directory=config.params.logging.directory,
+            log_format=config.params.logging.format,
+            log_max_size=config.params.logging.max_size,
+            level="DEBUG" if config.params.debug else "INFO",
+        )
+
+    return config
+
+
+def load_config():
+    """Load the config file, once.
+
+    Returns:
+        {Config} -- Validated params & commands
+    """
+    global _config
+
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                with phase("config"):
+                    _config = _load_config()
+    return _config
+
+
+def read_config():
+    """Read & validate the config file again, without making it active.
+
+    Returns:
+        {Config} -- Validated params & commands
+    """
+    return _validate_config(_get_config())
+
+
+def swap_config(config):
+    """Make a validated config active.
+
+    Logging is set up once, so changed `debug` & `logging` settings only
+    take effect after a restart.
+
+    Arguments:
+        config {Config} -- Validated params & commands
+    """
+    global _config
+
+    with _config_lock:
+        _config = config
+
+
+class LazyConfig:
+    """Proxy to part of the config, which loads the config when first used.
+
+    Importing this module only finds the application path, so that commands
+    which do not use the config, & the imports of modules which do, don't pay
+    for reading & validating it.
+    """
+
+    def __init__(self, name):
+        """Initialize a proxy to a field of `Config`.
+
+        Arguments:
+            name {str} -- `Config` field
+        """
+        self._name = name
+
+    def __getattr__(self, attr):
+        """Get an attribute of the loaded config."""
+        return getattr(getattr(load_config(), self._name), attr)
+
+    def __repr__(self):
+        """Represent the loaded config."""
+        return repr(getattr(load_config(), self._name))
 
-if params.logging is not False:
-    # Set up file logging once configuration parameters are initialized.
-    enable_file_logging(
-        logger=log,
-        log_directory=params.logging.directory,
-        log_format=params.logging.format,
-        log_max_size=params.logging.max_size,
-    )
 
-log.debug(params.json())
-log.debug(commands.json())
+params = LazyConfig("params")
+commands = LazyConfig("commands")
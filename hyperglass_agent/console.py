@@ -1,7 +1,17 @@
 """hyperglass-agent CLI entrypoint."""
 
+# Standard Library
+import sys
+
 # Project
-from hyperglass_agent.cli.commands import cli
+from hyperglass_agent import profiling
+
+# Imports are measured from here, so profiling must start before the CLI is
+# imported, rather than when the CLI's option is parsed.
+if "--profile-startup" in sys.argv[1:]:
+    profiling.enable()
+
+from hyperglass_agent.cli.commands import cli  # noqa: E402
 
 if __name__ == "__main__":
     cli()
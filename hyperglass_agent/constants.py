@@ -16,6 +16,11 @@ AGENT_QUERY = ("bgp_route", "bgp_aspath", "bgp_community")
 
 OS_QUERY = ("ping", "traceroute")
 
+ADMIN_ACTIONS = ("reload",)
+
+# Characters of payloads, such as query output, included in debug logs.
+DEFAULT_MAX_PAYLOAD = 4096
+
 AFI_DISPLAY_MAP = {
     "ipv4_default": "IPv4",
     "ipv6_default": "IPv6",
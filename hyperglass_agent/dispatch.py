@@ -0,0 +1,164 @@
+"""Prepare per-query type executors when the configuration is loaded."""
+
+# Standard Library
+import operator
+from types import MappingProxyType
+from collections import namedtuple
+
+# Project
+from hyperglass_agent.constants import AGENT_QUERY, AFI_DISPLAY_MAP, SUPPORTED_QUERY
+from hyperglass_agent.exceptions import ConfigError
+from hyperglass_agent.nos_utils.frr import parse_frr_output, parse_frr_routes
+from hyperglass_agent.models.request import Request
+from hyperglass_agent.nos_utils.bird import (
+    parse_bird_output,
+    parse_bird_routes,
+    parse_bird_stream,
+    format_bird_bgp_aspath,
+    format_bird_bgp_community,
+)
+from hyperglass_agent.models.commands import Command
+from hyperglass_agent.models._formatters import CommandTemplate, format_frr_json
+
+target_format_map = {
+    "bird": {
+        "bgp_community": format_bird_bgp_community,
+        "bgp_aspath": format_bird_bgp_aspath,
+    },
+    "frr": {},
+}
+parser_map = {"bird": parse_bird_output, "frr": parse_frr_output}
+stream_parser_map = {"bird": parse_bird_stream}
+structured_parser_map = {"bird": parse_bird_routes, "frr": parse_frr_routes}
+
+_Executor = namedtuple(
+    "Executor",
+    (
+        "afi",
+        "query_type",
+        "template",
+        "formatter",
+        "parser",
+        "stream_parser",
+        "ttl",
+        "deadline",
+        "stock",
+    ),
+)
+
+
+class Executor(_Executor):
+    """Everything needed to execute one query type for one AFI."""
+
+    __slots__ = ()
+
+    def target(self, query):
+        """Format a validated query's target for the command.
+
+        Arguments:
+            query {object} -- Validated query object
+
+        Returns:
+            {str} -- Formatted target
+        """
+        if self.formatter is not None:
+            return self.formatter(query.target)
+        return query.target
+
+    def command(self, query):
+        """Construct the command for a validated query.
+
+        The query itself is not modified.
+
+        Arguments:
+            query {object} -- Validated query object
+
+        Returns:
+            {list|str} -- Command arguments, or a command string if the
+            command must be run by a shell
+        """
+        fields = {name: getattr(query, name) for name in self.template.names}
+        if "target" in fields:
+            fields["target"] = self.target(query)
+
+        if self.template.shell:
+            return self.template.string(**fields)
+        return self.template.argv(**fields)
+
+
+def stock_command(commands, mode, afi, query_type):
+    """Get the default command of an AFI & query type, as validated.
+
+    Arguments:
+        commands {object} -- Validated command object
+        mode {str} -- Agent mode
+        afi {str} -- AFI
+        query_type {str} -- Query type
+
+    Returns:
+        {str} -- Command
+    """
+    afi_commands = getattr(getattr(commands, mode), afi)
+    # Rebuild the AFI's commands from its other settings, i.e. BIRD's version.
+    settings = afi_commands.dict(exclude=set(Command.__fields__))
+    return getattr(type(afi_commands).parse_obj(settings), query_type)
+
+
+def build_dispatch(params, commands):
+    """Build an executor for each AFI & query type with a defined command.
+
+    Arguments:
+        params {object} -- Validated config object
+        commands {object} -- Validated command object
+
+    Raises:
+        ConfigError: Raised if a command references an unknown field.
+
+    Returns:
+        {MappingProxyType} -- Read-only mapping of (afi, query_type) to Executor
+    """
+    mode = params.mode
+    dispatch = {}
+    for afi in AFI_DISPLAY_MAP:
+        for query_type in SUPPORTED_QUERY:
+            try:
+                command = operator.attrgetter(".".join((mode, afi, query_type)))(
+                    commands
+                )
+            except AttributeError:
+                continue
+
+            stock = command == stock_command(commands, mode, afi, query_type)
+            parser = parser_map[mode]
+            stream_parser = stream_parser_map.get(mode)
+
+            if params.structured and query_type in AGENT_QUERY:
+                parser = structured_parser_map[mode]
+                stream_parser = None
+                if mode == "frr":
+                    command = format_frr_json(command)
+
+            template = CommandTemplate(command)
+            unknown = template.names.difference(Request.__fields__)
+
+            if unknown:
+                raise ConfigError(
+                    "{afi} {query_type} command references unknown fields: {fields}",
+                    afi=afi,
+                    query_type=query_type,
+                    fields=", ".join(sorted(unknown)),
+                )
+
+            dispatch[(afi, query_type)] = Executor(
+                afi=afi,
+                query_type=query_type,
+                template=template,
+                formatter=target_format_map[mode].get(query_type),
+                parser=parser,
+                stream_parser=stream_parser,
+                ttl=getattr(params.cache.ttl, query_type),
+                deadline=getattr(params.deadline, query_type),
+                stock=stock,
+            )
+
+    return MappingProxyType(dispatch)
@@ -144,7 +144,53 @@ class ExecutionError(_UnformattedHyperglassError):
     _code = 503
 
 
+class DeadlineExceeded(_UnformattedHyperglassError):
+    """Raised when a query does not complete before its deadline."""
+
+    _code = 504
+
+
+class ClientDisconnected(_UnformattedHyperglassError):
+    """Raised when a client disconnects before its query completes."""
+
+    _code = 499
+
+
 class SecurityError(_UnformattedHyperglassError):
     """Raised when a JWT decoding error occurs."""
 
     _code = 500
+
+
+class RetryableHyperglassError(_UnformattedHyperglassError):
+    """Base exception class for errors the client should retry later."""
+
+    def __init__(self, unformatted_msg="undefined error", retry_after=1, **kwargs):
+        """Format error message & set the delay before a retry.
+
+        Keyword Arguments:
+            retry_after {int} -- Seconds the client should wait (default: {1})
+        """
+        self._retry_after = retry_after
+        super().__init__(unformatted_msg, **kwargs)
+
+    @property
+    def retry_after(self):
+        """Return the instance's `retry_after` attribute.
+
+        Returns:
+            {int} -- Seconds the client should wait before retrying
+        """
+        return self._retry_after
+
+
+class QueueFull(RetryableHyperglassError):
+    """Raised when too many queries are waiting to be executed."""
+
+    _code = 429
+
+
+class QueueTimeout(RetryableHyperglassError):
+    """Raised when a query waits too long to be executed."""
+
+    _code = 503
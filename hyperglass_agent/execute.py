@@ -1,81 +1,966 @@
 """Construct, execute, parse, and return the requested query."""
 
 # Standard Library
+import os
+import time
+import shlex
+import signal
 import asyncio
-import operator
+from contextlib import contextmanager
 
 # Project
 from hyperglass_agent.log import log
-from hyperglass_agent.config import params, commands
-from hyperglass_agent.exceptions import ResponseEmpty, ExecutionError
-from hyperglass_agent.nos_utils.frr import parse_frr_output
+from hyperglass_agent.rib import RibSnapshot, rib_key, dump_commands, version_commands
+from hyperglass_agent.cache import ResultCache, SharedResultCache, in_table, cache_key
+from hyperglass_agent.config import load_config, read_config, swap_config
+from hyperglass_agent.limiter import AdaptiveLimiter
+from hyperglass_agent.metrics import timed_stage
+from hyperglass_agent.coalesce import SingleFlight
+from hyperglass_agent.dispatch import build_dispatch
+from hyperglass_agent.constants import OS_QUERY, AGENT_QUERY, SUPPORTED_QUERY
+from hyperglass_agent.exceptions import (
+    QueryError,
+    ResponseEmpty,
+    ExecutionError,
+    DeadlineExceeded,
+    HyperglassAgentError,
+)
+from hyperglass_agent.nos_utils.frr import (
+    VtyshPool,
+    parse_frr_table,
+    parse_frr_table_version,
+)
 from hyperglass_agent.nos_utils.bird import (
-    parse_bird_output,
-    format_bird_bgp_aspath,
-    format_bird_bgp_community,
+    BirdPool,
+    parse_bird_table,
+    format_bird_reply,
+    parse_bird_table_version,
 )
+from hyperglass_agent.models._formatters import unformat_frr, unformat_bird
+
+# Settings which are applied once at startup, so a reload can't change them.
+RESTART_SETTINGS = ("listen_address", "port", "ssl", "workers", "debug", "logging")
 
-target_format_map = {
-    "bird": {
-        "bgp_community": format_bird_bgp_community,
-        "bgp_aspath": format_bird_bgp_aspath,
-    },
-    "frr": {},
+table_parser_map = {"bird": parse_bird_table, "frr": parse_frr_table}
+table_version_parser_map = {
+    "bird": parse_bird_table_version,
+    "frr": parse_frr_table_version,
 }
-parser_map = {"bird": parse_bird_output, "frr": parse_frr_output}
 
 
-async def run_query(query):
-    """Execute validated query & parse the results.
+class Runtime:
+    """Validated config & the backends built from it.
+
+    A query uses the runtime that was active when it started until it
+    completes, so that a reloaded config is swapped in without changing the
+    commands, limits or sessions of queries in flight. Backends whose
+    settings are unchanged are carried over from the previous runtime, so
+    reloading doesn't empty the cache, respawn daemon sessions or discard
+    table snapshots.
+    """
+
+    def __init__(self, config, dispatch=None, previous=None):
+        """Build backends, or carry them over from the previous runtime.
+
+        Arguments:
+            config {Config} -- Validated params & commands
+
+        Keyword Arguments:
+            dispatch {MappingProxyType} -- Executors built from the config, or
+            None to build them (default: {None})
+            previous {Runtime} -- Runtime being replaced (default: {None})
+        """
+        self.params = config.params
+        self.commands = config.commands
+        self.config = config
+        self.dispatch = dispatch
+        if dispatch is None:
+            self.dispatch = build_dispatch(self.params, self.commands)
+
+        self.in_flight = SingleFlight()
+        self.background_tasks = []
+        self.active = 0
+        self._idle = None
+        self._replaced = None
+
+        self._build_limiters(previous)
+        carried = self._build_cache(previous)
+        self._build_pools(previous)
+        self._build_rib(previous, carried)
+
+    def _unchanged(self, previous, *names):
+        """Whether the previous runtime had the same settings."""
+        return previous is not None and all(
+            getattr(previous.params, name) == getattr(self.params, name)
+            for name in names
+        )
+
+    def _build_limiters(self, previous):
+        """Build a concurrency limiter for each query type."""
+        limits = self.params.limits
+        if self._unchanged(previous, "limits"):
+            self.limiters = previous.limiters
+        elif limits.enable:
+            self.limiters = {
+                query_type: AdaptiveLimiter(
+                    name=query_type,
+                    minimum=limits.minimum,
+                    maximum=getattr(limits.concurrency, query_type),
+                    queue_size=limits.queue_size,
+                    queue_timeout=limits.queue_timeout,
+                    tolerance=limits.tolerance,
+                )
+                for query_type in SUPPORTED_QUERY
+            }
+        else:
+            self.limiters = {}
+
+    def _build_cache(self, previous):
+        """Build the result cache, returning True if it was carried over."""
+        cache = self.params.cache
+
+        # A shared cache is created before workers are forked, so a worker
+        # can't replace it with one its siblings would share.
+        shared = previous is not None and isinstance(
+            previous.result_cache, SharedResultCache
+        )
+        if self._unchanged(previous, "cache") or shared:
+            self.result_cache = previous.result_cache
+        elif cache.enable and cache.backend == "shared":
+            self.result_cache = SharedResultCache(
+                max_size=cache.max_size, slot_size=cache.slot_size
+            )
+        elif cache.enable:
+            self.result_cache = ResultCache(max_size=cache.max_size)
+        else:
+            self.result_cache = None
+
+        carried = previous is not None and self.result_cache is previous.result_cache
+
+        # Cached output of the previous commands would be outdated.
+        outputs_changed = carried and (
+            previous.commands != self.commands
+            or not self._unchanged(previous, "mode", "structured", "not_found_message")
+        )
+        if self.result_cache is not None and outputs_changed:
+            self.result_cache.clear()
+        return carried
+
+    def _build_pools(self, previous):
+        """Build daemon session pools."""
+        pool = self.params.pool
+        if self._unchanged(previous, "mode", "pool"):
+            self.vtysh_pool = previous.vtysh_pool
+            self.bird_pools = previous.bird_pools
+            return
+
+        self.vtysh_pool = None
+        self.bird_pools = {}
+        if self.params.mode == "frr" and pool.enable:
+            self.vtysh_pool = VtyshPool(
+                command=shlex.split(pool.vtysh), size=pool.size, timeout=pool.timeout
+            )
+        elif self.params.mode == "bird" and pool.enable:
+            self.bird_pools = {
+                cli: BirdPool(path=path, size=pool.size, timeout=pool.timeout)
+                for cli, path in (
+                    ("birdc", pool.bird_socket),
+                    ("birdc6", pool.bird6_socket),
+                )
+            }
+
+    def _build_rib(self, previous, carried):
+        """Carry over table snapshots & versions if they are still valid."""
+        # Snapshots are dumps of the same tables if these are unchanged.
+        if self._unchanged(previous, "mode", "rib") and (
+            previous.commands.bird.bird_version == self.commands.bird.bird_version
+        ):
+            self.rib_snapshots = previous.rib_snapshots
+        else:
+            self.rib_snapshots = {}
+
+        if carried:
+            self.table_versions = previous.table_versions
+            self.table_generations = previous.table_generations
+        else:
+            self.table_versions = {}
+            self.table_generations = {}
+
+    def _pools(self):
+        return [self.vtysh_pool, *self.bird_pools.values()]
+
+    async def start(self, previous=None):
+        """Start daemon sessions & background tasks.
+
+        Keyword Arguments:
+            previous {Runtime} -- Runtime being replaced, whose sessions are
+            already started (default: {None})
+        """
+        started = previous._pools() if previous is not None else []
+        if self.vtysh_pool is not None and self.vtysh_pool not in started:
+            await self.vtysh_pool.start()
+        if self.params.rib.enable:
+            self.background_tasks.append(asyncio.ensure_future(maintain_rib(self)))
+        if self.result_cache is not None and self.params.cache.invalidate.enable:
+            self.background_tasks.append(asyncio.ensure_future(watch_tables(self)))
+
+    def stop_tasks(self):
+        """Cancel background tasks."""
+        while self.background_tasks:
+            self.background_tasks.pop().cancel()
+
+    async def stop(self, successor=None):
+        """Stop background tasks & daemon sessions.
+
+        Keyword Arguments:
+            successor {Runtime} -- Runtime replacing this one, whose sessions
+            are not stopped (default: {None})
+        """
+        self.stop_tasks()
+        keep = successor._pools() if successor is not None else []
+        for pool in self._pools():
+            if pool is not None and pool not in keep:
+                await pool.stop()
+
+    async def retire(self, successor):
+        """Stop once queries using this runtime have completed.
+
+        Arguments:
+            successor {Runtime} -- Runtime replacing this one
+        """
+        self.stop_tasks()
+        if self.active:
+            self._idle = asyncio.Event()
+            await self._idle.wait()
+
+        # Sessions carried over from the runtime this one replaced may still
+        # be in use by its queries.
+        if self._replaced is not None:
+            await self._replaced
+        await self.stop(successor)
+
+    @contextmanager
+    def pinned(self):
+        """Count a query as using this runtime until it completes."""
+        self.active += 1
+        try:
+            yield self
+        finally:
+            self.active -= 1
+            if not self.active and self._idle is not None:
+                self._idle.set()
+
+    def restart_required(self, config):
+        """List settings which differ in a config & need a restart to apply.
+
+        Arguments:
+            config {Config} -- Validated params & commands
+
+        Returns:
+            {list} -- Setting names
+        """
+        names = [
+            name
+            for name in RESTART_SETTINGS
+            if getattr(self.params, name) != getattr(config.params, name)
+        ]
+        shared = isinstance(self.result_cache, SharedResultCache)
+        if shared and self.params.cache != config.params.cache:
+            names.append("cache")
+        return names
+
+
+# Built on first use, so importing this module doesn't load the config.
+_runtime = None
+_reload_lock = None
+
+
+def current_runtime():
+    """Get the active runtime, building it from the config on first use.
+
+    Returns:
+        {Runtime} -- Active runtime
+    """
+    global _runtime
+
+    if _runtime is None:
+        _runtime = Runtime(load_config())
+    return _runtime
+
+
+async def start_backends():
+    """Start persistent daemon sessions & table snapshots, if enabled."""
+    await current_runtime().start()
+
+
+async def stop_backends():
+    """Stop persistent daemon sessions & table snapshots, if enabled."""
+    await current_runtime().stop()
+
+
+def refresh_runtime():
+    """Re-read the config file & replace the runtime before it is started.
+
+    Workers forked after the supervisor received SIGHUP would otherwise
+    start with the config the supervisor loaded at startup.
+
+    Raises:
+        ConfigError: Raised if the config file can't be read.
+        ConfigInvalid: Raised if the config file is invalid.
+    """
+    global _runtime
+
+    config = read_config()
+    _runtime = Runtime(config, previous=_runtime)
+    swap_config(config)
+
+
+def _prepare_config():
+    """Read & validate the config file, & build its executors."""
+    config = read_config()
+    return config, build_dispatch(config.params, config.commands)
+
+
+async def reload():
+    """Re-read the config file & atomically make it active.
+
+    The config is validated & its commands are compiled in a thread, so the
+    event loop keeps answering queries. Queries already in flight complete
+    with the previous runtime, whose remaining backends are stopped once
+    they have.
+
+    Raises:
+        ConfigError: Raised if the config file can't be read.
+        ConfigInvalid: Raised if the config file is invalid.
+
+    Returns:
+        {list} -- Changed settings which need a restart to apply
+    """
+    global _runtime, _reload_lock
+
+    if _reload_lock is None:
+        _reload_lock = asyncio.Lock()
+
+    async with _reload_lock:
+        loop = asyncio.get_event_loop()
+        config, dispatch = await loop.run_in_executor(None, _prepare_config)
+
+        previous = current_runtime()
+        restart = previous.restart_required(config)
+        successor = Runtime(config, dispatch=dispatch, previous=previous)
+
+        previous.stop_tasks()
+        await successor.start(previous)
+
+        _runtime = successor
+        swap_config(config)
+        successor._replaced = asyncio.ensure_future(previous.retire(successor))
+
+    log.info("Reloaded config")
+    if restart:
+        log.warning(
+            "Changed settings take effect after a restart: {}", ", ".join(restart)
+        )
+    return restart
+
+
+async def run_command(runtime, command, pooled=False):
+    """Execute a command & return its unparsed output.
 
     Arguments:
+        runtime {Runtime} -- Runtime
+        command {list} -- Command arguments
+
+    Keyword Arguments:
+        pooled {bool} -- Use a persistent daemon session (default: {False})
+
+    Raises:
+        ExecutionError: Raised if the command fails.
+
+    Returns:
+        {str} -- Raw output
+    """
+    if pooled:
+        raw_output = await execute_pooled(runtime, command)
+        if raw_output is not None:
+            return raw_output
+
+    proc = await spawn(command)
+    try:
+        stdout, stderr = await proc.communicate()
+    finally:
+        await kill_process(proc)
+
+    if stderr:
+        raise ExecutionError(stderr.decode())
+
+    return stdout.decode()
+
+
+async def watch_tables(runtime):
+    """Poll table versions & invalidate cached output of changed tables.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+    """
+    params, commands = runtime.config
+    table_versions = runtime.table_versions
+    table_generations = runtime.table_generations
+    tables = version_commands(
+        params.mode,
+        vrfs=params.cache.invalidate.vrfs,
+        bird_version=commands.bird.bird_version,
+    )
+    parser = table_version_parser_map[params.mode]
+
+    while True:
+        for key, command in tables.items():
+            afi, vrf = key
+            try:
+                raw_output = await run_command(runtime, command, pooled=True)
+                version = parser(raw_output, ip_version=int(afi[3]))
+            except HyperglassAgentError as err:
+                log.error("Unable to read table version for {}: {}", key, err)
+                continue
+
+            previous = table_versions.get(key)
+            table_versions[key] = version
+
+            if previous is not None and version != previous:
+                table_generations[key] = table_generations.get(key, 0) + 1
+                removed = runtime.result_cache.invalidate(
+                    lambda cached, afi=afi, vrf=vrf: in_table(cached, afi, vrf)
+                )
+                log.debug(
+                    "Table {} changed from version {} to {}, removed {} cached entries",
+                    key,
+                    previous,
+                    version,
+                    removed,
+                )
+
+        await asyncio.sleep(params.cache.invalidate.interval)
+
+
+async def refresh_rib(runtime, key, command):
+    """Replace a table snapshot with a new dump of the table.
+
+    Tables whose output exceeds `rib.max_size` aren't kept, so their queries
+    are executed by the routing daemon.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+        key {tuple} -- Table key
+        command {list} -- Command arguments that dump the table
+
+    Raises:
+        ExecutionError: Raised if the dump command fails.
+    """
+    params = runtime.params
+    start = time.monotonic()
+    raw_output = await run_command(runtime, command)
+
+    def build():
+        header, entries, table = table_parser_map[params.mode](raw_output)
+        return RibSnapshot(
+            entries,
+            header=header,
+            community_index_size=params.rib.community_index_size,
+            table=table,
+            max_size=params.rib.max_size,
+        )
+
+    # Parsing a full table takes a while, so don't block the event loop.
+    snapshot = await asyncio.get_event_loop().run_in_executor(None, build)
+
+    if not snapshot.complete:
+        runtime.rib_snapshots.pop(key, None)
+        log.warning(
+            "Table {} exceeds rib.max_size; queries will be executed by the "
+            "routing daemon",
+            key,
+        )
+        return
+
+    runtime.rib_snapshots[key] = snapshot
+
+    stats = snapshot.stats()
+    log.info(
+        "Loaded {} prefixes for {} in {:.3f}s: {}",
+        stats["prefixes"],
+        key,
+        time.monotonic() - start,
+        stats,
+    )
+
+    if not stats["community_index_complete"]:
+        log.warning(
+            "Community index for {} exceeds rib.community_index_size; "
+            "bgp_community queries will be executed by the routing daemon",
+            key,
+        )
+
+
+async def maintain_rib(runtime):
+    """Refresh every table snapshot periodically.
+
+    Snapshots carried over from a previous runtime are kept until they are
+    due to be refreshed.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+    """
+    params, commands = runtime.config
+    tables = dump_commands(
+        params.mode, vrfs=params.rib.vrfs, bird_version=commands.bird.bird_version
+    )
+    while True:
+        for key, command in tables.items():
+            snapshot = runtime.rib_snapshots.get(key)
+            if snapshot is not None and snapshot.age < params.rib.interval:
+                continue
+            try:
+                await refresh_rib(runtime, key, command)
+            except HyperglassAgentError as err:
+                log.error("Unable to refresh table snapshot for {}: {}", key, err)
+        await asyncio.sleep(params.rib.interval)
+
+
+async def query_rib(runtime, query):
+    """Answer a BGP query from a table snapshot, if possible.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+        query {object} -- Validated query object
+
+    Returns:
+        {str|None} -- Parsed output, or None if the query must be executed
+    """
+    params = runtime.params
+
+    # FRR snapshots hold detail output, which can't be structured.
+    if params.structured and params.mode == "frr":
+        return None
+
+    snapshot = runtime.rib_snapshots.get(rib_key(query.afi, query.vrf))
+
+    if snapshot is None or snapshot.age > params.rib.max_age:
+        return None
+
+    executor = get_executor(runtime, query)
+
+    # Snapshots reproduce the output of the default commands only.
+    if not executor.stock:
+        return None
+
+    bird = params.mode == "bird"
+
+    target = executor.target(query)
+
+    if query.query_type == "bgp_route":
+        raw_output = snapshot.bgp_route(target, covering=bird)
+    elif query.query_type == "bgp_aspath":
+        raw_output = snapshot.bgp_aspath(target, mask=bird)
+    elif query.query_type == "bgp_community":
+        # Communities are indexed in a common format. FRR rejects large &
+        # extended communities, so its error is returned by executing them.
+        raw_output = snapshot.bgp_community(query.target, standard=not bird)
+    else:
+        raw_output = None
+
+    if raw_output is None:
+        return None
+
+    parser_kwargs = {"banner": False} if bird else {}
+    return await executor.parser(
+        raw=raw_output,
+        query_data=query,
+        not_found=params.not_found_message,
+        **parser_kwargs,
+    )
+
+
+async def execute_pooled(runtime, command):
+    """Execute a command on a persistent daemon session, if possible.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+        command {list|str} -- Formatted command
+
+    Returns:
+        {str|None} -- Raw output, or None if the command can't be pooled
+    """
+    if isinstance(command, str):
+        return None
+
+    if runtime.vtysh_pool is not None:
+        vtysh_command = unformat_frr(command)
+        if vtysh_command is not None:
+            return await runtime.vtysh_pool.run(vtysh_command)
+
+    elif runtime.bird_pools:
+        bird_command = unformat_bird(command)
+        if bird_command is not None:
+            cli, cmd = bird_command
+            return format_bird_reply(await runtime.bird_pools[cli].run(cmd))
+
+    return None
+
+
+def get_executor(runtime, query):
+    """Get the executor for a validated query.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
         query {object} -- Validated query object
 
     Raises:
-        ExecutionError: If stderr exists
+        QueryError: Raised if no command is defined for the query.
+
+    Returns:
+        {Executor} -- Executor
+    """
+    try:
+        return runtime.dispatch[(query.afi, query.query_type)]
+    except KeyError:
+        raise QueryError(
+            "No {query_type} command is defined for {afi}",
+            query_type=query.query_type,
+            afi=query.afi,
+        ) from None
+
+
+def query_deadline(runtime, query):
+    """Get the seconds a validated query may take to complete.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+        query {object} -- Validated query object
+
+    Returns:
+        {float} -- Configured deadline, or the query's deadline if shorter
+    """
+    deadline = get_executor(runtime, query).deadline
+
+    if query.deadline is not None:
+        deadline = min(deadline, query.deadline)
+
+    return deadline
+
+
+async def kill_process(proc):
+    """Kill a process started in its own session & all of its children.
+
+    Arguments:
+        proc {Process} -- Process
+    """
+    if proc.returncode is None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+
+async def run_query(query, runtime=None):
+    """Return cached output for a validated query, or execute it.
+
+    Identical queries received while one is already executing wait for and
+    share its result. If the query's deadline passes, it stops waiting, and
+    the execution is cancelled if no other query is waiting on it.
+
+    Arguments:
+        query {object} -- Validated query object
+
+    Keyword Arguments:
+        runtime {Runtime} -- Runtime, or None for the active runtime
+        (default: {None})
+
+    Raises:
+        DeadlineExceeded: Raised if the query's deadline passes.
 
     Returns:
         {str} -- Parsed output string
     """
-    log.debug(f"Query: {query}")
+    if runtime is None:
+        runtime = current_runtime()
 
-    parser = parser_map[params.mode]
+    with runtime.pinned():
+        return await _run_query(runtime, query)
 
-    target_formatter = target_format_map[params.mode].get(query.query_type)
 
-    if target_formatter is not None:
-        query.target = target_formatter(query.target)
+async def _run_query(runtime, query):
+    result_cache = runtime.result_cache
+    key = cache_key(runtime.params.mode, query)
 
-    command_raw = operator.attrgetter(
-        ".".join([params.mode, query.afi, query.query_type])
-    )(commands)
+    if result_cache is not None:
+        output = result_cache.get(key)
 
-    command = command_raw.format(**query.dict())
+        if output is not None:
+            log.opt(lazy=True).debug(
+                "Cache hit for {}: {}", lambda: key, result_cache.stats
+            )
+            return output
 
-    log.debug(f"Formatted Command: {command}")
+    if query.query_type in AGENT_QUERY and runtime.rib_snapshots:
+        with timed_stage("rib", query):
+            output = await query_rib(runtime, query)
 
-    proc = await asyncio.create_subprocess_shell(
-        command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await proc.communicate()
+        if output is not None:
+            return output
+
+    deadline = query_deadline(runtime, query)
+    start = time.monotonic()
+
+    try:
+        return await asyncio.wait_for(
+            runtime.in_flight.run(key, _execute_and_cache, runtime, key, query),
+            deadline,
+        )
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(
+            "{query_type} query exceeded its {deadline}s deadline after {elapsed}s",
+            query_type=query.query_type,
+            deadline=deadline,
+            elapsed=round(time.monotonic() - start, 3),
+        ) from None
+
+
+async def _execute_and_cache(runtime, key, query):
+    # If the table changes while the query executes, its output may already be
+    # outdated, so it isn't cached.
+    table = rib_key(query.afi, query.vrf)
+    generation = runtime.table_generations.get(table)
+
+    limiter = runtime.limiters.get(query.query_type)
+
+    if limiter is None:
+        output = await execute_query(runtime, query)
+    else:
+        output = await limiter.run(execute_query, runtime, query)
+
+    result_cache = runtime.result_cache
+    if result_cache is not None:
+        if runtime.table_generations.get(table) == generation:
+            result_cache.set(key, output, get_executor(runtime, query).ttl)
+
+    return output
+
+
+def format_command(runtime, query):
+    """Construct the command for a validated query.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+        query {object} -- Validated query object
+
+    Returns:
+        {list|str} -- Command arguments, or a command string if the command
+        must be run by a shell
+    """
+    command = get_executor(runtime, query).command(query)
+    log.debug("Formatted Command: {}", command)
+    return command
+
+
+async def spawn(command):
+    """Start a command in its own session, without a shell if possible.
+
+    Arguments:
+        command {list|str} -- Command arguments, or a shell command string
+
+    Raises:
+        ExecutionError: Raised if the command can't be executed.
+
+    Returns:
+        {Process} -- Started process
+    """
+    kwargs = {
+        "stdout": asyncio.subprocess.PIPE,
+        "stderr": asyncio.subprocess.PIPE,
+        "start_new_session": True,
+    }
+
+    if isinstance(command, str):
+        return await asyncio.create_subprocess_shell(command, **kwargs)
+
+    try:
+        return await asyncio.create_subprocess_exec(*command, **kwargs)
+    except OSError as err:
+        raise ExecutionError(
+            "Unable to execute {cmd}: {err}", cmd=command[0], err=err.strerror
+        ) from None
+
+
+async def stream_query(query, runtime=None):
+    """Execute validated query & yield output lines as they are received.
+
+    Only ping & traceroute output is streamed; other query types yield
+    their complete output once.
+
+    Arguments:
+        query {object} -- Validated query object
+
+    Keyword Arguments:
+        runtime {Runtime} -- Runtime, or None for the active runtime
+        (default: {None})
+
+    Raises:
+        ExecutionError: If stderr exists
+
+    Yields:
+        {str} -- Output line
+    """
+    if runtime is None:
+        runtime = current_runtime()
+
+    if query.query_type not in OS_QUERY:
+        yield await run_query(query, runtime)
+        return
+
+    with runtime.pinned():
+        lines = _stream_query(runtime, query)
+        try:
+            async for line in lines:
+                yield line
+        finally:
+            await lines.aclose()
+
+
+async def _stream_query(runtime, query):
+    log.debug("Query: {}", query)
+
+    deadline = query_deadline(runtime, query)
+    start = time.monotonic()
+
+    def remaining():
+        return deadline - (time.monotonic() - start)
+
+    limiter = runtime.limiters.get(query.query_type)
+    acquired = False
+    failed = False
+    latency = None
+    proc = None
+
+    try:
+        if limiter is not None:
+            await asyncio.wait_for(limiter.acquire(), remaining())
+            acquired = True
+
+        proc = await spawn(format_command(runtime, query))
+
+        while True:
+            line = await asyncio.wait_for(proc.stdout.readline(), remaining())
+            if not line:
+                break
+            yield line.decode()
+
+        stderr = await asyncio.wait_for(proc.stderr.read(), remaining())
+        await asyncio.wait_for(proc.wait(), remaining())
+        latency = time.monotonic() - start
+
+        if stderr:
+            failed = True
+            err_output = stderr.decode()
+            log.error(err_output)
+            raise ExecutionError(err_output)
+
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(
+            "{query_type} query exceeded its {deadline}s deadline after {elapsed}s",
+            query_type=query.query_type,
+            deadline=deadline,
+            elapsed=round(time.monotonic() - start, 3),
+        ) from None
+
+    finally:
+        if proc is not None:
+            await kill_process(proc)
+
+        # Queries stopped by their deadline or client are released unmeasured.
+        if acquired:
+            limiter.release(latency, failed=failed)
+
+
+async def execute_query(runtime, query):
+    """Execute validated query & parse the results.
+
+    Arguments:
+        runtime {Runtime} -- Runtime
+        query {object} -- Validated query object
+
+    Raises:
+        ExecutionError: If stderr exists
+
+    Returns:
+        {str} -- Parsed output string
+    """
+    log.debug("Query: {}", query)
+
+    params = runtime.params
+    executor = get_executor(runtime, query)
+    parser = executor.parser
+
+    command = format_command(runtime, query)
+
+    if query.query_type in AGENT_QUERY:
+        with timed_stage("execute", query):
+            raw_output = await execute_pooled(runtime, command)
+        if raw_output is not None:
+            parser_kwargs = {"banner": False} if params.mode == "bird" else {}
+            with timed_stage("parse", query):
+                return await parser(
+                    raw=raw_output,
+                    query_data=query,
+                    not_found=params.not_found_message,
+                    **parser_kwargs,
+                )
+
+    with timed_stage("spawn", query):
+        proc = await spawn(command)
+    try:
+        if executor.stream_parser is not None:
+            # Parse stdout as it is received, reading stderr concurrently so
+            # that neither pipe can fill up & block the process. Parsing is
+            # included in the execute stage.
+            log.debug("Parser: {}", executor.stream_parser.__name__)
+            stderr_reader = asyncio.ensure_future(proc.stderr.read())
+            try:
+                with timed_stage("execute", query):
+                    output = await executor.stream_parser(
+                        proc.stdout,
+                        query_data=query,
+                        not_found=params.not_found_message,
+                    )
+                    stderr = await stderr_reader
+            finally:
+                stderr_reader.cancel()
+            await proc.wait()
+        else:
+            with timed_stage("execute", query):
+                stdout, stderr = await proc.communicate()
+    finally:
+        # Kill the process group if the query is cancelled, i.e. because its
+        # deadline passed or its client disconnected.
+        await kill_process(proc)
 
     if stderr:
         err_output = stderr.decode()
         log.error(err_output)
         raise ExecutionError(err_output)
 
-    output = ""
+    if executor.stream_parser is None:
+        output = None
+        if stdout:
+            log.debug("Parser: {}", parser.__name__)
+            with timed_stage("parse", query):
+                output = await parser(
+                    raw=stdout.decode(),
+                    query_data=query,
+                    not_found=params.not_found_message,
+                )
 
-    if stdout:
-        log.debug(f"Parser: {parser.__name__}")
-
-        raw_output = stdout.decode()
-        output += await parser(
-            raw=raw_output, query_data=query, not_found=params.not_found_message
-        )
-        return output
-
-    if not output and proc.returncode == 0:
+    if output is None and proc.returncode == 0:
         raise ResponseEmpty("Command ran successfully, but the response was empty.")
 
-    return output
+    return output or ""
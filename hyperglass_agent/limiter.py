@@ -0,0 +1,203 @@
+"""Adaptive admission control in front of the routing daemon."""
+
+# Standard Library
+import math
+import time
+import asyncio
+from collections import deque
+
+# Project
+from hyperglass_agent.log import log
+from hyperglass_agent.exceptions import QueueFull, QueueTimeout, ExecutionError
+
+
+class AdaptiveLimiter:
+    """Concurrency limit for one query type, adjusted by observed latency.
+
+    The limit grows additively while queries complete within `tolerance`
+    times the baseline (fastest recently observed) latency, and is cut
+    multiplicatively when they don't, or when they fail. Queries over the
+    limit wait in a bounded FIFO queue for at most `queue_timeout` seconds.
+    """
+
+    # Multiplicative decrease factor applied to the limit on congestion.
+    backoff = 0.5
+
+    # Rate at which the baseline latency drifts upward per sample, so that it
+    # follows the daemon if its unloaded latency increases over time.
+    drift = 0.01
+
+    def __init__(
+        self, name, minimum, maximum, queue_size, queue_timeout, tolerance,
+    ):
+        """Initialize a limiter starting at its maximum limit.
+
+        Arguments:
+            name {str} -- Query type
+            minimum {int} -- Lowest concurrency limit
+            maximum {int} -- Highest concurrency limit
+            queue_size {int} -- Maximum number of waiting queries
+            queue_timeout {float} -- Seconds a query may wait
+            tolerance {float} -- Latency increase factor considered congestion
+        """
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self.baseline = None
+        self.latency = None
+        self._waiters = deque()
+
+    @property
+    def waiting(self):
+        """Get the number of queued queries.
+
+        Returns:
+            {int} -- Queued queries
+        """
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Estimate the seconds until the queue has room.
+
+        Returns:
+            {int} -- Seconds
+        """
+        latency = self.latency or 1
+        return max(1, math.ceil(latency * (self.waiting + 1) / int(self.limit)))
+
+    async def acquire(self):
+        """Wait for an execution slot.
+
+        Raises:
+            QueueFull: Raised if the queue is full.
+            QueueTimeout: Raised if no slot is available before the deadline.
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            raise QueueFull(
+                "Too many {query_type} queries are queued",
+                retry_after=self.retry_after(),
+                query_type=self.name,
+            )
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+
+        except asyncio.TimeoutError:
+            raise QueueTimeout(
+                "{query_type} query was queued for more than {t} seconds",
+                retry_after=self.retry_after(),
+                query_type=self.name,
+                t=self.queue_timeout,
+            ) from None
+
+        except asyncio.CancelledError:
+            # A slot may have been handed to this waiter as it was cancelled.
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency, failed=False):
+        """Return an execution slot & adjust the limit.
+
+        Queries cancelled before completing, i.e. by their deadline or their
+        client disconnecting, don't adjust the limit, since their latency is
+        unknown.
+
+        Arguments:
+            latency {float|None} -- Seconds the query took to execute, or None
+            if it was cancelled
+
+        Keyword Arguments:
+            failed {bool} -- Daemon failed to execute (default: {False})
+        """
+        if latency is None:
+            self._release_slot()
+            return
+
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline *= 1 + self.drift
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+
+        if failed or latency > self.baseline * self.tolerance:
+            limit = max(self.minimum, self.limit * self.backoff)
+            if int(limit) < int(self.limit):
+                log.debug(
+                    "Decreasing {} limit to {}: latency {:.3f}s, baseline {:.3f}s",
+                    self.name,
+                    int(limit),
+                    latency,
+                    self.baseline,
+                )
+        else:
+            limit = min(self.maximum, self.limit + 1 / self.limit)
+
+        self.limit = limit
+        self._release_slot()
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def run(self, func, *args, **kwargs):
+        """Execute a coroutine function once a slot is available.
+
+        Arguments:
+            func {function} -- Coroutine function to execute
+
+        Returns:
+            {Any} -- Return value of func
+        """
+        await self.acquire()
+        start = time.monotonic()
+        failed = False
+        cancelled = False
+        try:
+            return await func(*args, **kwargs)
+        except ExecutionError:
+            failed = True
+            raise
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            latency = None if cancelled else time.monotonic() - start
+            self.release(latency, failed=failed)
+
+    def stats(self):
+        """Get limiter state.
+
+        Returns:
+            {dict} -- Limiter state
+        """
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "latency": self.latency,
+            "baseline": self.baseline,
+        }
@@ -8,6 +8,9 @@ from datetime import datetime
 # Third Party
 from loguru import logger as _loguru_logger
 
+# Project
+from hyperglass_agent.constants import DEFAULT_MAX_PAYLOAD
+
 _LOG_FMT = (
     "<lvl><b>[{level}]</b> {time:YYYYMMDD} {time:HH:mm:ss} <lw>|</lw> {name}<lw>:</lw>"
     "<b>{line}</b> <lw>|</lw> {function}</lvl> <lvl><b>→</b></lvl> {message}"
@@ -22,6 +25,8 @@ _LOG_LEVELS = [
     {"name": "CRITICAL", "no": 50, "color": "<r>"},
 ]
 
+_max_payload = DEFAULT_MAX_PAYLOAD
+
 
 def base_logger():
     """Initialize hyperglass logging instance."""
@@ -47,7 +52,56 @@ def set_log_level(logger, debug):
     return True
 
 
-def enable_file_logging(logger, log_directory, log_format, log_max_size):
+def set_max_payload(size):
+    """Set the characters of payloads included in debug logs.
+
+    Arguments:
+        size {int} -- Maximum characters, or 0 to not truncate payloads
+    """
+    global _max_payload
+    _max_payload = size
+
+
+def truncate(payload, size=None):
+    """Shorten a payload for logging.
+
+    Arguments:
+        payload {Any} -- Payload
+
+    Keyword Arguments:
+        size {int} -- Maximum characters, or None for the configured maximum
+        (default: {None})
+
+    Returns:
+        {str} -- Payload, truncated if longer than the maximum
+    """
+    if size is None:
+        size = _max_payload
+    text = payload if isinstance(payload, str) else str(payload)
+    if size and len(text) > size:
+        return f"{text[:size]}... ({len(text) - size} more characters)"
+    return text
+
+
+def log_payload(message, payload):
+    """Log a payload at DEBUG, only formatting it if DEBUG is enabled.
+
+    Use instead of an f-string on hot paths, since large payloads would be
+    formatted on every request, & then discarded unless debugging.
+
+    Arguments:
+        message {str} -- Message preceding the payload, with no format fields
+        payload {Any|callable} -- Payload, or callable returning it if it is
+        costly to build
+    """
+
+    def build():
+        return truncate(payload() if callable(payload) else payload)
+
+    log.opt(lazy=True, depth=1).debug(message + "{}", build)
+
+
+def enable_file_logging(logger, log_directory, log_format, log_max_size, level):
     """Set up file-based logging from configuration parameters."""
 
     if log_format == "json":
@@ -78,7 +132,13 @@ def enable_file_logging(logger, log_directory, log_format, log_max_size):
         with log_file.open("a+") as lf:
             lf.write(f'\n\n{"".join(log_break)}\n\n')
 
-    logger.add(log_file, rotation=log_max_size, serialize=structured, enqueue=True)
+    logger.add(
+        log_file,
+        level=level,
+        rotation=log_max_size,
+        serialize=structured,
+        enqueue=True,
+    )
 
     logger.debug("Logging to file enabled")
 
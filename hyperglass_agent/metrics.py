@@ -0,0 +1,321 @@
+"""Query metrics in the Prometheus text exposition format.
+
+Metrics are kept per process, so with multiple workers each scrape of
+`/metrics` reports the worker which answered it.
+"""
+
+# Standard Library
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Project
+from hyperglass_agent.config import params
+from hyperglass_agent.constants import AFI_DISPLAY_MAP
+
+# Starlette appends the charset to text media types.
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+SIZE_BUCKETS = tuple(256 * 4 ** exponent for exponent in range(9))
+
+QUERY_LABELS = ("mode", "afi", "query_type")
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Metric:
+    """Metric with a value per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, description, labels=()):
+        """Initialize a metric with no values.
+
+        Arguments:
+            name {str} -- Metric name
+            description {str} -- Help text
+            labels {tuple} -- Label names
+        """
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+
+    def _samples(self):
+        for values, value in self._values.items():
+            yield self.name, _labels(self.labels, values), value
+
+    def render(self):
+        """Render the metric.
+
+        Returns:
+            {str} -- Metric in the text exposition format
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, *values, amount=1):
+        """Increment the count of a combination of label values."""
+        self._values[values] = self._values.get(values, 0) + amount
+
+
+class Gauge(Metric):
+    """Value which may increase & decrease."""
+
+    kind = "gauge"
+
+    def inc(self, *values, amount=1):
+        """Increment the value of a combination of label values."""
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def dec(self, *values, amount=1):
+        """Decrement the value of a combination of label values."""
+        self._values[values] = self._values.get(values, 0) - amount
+
+    def set(self, value, *values):
+        """Set the value of a combination of label values."""
+        self._values[values] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        """Initialize a histogram with no observations.
+
+        Arguments:
+            name {str} -- Metric name
+            description {str} -- Help text
+            labels {tuple} -- Label names
+            buckets {tuple} -- Ascending bucket upper bounds
+        """
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *values):
+        """Record an observation for a combination of label values."""
+        series = self._values.get(values)
+        if series is None:
+            # Per-bucket counts, with a final +Inf bucket, & the sum.
+            series = self._values[values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _samples(self):
+        bounds = self.buckets + (float("inf"),)
+        for values, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                labels = _labels(self.labels, values, f'le="{_number(bound)}"')
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _labels(self.labels, values)
+            yield f"{self.name}_sum", labels, series[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+STAGE_SECONDS = Histogram(
+    "hyperglass_agent_stage_seconds",
+    "Time spent in each stage of a query.",
+    ("stage",) + QUERY_LABELS,
+)
+QUERY_SECONDS = Histogram(
+    "hyperglass_agent_query_seconds",
+    "Time to answer a query, from validation to output.",
+    QUERY_LABELS,
+)
+OUTPUT_BYTES = Histogram(
+    "hyperglass_agent_output_bytes",
+    "Size of query output.",
+    QUERY_LABELS,
+    buckets=SIZE_BUCKETS,
+)
+QUERIES_IN_FLIGHT = Gauge(
+    "hyperglass_agent_queries_in_flight",
+    "Queries currently being answered.",
+    QUERY_LABELS,
+)
+ERRORS = Counter(
+    "hyperglass_agent_errors_total",
+    "Errors returned to clients, by exception class.",
+    ("error",) + QUERY_LABELS,
+)
+
+METRICS = (STAGE_SECONDS, QUERY_SECONDS, OUTPUT_BYTES, QUERIES_IN_FLIGHT, ERRORS)
+
+
+def query_labels(query=None):
+    """Get the label values of a query.
+
+    Keyword Arguments:
+        query {object} -- Validated query object, or None if the query could
+        not be validated (default: {None})
+
+    Returns:
+        {tuple} -- Mode, AFI & query type
+    """
+    if query is None:
+        return (params.mode, "", "")
+
+    # Unknown AFIs are grouped, so that clients can't create unbounded series.
+    afi = query.afi if query.afi in AFI_DISPLAY_MAP else "other"
+    return (params.mode, afi, query.query_type)
+
+
+def observe_stage(stage, query, seconds):
+    """Record the time a stage of a query took.
+
+    Arguments:
+        stage {str} -- Stage name
+        query {object} -- Validated query object
+        seconds {float} -- Duration
+    """
+    STAGE_SECONDS.observe(seconds, stage, *query_labels(query))
+
+
+@contextmanager
+def timed_stage(stage, query):
+    """Record the time a stage of a query takes, including if it fails.
+
+    Arguments:
+        stage {str} -- Stage name
+        query {object} -- Validated query object
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe_stage(stage, query, time.monotonic() - start)
+
+
+@contextmanager
+def query_in_flight(query):
+    """Count a query as in flight & record its duration.
+
+    Arguments:
+        query {object} -- Validated query object
+    """
+    labels = query_labels(query)
+    QUERIES_IN_FLIGHT.inc(*labels)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        QUERIES_IN_FLIGHT.dec(*labels)
+        QUERY_SECONDS.observe(time.monotonic() - start, *labels)
+
+
+def observe_output(query, output):
+    """Record the size of a query's output.
+
+    Arguments:
+        query {object} -- Validated query object
+        output {str} -- Output
+    """
+    OUTPUT_BYTES.observe(len(output), *query_labels(query))
+
+
+def count_error(err, query=None):
+    """Count an error returned to a client.
+
+    Arguments:
+        err {Exception} -- Error
+
+    Keyword Arguments:
+        query {object} -- Validated query object, if validated
+        (default: {None})
+    """
+    ERRORS.inc(type(err).__name__, *query_labels(query))
+
+
+def _state_gauges(result_cache, limiters, rib_snapshots):
+    """Build gauges from the current state of the agent's backends."""
+    cache = Gauge(
+        "hyperglass_agent_cache", "Result cache counters, by counter.", ("counter",)
+    )
+    if result_cache is not None:
+        for counter, value in result_cache.stats().items():
+            cache.set(value, counter)
+
+    limits = Gauge(
+        "hyperglass_agent_limiter",
+        "Concurrency limiter state, by query type & field.",
+        ("query_type", "field"),
+    )
+    for query_type, limiter in limiters.items():
+        for field, value in limiter.stats().items():
+            if value is not None:
+                limits.set(value, query_type, field)
+
+    snapshots = Gauge(
+        "hyperglass_agent_rib_snapshot",
+        "Table snapshot size & age, by AFI, VRF & field.",
+        ("afi", "vrf", "field"),
+    )
+    for (afi, vrf), snapshot in rib_snapshots.items():
+        fields = dict(snapshot.stats(), age=snapshot.age)
+        for field, value in fields.items():
+            snapshots.set(value, afi, vrf or "default", field)
+
+    return cache, limits, snapshots
+
+
+def render(result_cache=None, limiters=None, rib_snapshots=None):
+    """Render all metrics.
+
+    Keyword Arguments:
+        result_cache {ResultCache} -- Result cache (default: {None})
+        limiters {dict} -- Limiters by query type (default: {None})
+        rib_snapshots {dict} -- Table snapshots by table (default: {None})
+
+    Returns:
+        {str} -- Metrics in the text exposition format
+    """
+    state = _state_gauges(result_cache, limiters or {}, rib_snapshots or {})
+    return "\n".join(metric.render() for metric in METRICS + state) + "\n"
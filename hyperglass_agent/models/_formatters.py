@@ -1,5 +1,11 @@
 """Various formatting functions for supported platforms."""
 
+# Standard Library
+import re
+import shlex
+from string import Formatter
+from pathlib import Path
+
 
 def format_bird(ip_version, bird_version, cmd):
     """Prefixes BIRD command with the appropriate BIRD CLI command.
@@ -22,6 +28,22 @@ def format_bird(ip_version, bird_version, cmd):
     return command
 
 
+def unformat_bird(argv):
+    """Extract the BIRD command from a command prefixed by `format_bird`.
+
+    Arguments:
+        argv {list} -- Prefixed command arguments
+
+    Returns:
+        {tuple|None} -- BIRD CLI name & unprefixed command, or None if
+        command is not a single BIRD command.
+    """
+    if len(argv) != 2 or Path(argv[0]).name not in ("birdc", "birdc6"):
+        return None
+
+    return Path(argv[0]).name, argv[1]
+
+
 def format_frr(cmd):
     """Prefixes FRR command with the appropriate vtysh prefix.
 
@@ -32,3 +54,131 @@ def format_frr(cmd):
         {str} -- Prefixed command
     """
     return f'vtysh -uc "{cmd}"'
+
+
+def unformat_frr(argv):
+    """Extract the vtysh command from a command prefixed by `format_frr`.
+
+    Arguments:
+        argv {list} -- Prefixed command arguments
+
+    Returns:
+        {str|None} -- Unprefixed command, or None if command is not a
+        single vtysh command.
+    """
+    if len(argv) < 3 or Path(argv[0]).name != "vtysh":
+        return None
+
+    def is_command_flag(arg):
+        # Match `-c`, `--command`, or combined short flags such as `-uc`.
+        if arg == "--command":
+            return True
+        return arg.startswith("-") and not arg.startswith("--") and arg.endswith("c")
+
+    if not is_command_flag(argv[-2]) or any(is_command_flag(a) for a in argv[1:-2]):
+        return None
+
+    return argv[-1]
+
+
+def format_frr_json(command):
+    """Request JSON output from a command prefixed by `format_frr`.
+
+    Arguments:
+        command {str} -- Prefixed command
+
+    Returns:
+        {str} -- Prefixed command with JSON output, or the unmodified
+        command if it is not a single vtysh command.
+    """
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return command
+
+    vtysh_command = unformat_frr(argv)
+
+    if vtysh_command is None or vtysh_command.split()[-1:] == ["json"]:
+        return command
+
+    argv[-1] = f"{vtysh_command} json"
+    return " ".join(shlex.quote(arg) for arg in argv)
+
+
+class CommandTemplate:
+    """Command split into arguments once, to be formatted per query.
+
+    Fields such as `{target}` are substituted within the argument they
+    appear in, so a substituted value is always passed to the command as
+    part of a single argument and is never interpreted by a shell. Commands
+    that use shell syntax, such as pipes or variables, are run with a shell.
+    """
+
+    __slots__ = ("command", "shell", "args", "fields", "names")
+
+    def __init__(self, command):
+        """Split a command template into arguments.
+
+        Arguments:
+            command {str} -- Command template
+        """
+        self.command = command
+        self.shell = self._needs_shell(command)
+        self.args = () if self.shell else tuple(shlex.split(command))
+
+        # Only arguments containing fields need to be formatted per query.
+        self.fields = tuple(
+            (index, arg) for index, arg in enumerate(self.args) if "{" in arg
+        )
+
+        # Names of all fields referenced by the command, i.e. `target`.
+        self.names = frozenset(
+            re.split(r"[.\[]", name, 1)[0]
+            for _, name, _, _ in Formatter().parse(command)
+            if name
+        )
+
+    @staticmethod
+    def _needs_shell(command):
+        if "$" in command or "`" in command:
+            return True
+
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        try:
+            return any(
+                token and all(char in lexer.punctuation_chars for char in token)
+                for token in lexer
+            )
+        except ValueError:
+            # Unbalanced quotes; leave them for the shell to report.
+            return True
+
+    def __repr__(self):
+        """Represent the template by its command.
+
+        Returns:
+            {str} -- Representation
+        """
+        return f"CommandTemplate({self.command!r})"
+
+    def argv(self, **kwargs):
+        """Format each argument containing fields.
+
+        Returns:
+            {list} -- Command arguments
+        """
+        argv = list(self.args)
+        for index, arg in self.fields:
+            argv[index] = arg.format(**kwargs)
+        return argv
+
+    def string(self, **kwargs):
+        """Format the command as a string, quoting arguments if needed.
+
+        Returns:
+            {str} -- Formatted command
+        """
+        if self.shell:
+            return self.command.format(**kwargs)
+        return " ".join(shlex.quote(arg) for arg in self.argv(**kwargs))
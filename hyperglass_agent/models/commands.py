@@ -5,8 +5,9 @@ from pydantic import conint, root_validator
 
 # Project
 from hyperglass_agent.constants import AGENT_QUERY
+from hyperglass_agent.profiling import phase
 from hyperglass_agent.models._utils import HyperglassModel
-from hyperglass_agent.nos_utils.bird import get_bird_version
+from hyperglass_agent.nos_utils.bird import cached_bird_version
 from hyperglass_agent.models._formatters import format_frr, format_bird
 
 
@@ -152,7 +153,7 @@ class Commands(HyperglassModel):
     """Base class for all commands."""
 
     @classmethod
-    def import_params(cls, mode, input_params=None):
+    def import_params(cls, mode, input_params=None, bird_version_cache=None):
         """Import YAML config, dynamically set attributes for each NOS class.
 
         Arguments:
@@ -160,13 +161,16 @@ class Commands(HyperglassModel):
 
         Keyword Arguments:
             input_params {dict} -- Overidden commands (default: {None})
+            bird_version_cache {Path} -- File caching the detected BIRD
+            version (default: {None})
 
         Returns:
             {object} -- Validated command object
         """
         cmd_kwargs = {}
         if mode == "bird":
-            bird_version = get_bird_version()
+            with phase("bird_version"):
+                bird_version = cached_bird_version(bird_version_cache)
             cmd_kwargs.update({"bird_version": bird_version})
 
         obj = Commands()
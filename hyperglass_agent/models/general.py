@@ -2,7 +2,7 @@
 
 # Standard Library
 import os
-from typing import Union, Optional
+from typing import List, Union, Optional
 from pathlib import Path
 
 # Third Party
@@ -15,12 +15,14 @@ from pydantic import (
     StrictBool,
     DirectoryPath,
     IPvAnyAddress,
+    conint,
     constr,
+    confloat,
     validator,
 )
 
 # Project
-from hyperglass_agent.constants import DEFAULT_MODE, SUPPORTED_NOS
+from hyperglass_agent.constants import DEFAULT_MODE, SUPPORTED_NOS, DEFAULT_MAX_PAYLOAD
 from hyperglass_agent.exceptions import ConfigError
 from hyperglass_agent.models._utils import HyperglassModel
 
@@ -79,6 +81,7 @@ class Logging(HyperglassModel):
     directory: Union[DirectoryPath, StrictBool] = DEFAULT_LOG_DIR
     format: constr(regex=r"(text|json)") = "text"
     max_size: ByteSize = "50MB"
+    max_payload: conint(ge=0) = DEFAULT_MAX_PAYLOAD
 
     @validator("directory")
     def validate_directory(cls, value):
@@ -88,6 +91,155 @@ class Logging(HyperglassModel):
         return value
 
 
+class Pool(HyperglassModel):
+    """Validate persistent daemon session config parameters."""
+
+    enable: StrictBool = False
+    size: conint(ge=1, le=64) = 4
+    timeout: conint(ge=1) = 30
+    vtysh: StrictStr = "vtysh -u"
+    bird_socket: StrictStr = "/run/bird/bird.ctl"
+    bird6_socket: StrictStr = "/run/bird/bird6.ctl"
+
+
+class CacheTtl(HyperglassModel):
+    """Validate per-query type cache lifetimes, in seconds."""
+
+    bgp_route: conint(ge=0) = 60
+    bgp_aspath: conint(ge=0) = 300
+    bgp_community: conint(ge=0) = 300
+    ping: conint(ge=0) = 0
+    traceroute: conint(ge=0) = 0
+
+
+class Invalidate(HyperglassModel):
+    """Validate table version polling config parameters."""
+
+    enable: StrictBool = False
+    interval: confloat(gt=0) = 10
+    vrfs: List[StrictStr] = []
+
+
+class Cache(HyperglassModel):
+    """Validate query output cache config parameters."""
+
+    enable: StrictBool = False
+    backend: constr(regex=r"(memory|shared)") = "memory"
+    max_size: ByteSize = "64MB"
+    slot_size: ByteSize = "64KB"
+    ttl: CacheTtl = CacheTtl()
+    invalidate: Invalidate = Invalidate()
+
+    @validator("slot_size")
+    def validate_slot_size(cls, value, values):
+        """Pydantic validator: ensure at least one slot fits in the cache.
+
+        Arguments:
+            value {int} -- Slot size
+            values {dict} -- Other values
+
+        Raises:
+            ValueError: Raised if slot_size exceeds max_size.
+
+        Returns:
+            {int} -- Slot size
+        """
+        max_size = values.get("max_size")
+        if max_size is not None and value > max_size:
+            raise ValueError(f"slot_size must not exceed max_size ({max_size}).")
+        return value
+
+
+class Concurrency(HyperglassModel):
+    """Validate per-query type maximum concurrent executions."""
+
+    bgp_route: conint(ge=1) = 16
+    bgp_aspath: conint(ge=1) = 2
+    bgp_community: conint(ge=1) = 2
+    ping: conint(ge=1) = 8
+    traceroute: conint(ge=1) = 8
+
+
+class Limits(HyperglassModel):
+    """Validate admission control config parameters."""
+
+    enable: StrictBool = True
+    minimum: conint(ge=1) = 1
+    concurrency: Concurrency = Concurrency()
+    queue_size: conint(ge=0) = 64
+    queue_timeout: confloat(gt=0) = 30
+    tolerance: confloat(gt=1) = 2
+    batch_size: conint(ge=1) = 32
+
+    @validator("concurrency")
+    def validate_concurrency(cls, value, values):
+        """Pydantic validator: require each maximum to exceed the minimum.
+
+        Arguments:
+            value {Concurrency} -- Maximum concurrent executions
+            values {dict} -- Other values
+
+        Returns:
+            {Concurrency} -- Maximum concurrent executions
+        """
+        minimum = values.get("minimum", 1)
+        for query_type, maximum in value:
+            if maximum < minimum:
+                raise ValueError(
+                    f"{query_type} concurrency must be at least {minimum}."
+                )
+        return value
+
+
+class Deadline(HyperglassModel):
+    """Validate per-query type deadlines, in seconds."""
+
+    bgp_route: confloat(gt=0) = 30
+    bgp_aspath: confloat(gt=0) = 60
+    bgp_community: confloat(gt=0) = 60
+    ping: confloat(gt=0) = 30
+    traceroute: confloat(gt=0) = 60
+
+
+class Rib(HyperglassModel):
+    """Validate routing table snapshot config parameters."""
+
+    enable: StrictBool = False
+    interval: conint(ge=1) = 300
+    max_age: conint(ge=1) = 900
+    vrfs: List[StrictStr] = []
+    max_size: ByteSize = "1GB"
+    community_index_size: ByteSize = "256MB"
+
+    @validator("max_age")
+    def validate_max_age(cls, value, values):
+        """Pydantic validator: ensure snapshots can be refreshed before expiry.
+
+        Arguments:
+            value {int} -- Maximum snapshot age
+            values {dict} -- Other values
+
+        Raises:
+            ValueError: Raised if max_age is less than interval.
+
+        Returns:
+            {int} -- Maximum snapshot age
+        """
+        interval = values.get("interval")
+        if interval is not None and value < interval:
+            raise ValueError(f"max_age must be at least interval ({interval}).")
+        return value
+
+
+class Compression(HyperglassModel):
+    """Validate response compression config parameters."""
+
+    enable: StrictBool = True
+    min_size: ByteSize = "1KB"
+    gzip_level: conint(ge=1, le=9) = 6
+    zstd_level: conint(ge=1, le=22) = 3
+
+
 class General(HyperglassModel):
     """Validate config parameters."""
 
@@ -95,11 +247,20 @@ class General(HyperglassModel):
     listen_address: IPvAnyAddress = "0.0.0.0"  # noqa: S104
     ssl: Ssl = Ssl()
     logging: Logging = Logging()
+    pool: Pool = Pool()
+    cache: Cache = Cache()
+    limits: Limits = Limits()
+    deadline: Deadline = Deadline()
+    rib: Rib = Rib()
+    compression: Compression = Compression()
     port: StrictInt = None
+    workers: conint(ge=1) = 1
     mode: StrictStr = DEFAULT_MODE
     secret: SecretStr
     valid_duration: StrictInt = 60
     not_found_message: StrictStr = "{target} not found. ({afi})"
+    structured: StrictBool = False
+    metrics: StrictBool = False
 
     @validator("port", pre=True, always=True)
     def validate_port(cls, value, values):
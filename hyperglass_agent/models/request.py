@@ -1,13 +1,13 @@
 """Validate the raw JSON request data."""
 
 # Standard Library
-from typing import Union, Optional
+from typing import List, Union, Optional
 
 # Third Party
-from pydantic import BaseModel, StrictStr, IPvAnyAddress, validator
+from pydantic import BaseModel, StrictStr, IPvAnyAddress, confloat, validator
 
 # Project
-from hyperglass_agent.constants import SUPPORTED_QUERY
+from hyperglass_agent.constants import ADMIN_ACTIONS, SUPPORTED_QUERY
 from hyperglass_agent.exceptions import QueryError
 from hyperglass_agent.models._utils import StrictBytes
 
@@ -20,6 +20,8 @@ class Request(BaseModel):
     afi: str
     source: Optional[IPvAnyAddress]
     target: str
+    deadline: Optional[confloat(gt=0)]
+    compression: List[StrictStr] = []
 
     @validator("query_type")
     def validate_query_type(cls, value):  # noqa: N805
@@ -36,6 +38,37 @@ class Request(BaseModel):
         return value
 
 
+class BatchRequest(BaseModel):
+    """Validate raw batch request.
+
+    Each query is validated separately, so that an invalid query fails
+    alone rather than failing the batch.
+    """
+
+    queries: List[dict]
+    compression: List[StrictStr] = []
+
+
+class AdminRequest(BaseModel):
+    """Validate raw admin request."""
+
+    action: str
+
+    @validator("action")
+    def validate_action(cls, value):  # noqa: N805
+        """Pydantic validator: validate that the admin action is supported.
+
+        Raises:
+            QueryError: Raised if the received action is not supported.
+
+        Returns:
+            {str} -- Set action attribute if valid.
+        """
+        if value not in ADMIN_ACTIONS:
+            raise QueryError("Admin action '{action}' is Invalid", action=value)
+        return value
+
+
 class EncodedRequest(BaseModel):
     """Validate encoded request."""
 
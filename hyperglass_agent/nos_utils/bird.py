@@ -1,14 +1,61 @@
 """Various BIRD Internet Routing Daemon (BIRD) utilities."""
 
 # Standard Library
+import os
 import re
+import json
+import codecs
+import shutil
 import asyncio
+from datetime import datetime, timedelta
+from collections import deque, namedtuple
 
 # Project
-from hyperglass_agent.log import log
+from hyperglass_agent.log import log, log_payload
+from hyperglass_agent.rib import ASN, RibEntry, community_key
 from hyperglass_agent.util import top_level_async
 from hyperglass_agent.constants import AFI_DISPLAY_MAP
-from hyperglass_agent.exceptions import ExecutionError
+from hyperglass_agent.exceptions import QueryError, ExecutionError
+from hyperglass_agent.structured import dumps, route_record
+
+# A single line of a BIRD control socket reply. `code` is the numeric reply
+# code of the line, or of the preceding line for continuation lines.
+BirdLine = namedtuple("BirdLine", ("code", "text"))
+
+# Matches the banner birdc prints when it connects, i.e. `BIRD 2.0.7 ready.`
+BIRD_BANNER = re.compile(r"\s*BIRD \d+\.\d+(?:\.\d+)? ready\.")
+
+# Bytes read from a stream at a time.
+STREAM_CHUNK_SIZE = 2 ** 16
+
+BIRD_COMMUNITY_ATTRIBUTES = (
+    "BGP.community",
+    "BGP.large_community",
+    "BGP.ext_community",
+)
+
+BIRD_COMMUNITY = re.compile(r"\(([^)]*)\)")
+
+# Matches the protocol, time & best path marker of a route, i.e.
+# `[peer1 2020-01-01 12:00:00] *` or `[peer1 12:00:00.000 from 192.0.2.1] *`
+BIRD_ROUTE_SOURCE = re.compile(r"\[\S+ ([^\]]+?)(?: from \S+)?\]( \*)?")
+
+BIRD_VIA = re.compile(r"\bvia (\S+)")
+
+# Formats of the time a route changed, depending on BIRD's `timeformat route`.
+BIRD_ROUTE_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+)
+BIRD_ROUTE_CLOCK_FORMATS = ("%H:%M:%S.%f", "%H:%M:%S")
+
+# File in the application directory caching the detected BIRD version.
+BIRD_VERSION_CACHE = ".bird_version.json"
+
+# Detected BIRD versions by `bird` binary identity.
+_bird_versions = {}
 
 
 @top_level_async
@@ -52,11 +99,103 @@ async def get_bird_version():
     # Filter major release number & convert to int
     version = int(version_str[0])
 
-    log.debug(f"BIRD Major Version: {version_str[0]}")
+    log.debug("BIRD Major Version: {}", version_str[0])
     return version
 
 
-async def parse_bird_output(raw, query_data, not_found):
+def _bird_binary():
+    """Identify the `bird` binary, so that a changed binary is detected.
+
+    Returns:
+        {dict|None} -- Path, inode, size & modification time, or None if
+        `bird` is not found
+    """
+    path = shutil.which("bird")
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {
+        "path": os.path.realpath(path),
+        "inode": stat.st_ino,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+
+
+def cached_bird_version(cache_file=None):
+    """Get the BIRD version, cached until the `bird` binary changes.
+
+    `bird --version` is only run if the binary's path, inode, size or
+    modification time differ from when its version was cached.
+
+    Keyword Arguments:
+        cache_file {Path} -- File caching the version across restarts
+        (default: {None})
+
+    Returns:
+        {int} -- Major BIRD version.
+    """
+    binary = _bird_binary()
+    if binary is None:
+        return get_bird_version()
+
+    key = tuple(binary.values())
+    if key in _bird_versions:
+        return _bird_versions[key]
+
+    if cache_file is not None:
+        try:
+            with open(cache_file) as file:
+                cached = json.load(file)
+            if cached["binary"] == binary:
+                _bird_versions[key] = int(cached["version"])
+                return _bird_versions[key]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    version = _bird_versions[key] = get_bird_version()
+
+    if cache_file is not None:
+        temp_file = f"{cache_file}.{os.getpid()}"
+        try:
+            with open(temp_file, "w") as file:
+                json.dump({"binary": binary, "version": version}, file)
+            os.replace(temp_file, cache_file)
+        except OSError as err:
+            log.debug("Unable to cache BIRD version: {}", err)
+
+    return version
+
+
+def _bird_output(raw, query_data, not_found, banner=True):
+    start, end = 0, len(raw)
+
+    if banner:
+        match = BIRD_BANNER.match(raw)
+        if match is not None:
+            start = match.end()
+
+    # Strip whitespace by index, so that the output is copied at most once.
+    while start < end and raw[start].isspace():
+        start += 1
+    while end > start and raw[end - 1].isspace():
+        end -= 1
+
+    output = raw[start:end]
+
+    if not output:
+        output = not_found.format(
+            target=query_data.target, afi=AFI_DISPLAY_MAP[query_data.afi]
+        )
+
+    log_payload("Parsed output:\n", output)
+    return output
+
+
+async def parse_bird_output(raw, query_data, not_found, banner=True):
     """Parse raw BIRD output and return parsed output.
 
     Arguments:
@@ -64,28 +203,350 @@ async def parse_bird_output(raw, query_data, not_found):
         query_data {object} -- Validated query object
         not_found {str} -- Lookup not found message template
 
+    Keyword Arguments:
+        banner {bool} -- Output may contain the birdc banner (default: {True})
+
     Returns:
         str -- Parsed output
     """
+    return _bird_output(raw, query_data, not_found, banner=banner)
 
-    def remove_ready(lines):
-        for line in lines:
-            if not re.match(r".*(BIRD \d+\.\d+\.?\d* ready\.).*", line):
-                yield line.strip()
 
-    raw_split = re.split(r"(Table)", raw.strip())
+async def parse_bird_stream(stream, query_data, not_found):
+    """Parse BIRD output as it is read from a stream, i.e. a process' stdout.
 
-    if not raw_split:
-        notfound_message = not_found.format(
-            target=query_data.target, afi=AFI_DISPLAY_MAP[query_data.afi]
+    Output is decoded as it is received, rather than after the process
+    exits, so the raw bytes are never held in memory all at once, and the
+    output is only copied once more when the decoded chunks are joined.
+
+    Arguments:
+        stream {StreamReader} -- Raw BIRD output stream
+        query_data {object} -- Validated query object
+        not_found {str} -- Lookup not found message template
+
+    Returns:
+        {str|None} -- Parsed output, or None if the stream was empty
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    # birdc prints its banner on the first line.
+    first_line = await stream.readline()
+
+    if not first_line:
+        return None
+
+    chunks = [decoder.decode(first_line)]
+    match = BIRD_BANNER.match(chunks[0])
+    if match is not None:
+        chunks[0] = chunks[0][match.end() :]
+
+    while True:
+        data = await stream.read(STREAM_CHUNK_SIZE)
+        if not data:
+            break
+        chunks.append(decoder.decode(data))
+
+    chunks.append(decoder.decode(b"", final=True))
+
+    # Strip whitespace from the first & last chunks rather than the joined
+    # output, so that the output isn't copied again.
+    while chunks and not chunks[-1].strip():
+        chunks.pop()
+    while chunks and not chunks[0].strip():
+        chunks.pop(0)
+    if chunks:
+        chunks[0] = chunks[0].lstrip()
+        chunks[-1] = chunks[-1].rstrip()
+
+    raw = "".join(chunks)
+    chunks.clear()
+
+    return _bird_output(raw, query_data, not_found, banner=False)
+
+
+def _bird_communities(value):
+    """Normalize the communities of a BIRD community attribute.
+
+    Arguments:
+        value {str} -- Attribute value, i.e. `(65000,1) (65000,2)`
+
+    Returns:
+        {list} -- Communities in the format of rib.community_key
+    """
+    communities = []
+
+    # i.e. `(65000,1)`, `(65000, 1, 2)` or `(rt, 65000, 1)`
+    for community in BIRD_COMMUNITY.findall(value):
+        parts = [part.strip() for part in community.split(",")]
+        if parts[0] == "ro":
+            parts[0] = "soo"
+        key = community_key(":".join(parts))
+        if key is not None:
+            communities.append(key)
+
+    return communities
+
+
+def _bird_rib_entry(prefix, lines):
+    """Build a table entry from the lines of the routes to a prefix.
+
+    Arguments:
+        prefix {str} -- Prefix
+        lines {list} -- Lines of every route to the prefix
+
+    Returns:
+        {RibEntry} -- Table entry
+    """
+    as_paths = []
+    communities = set()
+
+    for line in lines:
+        name, _, value = line.strip().partition(":")
+        if name == "BGP.as_path":
+            as_paths.append(value.strip())
+        elif name in BIRD_COMMUNITY_ATTRIBUTES:
+            communities.update(_bird_communities(value))
+
+    return RibEntry(
+        prefix=prefix,
+        text="\n".join(lines),
+        as_paths=tuple(as_paths),
+        communities=tuple(communities),
+    )
+
+
+def parse_bird_table(raw):
+    """Split a `show route all` table dump into entries.
+
+    Each entry starts with a line beginning with its prefix, and includes
+    the indented lines of every route to that prefix that follow it.
+
+    Arguments:
+        raw {str} -- Raw BIRD output
+
+    Returns:
+        {tuple} -- Table header line, list of RibEntry records & no table
+        renderer, since the output of every query is made of entries
+    """
+    header = ""
+    entries = []
+    prefix = None
+    lines = []
+
+    for line in raw.splitlines():
+        if not line or line[0].isspace():
+            if prefix is not None:
+                lines.append(line)
+            continue
+
+        if prefix is not None:
+            entries.append(_bird_rib_entry(prefix, lines))
+        prefix = None
+        lines = []
+
+        if line.startswith("Table "):
+            header = header or line
+        elif not BIRD_BANNER.match(line):
+            prefix = line.split(None, 1)[0]
+            lines.append(line)
+
+    if prefix is not None:
+        entries.append(_bird_rib_entry(prefix, lines))
+    return header, entries, None
+
+
+def parse_bird_table_version(raw, ip_version):
+    """Sum route update & withdrawal counters in `show protocols all` output.
+
+    The counters only change when routes change, so the sum serves as a
+    table version. For BIRD 2, only counters of the IP version's channels
+    are included.
+
+    Arguments:
+        raw {str} -- Raw BIRD output
+        ip_version {int} -- IP version of the table
+
+    Returns:
+        {int} -- Table version
+    """
+    channel = None
+    total = 0
+
+    for line in raw.splitlines():
+        if line and not line[0].isspace():
+            # Start of a protocol.
+            channel = None
+            continue
+
+        name, _, value = line.strip().partition(":")
+
+        if name.startswith("Channel "):
+            channel = name.split()[1]
+
+        elif name in ("Import updates", "Import withdraws") and channel in (
+            None,
+            f"ipv{ip_version}",
+        ):
+            # The first counter is the number received.
+            received = value.split()[:1]
+            if received and received[0].isdigit():
+                total += int(received[0])
+
+    return total
+
+
+def _bird_route_age(since, now):
+    """Get the age of a route from the time BIRD shows it changed.
+
+    Arguments:
+        since {str} -- Time the route changed, i.e. `2020-01-01 12:00:00`
+        now {datetime} -- Current local time
+
+    Returns:
+        {int|None} -- Age in seconds, or None if the time is not understood
+    """
+    for time_format in BIRD_ROUTE_TIME_FORMATS:
+        try:
+            changed = datetime.strptime(since, time_format)
+        except ValueError:
+            continue
+        return max(int((now - changed).total_seconds()), 0)
+
+    for time_format in BIRD_ROUTE_CLOCK_FORMATS:
+        try:
+            clock = datetime.strptime(since, time_format).time()
+        except ValueError:
+            continue
+        # Times without a date are shown for routes which changed today.
+        changed = datetime.combine(now.date(), clock)
+        if changed > now:
+            changed -= timedelta(days=1)
+        return int((now - changed).total_seconds())
+
+    return None
+
+
+def _bird_next_hop(record, value):
+    if record["next_hop"] is None:
+        record["next_hop"] = value.split()[0] if value else None
+
+
+def _bird_as_path(record, value):
+    record["as_path"] = [int(asn) for asn in ASN.findall(value)]
+
+
+def _bird_route_communities(record, value):
+    record["communities"].extend(_bird_communities(value))
+
+
+def _bird_integer(field):
+    def parse(record, value):
+        if value.isdigit():
+            record[field] = int(value)
+
+    return parse
+
+
+# Functions updating a route record from the value of a route attribute.
+BIRD_ROUTE_ATTRIBUTES = {
+    "BGP.next_hop": _bird_next_hop,
+    "BGP.as_path": _bird_as_path,
+    "BGP.local_pref": _bird_integer("local_pref"),
+    "BGP.med": _bird_integer("med"),
+    **{name: _bird_route_communities for name in BIRD_COMMUNITY_ATTRIBUTES},
+}
+
+
+def _bird_route_attribute(record, line):
+    """Update a route record from one of its attribute lines.
+
+    Arguments:
+        record {dict} -- Route record
+        line {str} -- Attribute line, without indentation
+    """
+    if line.startswith("via "):
+        record["next_hop"] = record["next_hop"] or line.split()[1]
+        return
+
+    name, _, value = line.partition(":")
+    parse = BIRD_ROUTE_ATTRIBUTES.get(name)
+    if parse is not None:
+        parse(record, value.strip())
+
+
+def bird_route_records(raw):
+    """Parse `show route all` output into a record for each route.
+
+    Arguments:
+        raw {str} -- Raw BIRD output
+
+    Returns:
+        {list} -- Route records
+    """
+    now = datetime.now()
+    records = []
+    record = None
+    prefix = None
+
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
+
+        if line.startswith("\t") or (
+            # Attributes are indented by a tab, or by spaces by older versions.
+            line[0].isspace()
+            and record is not None
+            and BIRD_ROUTE_SOURCE.search(line) is None
+        ):
+            if record is not None:
+                _bird_route_attribute(record, line.strip())
+            continue
+
+        if not line[0].isspace():
+            # Start of a prefix, or a line which isn't part of a route.
+            prefix = None
+            record = None
+            if line.startswith("Table ") or BIRD_BANNER.match(line):
+                continue
+            prefix, _, line = line.partition(" ")
+
+        source = BIRD_ROUTE_SOURCE.search(line)
+        if prefix is None or source is None:
+            record = None
+            continue
+
+        via = BIRD_VIA.search(line)
+        record = route_record(
+            prefix=prefix,
+            next_hop=via.group(1) if via else None,
+            as_path=[],
+            communities=[],
+            age=_bird_route_age(source.group(1), now),
+            best=source.group(2) is not None,
         )
-        lines = notfound_message
-    else:
-        lines = raw_split
+        records.append(record)
 
-    output = "\n".join(remove_ready(lines))
-    log.debug(f"Parsed output:\n{output}")
-    return output
+    return records
+
+
+async def parse_bird_routes(raw, query_data, not_found, banner=True):
+    """Parse raw BIRD output into a JSON list of route records.
+
+    Arguments:
+        raw {str} -- Raw BIRD output
+        query_data {object} -- Validated query object
+        not_found {str} -- Lookup not found message template
+
+    Keyword Arguments:
+        banner {bool} -- Unused, since the banner is never part of a route
+        (default: {True})
+
+    Returns:
+        {str} -- JSON route records
+    """
+    records = bird_route_records(raw)
+    log.debug("Parsed {} routes", len(records))
+    return dumps(records)
 
 
 def format_bird_bgp_community(target):
@@ -126,3 +587,238 @@ def format_bird_bgp_aspath(target):
     asns.append("=]")
 
     return " ".join(asns)
+
+
+def parse_bird_line(raw):
+    """Parse a raw line received from the BIRD control socket.
+
+    Lines are prefixed by a four digit reply code followed by `-` if more
+    lines follow, or ` ` if the line is the last line of the reply. Lines
+    prefixed by a space continue the previous line's reply code.
+
+    Arguments:
+        raw {bytes} -- Raw line
+
+    Returns:
+        {tuple} -- Reply code (or None for continuations), text, final line
+    """
+    line = raw.decode().rstrip("\n")
+
+    if line[:4].isdigit() and line[4:5] in (" ", "-", ""):
+        return int(line[:4]), line[5:], line[4:5] != "-"
+
+    return None, line[1:], False
+
+
+def format_bird_reply(lines):
+    """Format reply lines as birdc would print them.
+
+    Arguments:
+        lines {list} -- BirdLine records
+
+    Returns:
+        {str} -- Formatted output
+    """
+    return "\n".join(line.text for line in lines if line.code != 0)
+
+
+class BirdConnection:
+    """Connection to the BIRD control socket.
+
+    Commands may be written before the replies to previous commands have
+    been received. BIRD answers commands in order, so each reply is matched
+    to the oldest outstanding command.
+    """
+
+    def __init__(self, path, timeout):
+        """Initialize an unconnected connection.
+
+        Arguments:
+            path {str} -- Control socket path
+            timeout {int} -- Seconds to wait for a reply
+        """
+        self.path = path
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._reply_task = None
+        self._lock = None
+        self._pending = deque()
+        self._active = 0
+
+    @property
+    def connected(self):
+        """Determine if the connection is open.
+
+        Returns:
+            {bool} -- True if connected
+        """
+        return self._reply_task is not None and not self._reply_task.done()
+
+    @property
+    def pending(self):
+        """Get the number of commands awaiting a connection or reply.
+
+        Returns:
+            {int} -- Outstanding commands
+        """
+        return self._active
+
+    async def _read_reply(self):
+        lines = []
+        code = None
+        while True:
+            raw = await self._reader.readline()
+            if not raw:
+                raise ConnectionResetError(f"{self.path} closed the connection")
+
+            line_code, text, final = parse_bird_line(raw)
+            if line_code is not None:
+                code = line_code
+            lines.append(BirdLine(code, text))
+
+            if final:
+                return lines
+
+    async def _read_replies(self):
+        try:
+            while True:
+                reply = await self._read_reply()
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(reply)
+
+        except (OSError, ValueError, IndexError) as err:
+            self._writer.close()
+            self._fail_pending(err)
+
+    def _fail_pending(self, err):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionResetError(str(err)))
+
+    async def connect(self):
+        """Open the control socket and enter restricted mode.
+
+        Raises:
+            ExecutionError: Raised if the socket can't be opened.
+        """
+        log.debug("Connecting to {}", self.path)
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(self.path), self.timeout
+            )
+            await asyncio.wait_for(self._read_reply(), self.timeout)
+
+            # Prevent any configuration changes from this connection.
+            self._writer.write(b"restrict\n")
+            restrict = await asyncio.wait_for(self._read_reply(), self.timeout)
+
+        except (OSError, asyncio.TimeoutError) as err:
+            raise ExecutionError(
+                "Unable to connect to {path}: {err}", path=self.path, err=repr(err)
+            ) from None
+
+        if restrict[-1].code != 16:
+            log.warning("Unable to restrict {}: {}", self.path, restrict[-1].text)
+
+        self._reply_task = asyncio.ensure_future(self._read_replies())
+
+    async def close(self):
+        """Close the connection, if open."""
+        if self.connected:
+            self._reply_task.cancel()
+            self._writer.close()
+        self._reply_task = None
+        self._fail_pending(f"Connection to {self.path} closed")
+
+    async def run(self, command):
+        """Execute a command and return its reply.
+
+        Arguments:
+            command {str} -- BIRD command
+
+        Raises:
+            QueryError: Raised if the command spans multiple lines.
+            ConnectionResetError: Raised if the connection is closed.
+            ExecutionError: Raised if BIRD does not reply in time.
+
+        Returns:
+            {list} -- BirdLine records
+        """
+        if "\n" in command or "\r" in command:
+            raise QueryError("Query contains invalid characters")
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        self._active += 1
+        try:
+            async with self._lock:
+                if not self.connected:
+                    await self.connect()
+
+            future = asyncio.get_event_loop().create_future()
+            self._writer.write(command.encode() + b"\n")
+            self._pending.append(future)
+
+            return await asyncio.wait_for(future, self.timeout)
+
+        except asyncio.TimeoutError:
+            raise ExecutionError(
+                "{path} did not respond within {t} seconds",
+                path=self.path,
+                t=self.timeout,
+            ) from None
+
+        finally:
+            self._active -= 1
+
+
+class BirdPool:
+    """Pool of persistent BIRD control socket connections.
+
+    Connections are opened on first use, and each command is sent on the
+    connection with the fewest outstanding commands.
+    """
+
+    def __init__(self, path, size, timeout):
+        """Initialize an unconnected pool.
+
+        Arguments:
+            path {str} -- Control socket path
+            size {int} -- Number of connections
+            timeout {int} -- Seconds to wait for a reply
+        """
+        self.connections = [BirdConnection(path, timeout) for _ in range(size)]
+
+    async def stop(self):
+        """Close all connections."""
+        await asyncio.gather(*(conn.close() for conn in self.connections))
+
+    async def run(self, command):
+        """Execute a command on the least busy connection.
+
+        A command whose connection is closed mid-command is retried once on a
+        new connection, since all commands sent through the pool are
+        read-only.
+
+        Arguments:
+            command {str} -- BIRD command
+
+        Raises:
+            ExecutionError: Raised if the command fails on a new connection.
+
+        Returns:
+            {list} -- BirdLine records
+        """
+        conn = min(self.connections, key=lambda c: (c.pending, not c.connected))
+        for attempt in range(2):
+            try:
+                return await conn.run(command)
+            except ConnectionError as err:
+                await conn.close()
+                if attempt == 1:
+                    raise ExecutionError(str(err)) from None
+                log.warning("Connection to {} closed, reconnecting", conn.path)
@@ -1,8 +1,75 @@
 """Various Free Range Routing (FRR) utilities."""
 
+# Standard Library
+import re
+import time
+import asyncio
+from functools import partial
+from itertools import count
+from collections import namedtuple
+
 # Project
-from hyperglass_agent.log import log
+from hyperglass_agent.log import log, log_payload
+from hyperglass_agent.rib import ASN, RibEntry, community_key
 from hyperglass_agent.constants import AFI_DISPLAY_MAP
+from hyperglass_agent.exceptions import QueryError, ExecutionError
+from hyperglass_agent.structured import dumps, loads, route_record
+
+# Matches a vtysh prompt, i.e. `router# ` or `router> `, at the start of a line.
+VTYSH_PROMPT = re.compile(r"^[\w.\-]+[#>] ?")
+
+# Matches the errors vtysh writes to stderr for commands it can't run, i.e.
+# `% Unknown command: show bgp` or `% [BGP] Unknown command: show bgp`.
+VTYSH_ERROR = re.compile(
+    r"^% (?:\[\w+\] )?(?:Unknown command|Ambiguous command|Command incomplete)"
+)
+
+# Matches the first line of each prefix in `show bgp ... detail` output.
+FRR_TABLE_ENTRY = re.compile(r"^BGP routing table entry for ([^\s,]+)", re.M)
+
+# Matches the next hop line of each path in `show bgp ... detail` output. The
+# line preceding it is the path's AS path.
+FRR_TABLE_NEXT_HOP = re.compile(r"^ {4}\S.* from \S")
+
+FRR_TABLE_VERSION = re.compile(r'"tableVersion":\s*(\d+)')
+
+# Matches the lines preceding the entries of `show bgp ...` output.
+FRR_TABLE_PREAMBLE = re.compile(
+    r"^(?:BGP table version is|Default local pref) .*$", re.M
+)
+
+# Legend & column headings preceding the rows of `show bgp ...` table output.
+FRR_TABLE_HEADER = (
+    "Status codes:  s suppressed, d damped, h history, * valid, > best, "
+    "= multipath,\n"
+    "               i internal, r RIB-failure, S Stale, R Removed\n"
+    "Nexthop codes: @NNN nexthop's vrf id, < announce-nh-self\n"
+    "Origin codes:  i - IGP, e - EGP, ? - incomplete\n"
+    "\n"
+    "   Network          Next Hop            Metric LocPrf Weight Path"
+)
+
+FRR_ORIGIN_CODES = {"IGP": "i", "EGP": "e", "incomplete": "?"}
+
+# A path's attributes, as displayed in a row of `show bgp ...` table output,
+# & its communities (see community_key).
+FrrPath = namedtuple(
+    "FrrPath",
+    (
+        "status",
+        "next_hop",
+        "metric",
+        "local_pref",
+        "weight",
+        "as_path",
+        "origin",
+        "communities",
+    ),
+)
+
+FRR_COMMUNITY_ATTRIBUTES = ("Community", "Large Community", "Extended Community")
+
+FRR_JSON_COMMUNITY_ATTRIBUTES = ("community", "largeCommunity", "extendedCommunity")
 
 
 async def parse_frr_output(raw, query_data, not_found):
@@ -25,5 +92,520 @@ async def parse_frr_output(raw, query_data, not_found):
     else:
         output = raw_split
 
-    log.debug(f"Parsed output:\n{output}")
+    log_payload("Parsed output:\n", output)
     return output
+
+
+def _frr_path_record(prefix, path, now):
+    """Create a route record from a path of FRR's JSON output.
+
+    Arguments:
+        prefix {str} -- Prefix
+        path {dict} -- Path
+        now {float} -- Current time
+
+    Returns:
+        {dict} -- Route record
+    """
+    # Prefix output nests attributes; table output flattens them.
+    as_path = path.get("aspath", {}).get("string", path.get("path", ""))
+
+    communities = []
+    for name in FRR_JSON_COMMUNITY_ATTRIBUTES:
+        for community in path.get(name, {}).get("string", "").split():
+            key = community_key(community)
+            if key is not None:
+                communities.append(key)
+
+    next_hop = None
+    for hop in path.get("nexthops", ()):
+        next_hop = hop.get("ip")
+        if next_hop is not None:
+            break
+
+    best = path.get("bestpath", False)
+    if isinstance(best, dict):
+        best = best.get("overall", False)
+
+    age = None
+    updated = path.get("lastUpdate", {}).get("epoch")
+    if updated is not None:
+        age = max(int(now - updated), 0)
+
+    return route_record(
+        prefix=prefix or path.get("network"),
+        next_hop=next_hop,
+        as_path=[int(asn) for asn in ASN.findall(as_path)],
+        communities=communities,
+        local_pref=path.get("localpref", path.get("locPrf")),
+        med=path.get("med", path.get("metric")),
+        age=age,
+        best=bool(best),
+    )
+
+
+async def parse_frr_routes(raw, query_data, not_found):
+    """Parse FRR's JSON output into a JSON list of route records.
+
+    Both `show bgp ... {prefix} json` and table output, such as that of
+    `show bgp ... regexp {target} json`, are supported.
+
+    Arguments:
+        raw {str} -- Raw JSON output from vtysh
+        query_data {object} -- Validated query object
+        not_found {str} -- Lookup not found message template
+
+    Raises:
+        ExecutionError: Raised if the output is not JSON.
+
+    Returns:
+        {str} -- JSON route records
+    """
+    raw = raw.strip()
+    if not raw:
+        return dumps([])
+
+    try:
+        data = loads(raw)
+    except ValueError:
+        data = None
+
+    if not isinstance(data, dict):
+        raise ExecutionError(raw)
+
+    now = time.time()
+    records = []
+
+    if "paths" in data:
+        prefix = data.get("prefix")
+        records.extend(_frr_path_record(prefix, p, now) for p in data["paths"])
+
+    for prefix, paths in data.get("routes", {}).items():
+        records.extend(_frr_path_record(prefix, p, now) for p in paths)
+
+    log.debug("Parsed {} routes", len(records))
+    return dumps(records)
+
+
+def _frr_as_path(line):
+    """Get the AS path from the line preceding a path's next hop line."""
+    # Remove annotations, i.e. `65000, (Received from a RR-client)`
+    as_path = line.strip().split(", (")[0]
+    return "" if as_path == "Local" else as_path
+
+
+def _frr_path(as_path, lines):
+    """Parse a path of `show bgp ... {prefix}` output.
+
+    Arguments:
+        as_path {str} -- AS path
+        lines {list} -- Lines of the path, from its next hop line
+
+    Returns:
+        {FrrPath} -- Path
+    """
+    values = {"Origin": "incomplete", "metric": "", "localpref": "", "weight": "0"}
+    flags = set()
+    communities = []
+
+    for line in lines[1:]:
+        line = line.strip()
+        if line.startswith("Origin "):
+            # I.e. `Origin IGP, metric 0, valid, external, best (Older Path)`
+            for item in line.split(", "):
+                name, _, value = item.partition(" ")
+                if name in values:
+                    values[name] = value
+                else:
+                    flags.add(name)
+            continue
+
+        name, _, value = line.partition(": ")
+        if name in FRR_COMMUNITY_ATTRIBUTES:
+            communities.extend(map(community_key, value.split()))
+
+    selected = " "
+    if "best" in flags:
+        selected = ">"
+    elif "multipath" in flags:
+        selected = "="
+
+    return FrrPath(
+        status=("*" if "valid" in flags else " ")
+        + selected
+        + ("i" if "internal" in flags else " "),
+        next_hop=lines[0].split()[0],
+        metric=values["metric"],
+        local_pref=values["localpref"],
+        weight=values["weight"],
+        as_path=as_path,
+        origin=FRR_ORIGIN_CODES.get(values["Origin"], "?"),
+        communities=tuple(key for key in communities if key is not None),
+    )
+
+
+def frr_paths(text):
+    """Parse the paths of a prefix's `show bgp ... {prefix}` output.
+
+    Arguments:
+        text {str} -- Output
+
+    Returns:
+        {list} -- FrrPath records
+    """
+    lines = text.splitlines()
+    starts = [
+        index
+        for index, line in enumerate(lines)
+        if index and FRR_TABLE_NEXT_HOP.match(line)
+    ]
+    # Each path ends before the AS path line of the next.
+    ends = [start - 1 for start in starts[1:]] + [len(lines)]
+    return [
+        _frr_path(_frr_as_path(lines[start - 1]), lines[start:end])
+        for start, end in zip(starts, ends)
+    ]
+
+
+def frr_table_row(network, path):
+    """Format a path as a row of `show bgp ...` table output.
+
+    As in FRR, values longer than the network or next hop column are
+    followed by a line break & the indentation of the next column.
+
+    Arguments:
+        network {str|None} -- Prefix, or None for paths after its first
+        path {FrrPath} -- Path
+
+    Returns:
+        {str} -- Row
+    """
+    if network is None:
+        network = " " * 17
+    elif len(network) < 17:
+        network = network.ljust(17)
+    else:
+        network += "\n" + " " * 20
+
+    next_hop = path.next_hop.ljust(16)
+    if len(path.next_hop) >= 16:
+        next_hop = path.next_hop + "\n" + " " * 36
+
+    as_path = f"{path.as_path} " if path.as_path else ""
+    return (
+        f"{path.status}{network}{next_hop}{path.metric:>10}{path.local_pref:>7}"
+        f"{path.weight:>7} {as_path}{path.origin}"
+    )
+
+
+def render_frr_table(entries, matches, preamble="", total_paths=0):
+    """Render entries as `show bgp ... regexp|community {target}` output.
+
+    Only the paths selected by `matches` are included, & each prefix is
+    shown on its first included path. Nothing is output if no paths match.
+
+    Arguments:
+        entries {Iterable} -- RibEntry records
+        matches {callable} -- Selects paths, given an FrrPath record
+
+    Keyword Arguments:
+        preamble {str} -- Table version & local AS lines (default: {""})
+        total_paths {int} -- Paths in the table (default: {0})
+
+    Returns:
+        {str} -- Output
+    """
+    rows = []
+    displayed = 0
+
+    for entry in entries:
+        network = entry.prefix
+        for path in frr_paths(entry.text):
+            if matches(path):
+                rows.append(frr_table_row(network, path))
+                network = None
+        if network is None:
+            displayed += 1
+
+    if not rows:
+        return ""
+
+    footer = f"Displayed  {displayed} routes and {total_paths} total paths"
+    return "\n".join(
+        [line for line in (preamble, FRR_TABLE_HEADER) if line] + rows + ["", footer]
+    )
+
+
+def parse_frr_table(raw):
+    """Split a `show bgp ... detail` table dump into entries.
+
+    Each entry is the output `show bgp ... {prefix}` would return. Other
+    queries are rendered as FRR's table output by the returned renderer.
+
+    Arguments:
+        raw {str} -- Raw output from vtysh
+
+    Returns:
+        {tuple} -- Output header, list of RibEntry records & table renderer
+    """
+
+    def attributes(lines):
+        as_paths = []
+        communities = set()
+
+        for line, following in zip(lines, lines[1:] + [""]):
+            if FRR_TABLE_NEXT_HOP.match(following):
+                as_paths.append(_frr_as_path(line))
+                continue
+
+            name, _, value = line.strip().partition(": ")
+            if name in FRR_COMMUNITY_ATTRIBUTES:
+                communities.update(map(community_key, value.split()))
+
+        communities.discard(None)
+        return tuple(as_paths), tuple(communities)
+
+    matches = list(FRR_TABLE_ENTRY.finditer(raw))
+    ends = [match.start() for match in matches[1:]] + [len(raw)]
+    entries = []
+
+    for match, end in zip(matches, ends):
+        text = raw[match.start() : end].rstrip()
+        as_paths, communities = attributes(text.splitlines())
+        entries.append(
+            RibEntry(
+                prefix=match.group(1),
+                text=text,
+                as_paths=as_paths,
+                communities=communities,
+            )
+        )
+
+    start = matches[0].start() if matches else len(raw)
+    table = partial(
+        render_frr_table,
+        preamble="\n".join(FRR_TABLE_PREAMBLE.findall(raw[:start])),
+        total_paths=sum(len(entry.as_paths) for entry in entries),
+    )
+    return "", entries, table
+
+
+def parse_frr_table_version(raw, ip_version):
+    """Get the BGP table version from `show bgp ... summary json` output.
+
+    Arguments:
+        raw {str} -- Raw output from vtysh
+        ip_version {int} -- IP version of the table
+
+    Raises:
+        ExecutionError: Raised if the output contains no table version.
+
+    Returns:
+        {int} -- Table version
+    """
+    match = FRR_TABLE_VERSION.search(raw)
+
+    if match is None:
+        raise ExecutionError(f"No BGP table version found in output: {raw}")
+
+    return int(match.group(1))
+
+
+class VtyshSession:
+    """Long-lived interactive vtysh process.
+
+    Each command written to the session is followed by an `echo` of a
+    unique marker, so the end of a response is the first line consisting
+    only of that marker. Lines starting with the vtysh prompt that echo
+    back our own input are removed from the response.
+
+    stderr is read with stdout, so that errors are read in order with the
+    response they belong to. Responses containing vtysh's errors are raised,
+    as errors on stderr of commands run by a new vtysh process are.
+    """
+
+    _ids = count()
+
+    def __init__(self, command, timeout):
+        """Initialize an unstarted session.
+
+        Arguments:
+            command {list} -- vtysh argv
+            timeout {int} -- Seconds to wait for a response
+        """
+        self.command = command
+        self.timeout = timeout
+        self.name = f"vtysh-{next(self._ids)}"
+        self._proc = None
+        self._markers = count()
+
+    @property
+    def alive(self):
+        """Determine if the underlying vtysh process is running.
+
+        Returns:
+            {bool} -- True if running
+        """
+        return self._proc is not None and self._proc.returncode is None
+
+    async def start(self):
+        """Spawn vtysh and disable paging."""
+        await self.close()
+        log.debug("Starting {}: {}", self.name, " ".join(self.command))
+        try:
+            self._proc = await asyncio.create_subprocess_exec(
+                *self.command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            await self.run("terminal length 0")
+        except OSError as err:
+            await self.close()
+            raise ExecutionError(
+                "Unable to start {cmd}: {err}", cmd=self.command[0], err=str(err)
+            ) from None
+
+    async def close(self):
+        """Terminate the vtysh process, if running."""
+        if self.alive:
+            log.debug("Stopping {}", self.name)
+            self._proc.kill()
+            await self._proc.wait()
+        self._proc = None
+
+    async def run(self, command):
+        """Execute a command and return its output.
+
+        Arguments:
+            command {str} -- vtysh command
+
+        Raises:
+            QueryError: Raised if the command spans multiple lines.
+            ConnectionResetError: Raised if vtysh exits.
+            ExecutionError: Raised if vtysh does not respond in time, or
+            can't run the command.
+
+        Returns:
+            {str} -- Command output
+        """
+        # Each line is run as a command by the interactive session.
+        if "\n" in command or "\r" in command:
+            raise QueryError("Query contains invalid characters")
+
+        marker = f"hyperglass-agent-{self.name}-{next(self._markers)}"
+
+        self._proc.stdin.write(f"{command}\necho {marker}\n".encode())
+
+        lines = []
+        try:
+            await asyncio.wait_for(self._proc.stdin.drain(), self.timeout)
+            while True:
+                raw = await asyncio.wait_for(self._proc.stdout.readline(), self.timeout)
+                if not raw:
+                    raise ConnectionResetError(f"{self.name} exited unexpectedly")
+
+                line = raw.decode().rstrip("\r\n")
+
+                if line.strip() == marker:
+                    break
+
+                echoed = VTYSH_PROMPT.sub("", line, count=1)
+                if echoed != line and echoed.strip() in (command, f"echo {marker}"):
+                    continue
+
+                lines.append(line)
+
+        except asyncio.TimeoutError:
+            await self.close()
+            raise ExecutionError(
+                "{name} did not respond within {t} seconds",
+                name=self.name,
+                t=self.timeout,
+            ) from None
+
+        errors = [line for line in lines if VTYSH_ERROR.match(line)]
+        if errors:
+            raise ExecutionError("{errors}", errors="\n".join(errors))
+
+        return "\n".join(lines)
+
+
+class VtyshPool:
+    """Pool of persistent vtysh sessions shared by all queries.
+
+    Queries wait for an idle session, so at most `size` commands are sent to
+    vtysh at once. Sessions that have exited are respawned before use.
+    """
+
+    def __init__(self, command, size, timeout):
+        """Initialize an unstarted pool.
+
+        Arguments:
+            command {list} -- vtysh argv
+            size {int} -- Number of sessions
+            timeout {int} -- Seconds to wait for a response
+        """
+        self.sessions = [VtyshSession(command, timeout) for _ in range(size)]
+        self._idle = None
+
+    async def start(self):
+        """Spawn all sessions.
+
+        Sessions which fail to start are left stopped, and are started
+        again when a query is assigned to them.
+        """
+        self._idle = asyncio.Queue()
+        results = await asyncio.gather(
+            *(session.start() for session in self.sessions), return_exceptions=True
+        )
+        for session, result in zip(self.sessions, results):
+            if isinstance(result, Exception):
+                log.warning("{} failed to start: {}", session.name, result)
+            self._idle.put_nowait(session)
+        log.debug("Started {} vtysh sessions", len(self.sessions))
+
+    async def stop(self):
+        """Terminate all sessions."""
+        await asyncio.gather(*(session.close() for session in self.sessions))
+
+    async def run(self, command):
+        """Execute a command on the next idle session.
+
+        A session which exits mid-command is respawned and the command is
+        retried once, since all commands sent through the pool are read-only.
+        A session whose command is interrupted is stopped, so the unread
+        remainder of the response is never returned to the next query.
+
+        Arguments:
+            command {str} -- vtysh command
+
+        Raises:
+            QueryError: Raised if the command spans multiple lines.
+            ExecutionError: Raised if vtysh can't run the command, or if it
+            fails on a fresh session.
+
+        Returns:
+            {str} -- Command output
+        """
+        session = await self._idle.get()
+        try:
+            for attempt in range(2):
+                if not session.alive:
+                    await session.start()
+                try:
+                    return await session.run(command)
+                except ConnectionError as err:
+                    await session.close()
+                    if attempt == 1:
+                        raise ExecutionError(str(err)) from None
+                    log.warning("{} exited, respawning", session.name)
+        except (QueryError, ExecutionError):
+            # Rejected before it was sent, or answered in full, so the session
+            # is unaffected. Sessions which time out are already stopped.
+            raise
+        except BaseException:
+            await session.close()
+            raise
+        finally:
+            self._idle.put_nowait(session)
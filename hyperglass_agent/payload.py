@@ -1,15 +1,23 @@
 """Handle JSON Web Token Encoding & Decoding."""
 
 # Standard Library
+import gzip
+import base64
 import datetime
 
 # Third Party
 import jwt
 
 # Project
-from hyperglass_agent.config import params
+from hyperglass_agent import config
 from hyperglass_agent.exceptions import SecurityError
 
+try:
+    # Third Party
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 async def jwt_decode(*args, **kwargs):
     """Decode the request claim."""
@@ -21,7 +29,9 @@ async def jwt_encode(*args, **kwargs):
     return _jwt_encode(*args, **kwargs)
 
 
-def _jwt_decode(payload):
+def _jwt_decode(payload, params=None):
+    if params is None:
+        params = config.params
     try:
         decoded = jwt.decode(
             payload, params.secret.get_secret_value(), algorithm="HS256"
@@ -32,7 +42,67 @@ def _jwt_decode(payload):
         raise SecurityError(str(exp)) from None
 
 
-def _jwt_encode(response):
+def _gzip(data, params):
+    return gzip.compress(data, compresslevel=params.compression.gzip_level)
+
+
+def _zstd(data, params):
+    compressor = zstandard.ZstdCompressor(level=params.compression.zstd_level)
+    return compressor.compress(data)
+
+
+# Payload encodings supported by this agent.
+ENCODERS = {"gzip": _gzip}
+
+if zstandard is not None:
+    ENCODERS["zstd"] = _zstd
+
+
+def compress(response, accepted, params=None):
+    """Compress a response with the first supported encoding accepted.
+
+    Responses smaller than `compression.min_size`, or which are not made
+    smaller by compression, are not compressed.
+
+    Arguments:
+        response {str} -- Response
+        accepted {list} -- Encodings accepted by the client, in order of
+        preference
+
+    Keyword Arguments:
+        params {object} -- Validated config object, or None for the active
+        config (default: {None})
+
+    Returns:
+        {tuple} -- Encoding, or None if not compressed & the base64-encoded
+        compressed response, or the unmodified response if not compressed
+    """
+    if params is None:
+        params = config.params
+
+    if not params.compression.enable or not accepted:
+        return None, response
+
+    data = response.encode()
+
+    if len(data) < params.compression.min_size:
+        return None, response
+
+    for encoding in accepted:
+        encoder = ENCODERS.get(encoding)
+        if encoder is not None:
+            compressed = base64.b64encode(encoder(data, params)).decode()
+            if len(compressed) < len(response):
+                return encoding, compressed
+            break
+
+    return None, response
+
+
+def _jwt_encode(response, accepted=(), params=None):
+    if params is None:
+        params = config.params
+    encoding, response = compress(response, accepted, params)
     payload = {
         "payload": response,
         "nbf": datetime.datetime.utcnow(),
@@ -40,6 +110,8 @@ def _jwt_encode(response):
         "exp": datetime.datetime.utcnow()
         + datetime.timedelta(seconds=params.valid_duration),
     }
+    if encoding is not None:
+        payload["encoding"] = encoding
     encoded = jwt.encode(
         payload, params.secret.get_secret_value(), algorithm="HS256"
     ).decode("utf-8")
@@ -0,0 +1,151 @@
+"""Measure the time taken by module imports & config loading at startup.
+
+Profiling is enabled by the CLI's `--profile-startup` flag, before the CLI
+itself is imported. It wraps `__import__`, so only modules imported by name
+after it is enabled, & not already imported, are measured.
+"""
+
+# Standard Library
+import sys
+import time
+import builtins
+from contextlib import contextmanager
+
+# Modules listed in a startup report.
+REPORT_MODULES = 25
+
+_profile = None
+
+
+class StartupProfile:
+    """Import & startup phase timings."""
+
+    def __init__(self):
+        """Initialize a profile with no timings."""
+        self.started = time.perf_counter()
+        self.cpu_before = time.process_time()
+        self.modules = {}
+        self.imported = 0.0
+        self.phases = []
+        self._stack = []
+        self._import = builtins.__import__
+
+    def install(self):
+        """Start measuring imports."""
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """Stop measuring imports."""
+        if builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        # Each entry is the module name, its start time & its children's time.
+        entry = [name, time.perf_counter(), 0.0]
+        self._stack.append(entry)
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - entry[1]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+            else:
+                self.imported += elapsed
+            self.modules[name] = (elapsed, elapsed - entry[2])
+
+    @contextmanager
+    def phase(self, name):
+        """Record the time taken by a phase of startup.
+
+        A phase run by a module while it is imported, like loading the config
+        when the web server is imported, isn't counted as import time.
+
+        Arguments:
+            name {str} -- Phase name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            for entry in self._stack:
+                entry[1] += elapsed
+            self.phases.append((name, elapsed))
+
+    def report(self, limit=REPORT_MODULES):
+        """Format the slowest imports & the phases of startup.
+
+        Arguments:
+            limit {int} -- Number of modules to list
+
+        Returns:
+            {str} -- Report
+        """
+        total = time.perf_counter() - self.started
+        slowest = sorted(self.modules.items(), key=lambda item: -item[1][0])
+
+        lines = [
+            f"Startup: {total * 1000:.1f} ms since profiling started, "
+            f"{self.cpu_before * 1000:.1f} ms CPU before",
+            f"Imports: {self.imported * 1000:.1f} ms",
+            "",
+            f"{'cumulative ms':>14}{'self ms':>10}  module",
+        ]
+        for name, (elapsed, own) in slowest[:limit]:
+            lines.append(f"{elapsed * 1000:>14.1f}{own * 1000:>10.1f}  {name}")
+
+        if self.phases:
+            lines.extend(("", f"{'ms':>14}  phase"))
+            for name, elapsed in self.phases:
+                lines.append(f"{elapsed * 1000:>14.1f}  {name}")
+
+        return "\n".join(lines)
+
+
+def enable():
+    """Start profiling startup, if it is not already being profiled.
+
+    Returns:
+        {StartupProfile} -- Profile
+    """
+    global _profile
+
+    if _profile is None:
+        _profile = StartupProfile()
+        _profile.install()
+    return _profile
+
+
+def finish():
+    """Stop profiling startup.
+
+    Returns:
+        {str|None} -- Report, or None if startup was not being profiled or
+        was already reported
+    """
+    global _profile
+
+    if _profile is None:
+        return None
+
+    profile, _profile = _profile, None
+    profile.uninstall()
+    return profile.report()
+
+
+@contextmanager
+def phase(name):
+    """Record the time taken by a phase of startup, if it is being profiled.
+
+    Arguments:
+        name {str} -- Phase name
+    """
+    if _profile is None:
+        yield
+    else:
+        with _profile.phase(name):
+            yield
@@ -0,0 +1,793 @@
+"""In-memory snapshots of the routing daemon's BGP tables."""
+
+# Standard Library
+import re
+import sys
+import time
+import shlex
+import socket
+from array import array
+from collections import namedtuple
+
+# Project
+from hyperglass_agent.models._formatters import format_frr, format_bird
+
+# A prefix's output text, the AS path of each of its paths as displayed by the
+# routing daemon, and the communities of all of its paths (see community_key).
+RibEntry = namedtuple("RibEntry", ("prefix", "text", "as_paths", "communities"))
+
+ASN = re.compile(r"\d+")
+
+# Matches AS path regular expressions whose only ASNs are literal, so that
+# every delimited ASN in them must be present in a matching path.
+LITERAL_AS_PATH = re.compile(r"[\d\s_^$]*")
+
+# Cisco-style `_` matches any AS path delimiter, or the start or end.
+AS_PATH_DELIMITER = r"(?:^|$|[\s,{}()])"
+
+# Standard (`65000:1`), large (`65000:1:2`) & extended (`rt:65000:1`)
+# communities. Extended community administrators may be IPv4 addresses.
+COMMUNITY = re.compile(r"\d+:\d+(?::\d+)?|(?:rt|soo):(?:\d+|[\d.]+):\d+")
+
+WELL_KNOWN_COMMUNITIES = {
+    "internet": "0:0",
+    "graceful-shutdown": "65535:0",
+    "accept-own": "65535:1",
+    "llgr-stale": "65535:6",
+    "no-llgr": "65535:7",
+    "blackhole": "65535:666",
+    "no-export": "65535:65281",
+    "no-advertise": "65535:65282",
+    "local-as": "65535:65283",
+    "no-peer": "65535:65284",
+}
+
+# Estimated bytes used by each posting list, excluding its entry IDs: the
+# array object & its dict slot.
+POSTING_SIZE = sys.getsizeof(array("I")) + 3 * 8
+
+
+def community_key(community):
+    """Normalize a community as indexed, i.e. `65535:65281` for `no-export`.
+
+    Arguments:
+        community {str} -- Standard, large or extended community
+
+    Returns:
+        {str|None} -- Normalized community, or None if it isn't supported
+    """
+    value = community.strip().lower()
+    value = WELL_KNOWN_COMMUNITIES.get(value, value)
+
+    if not COMMUNITY.fullmatch(value):
+        return None
+
+    # Remove leading zeros, i.e. `65000:01`
+    parts = (str(int(part)) if part.isdigit() else part for part in value.split(":"))
+    return ":".join(parts)
+
+
+def parse_prefix(prefix):
+    """Parse an IP address or prefix into an integer & prefix length.
+
+    This is used instead of the ipaddress module, which is several times
+    slower, since every prefix of a full table is parsed.
+
+    Arguments:
+        prefix {str} -- IP address or prefix, with or without host bits
+
+    Raises:
+        ValueError: Raised if prefix isn't an IP address or prefix.
+
+    Returns:
+        {tuple} -- Address width in bits, address & prefix length
+    """
+    address, _, length = prefix.partition("/")
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+
+    try:
+        packed = socket.inet_pton(family, address)
+    except OSError:
+        raise ValueError(f"{prefix} is not an IP address or prefix") from None
+
+    width = len(packed) * 8
+    length = int(length) if length else width
+
+    if not 0 <= length <= width:
+        raise ValueError(f"{prefix} has an invalid prefix length")
+
+    return width, int.from_bytes(packed, "big"), length
+
+
+class _Node:
+    """Path-compressed trie node, holding a value if a prefix ends here."""
+
+    __slots__ = ("key", "length", "value", "zero", "one")
+
+    def __init__(self, key, length, value=None):
+        self.key = key
+        self.length = length
+        self.value = value
+        self.zero = None
+        self.one = None
+
+
+class PrefixTrie:
+    """Path-compressed binary (radix) trie of IP prefixes.
+
+    Prefixes are stored as integers, left-aligned to the address width, with
+    their prefix length. Nodes only exist where a prefix ends or where
+    prefixes diverge, so the trie holds fewer than two nodes per prefix and a
+    lookup visits at most one node per distinct prefix length on its path.
+    """
+
+    __slots__ = ("width", "root", "size")
+
+    def __init__(self, width):
+        """Initialize an empty trie.
+
+        Arguments:
+            width {int} -- Address width in bits, i.e. 32 or 128
+        """
+        self.width = width
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        """Get the number of stored prefixes.
+
+        Returns:
+            {int} -- Stored prefixes
+        """
+        return self.size
+
+    def _bit(self, key, index):
+        return (key >> (self.width - 1 - index)) & 1
+
+    def _mask(self, key, length):
+        return key >> (self.width - length) << (self.width - length) if length else 0
+
+    def _attach(self, parent, child):
+        if self._bit(child.key, parent.length):
+            parent.one = child
+        else:
+            parent.zero = child
+
+    def _replace(self, parent, child):
+        if parent is None:
+            self.root = child
+        else:
+            self._attach(parent, child)
+        self.size += 1
+
+    def insert(self, key, length, value):
+        """Add a prefix, replacing the value of an existing prefix.
+
+        Arguments:
+            key {int} -- Network address
+            length {int} -- Prefix length
+            value {Any} -- Value
+        """
+        width = self.width
+        key = self._mask(key, length)
+        parent = None
+        node = self.root
+
+        # Snapshots insert every prefix of a full table, so this loop avoids
+        # method calls where it can.
+        while node is not None:
+            node_length = node.length
+            shortest = node_length if node_length < length else length
+            diff = (key ^ node.key) >> (width - shortest)
+
+            if diff:
+                # The prefix diverges from this node; join them at a new
+                # branch node where they diverge.
+                common = shortest - diff.bit_length()
+                branch = _Node(self._mask(key, common), common)
+                self._attach(branch, _Node(key, length, value))
+                self._attach(branch, node)
+                self._replace(parent, branch)
+                return
+
+            if length < node_length:
+                # The prefix contains this node.
+                branch = _Node(key, length, value)
+                self._attach(branch, node)
+                self._replace(parent, branch)
+                return
+
+            if length == node_length:
+                if node.value is None:
+                    self.size += 1
+                node.value = value
+                return
+
+            parent = node
+            if (key >> (width - 1 - node_length)) & 1:
+                node = node.one
+            else:
+                node = node.zero
+
+        self._replace(parent, _Node(key, length, value))
+
+    def covering(self, key, length):
+        """Get the values of all prefixes containing a prefix.
+
+        Arguments:
+            key {int} -- Network address
+            length {int} -- Prefix length
+
+        Returns:
+            {list} -- Values, from the shortest to the longest prefix
+        """
+        width = self.width
+        matches = []
+        node = self.root
+
+        while node is not None and node.length <= length:
+            if (key ^ node.key) >> (width - node.length):
+                break
+            if node.value is not None:
+                matches.append(node.value)
+            if node.length == length:
+                break
+            node = node.one if self._bit(key, node.length) else node.zero
+
+        return matches
+
+    def longest(self, key, length):
+        """Get the value of the longest prefix containing a prefix.
+
+        Arguments:
+            key {int} -- Network address
+            length {int} -- Prefix length
+
+        Returns:
+            {Any} -- Value, or None if no prefix matches
+        """
+        matches = self.covering(key, length)
+        return matches[-1] if matches else None
+
+    def exact(self, key, length):
+        """Get the value of a prefix.
+
+        Arguments:
+            key {int} -- Network address
+            length {int} -- Prefix length
+
+        Returns:
+            {Any} -- Value, or None if the prefix isn't stored
+        """
+        node = self.root
+        key = self._mask(key, length)
+
+        while node is not None and node.length <= length:
+            if node.length == length:
+                return node.value if node.key == key else None
+            node = node.one if self._bit(key, node.length) else node.zero
+
+        return None
+
+
+class InvertedIndex:
+    """Posting lists of entry IDs, with an estimate of their memory usage.
+
+    Entry IDs are appended in ascending order to compact arrays.
+    """
+
+    __slots__ = ("size",)
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.size = 0
+
+    def _post(self, postings, key, entry_id):
+        entry_ids = postings.get(key)
+        if entry_ids is None:
+            entry_ids = postings[key] = array("I")
+            self.size += POSTING_SIZE + sys.getsizeof(key)
+        entry_ids.append(entry_id)
+        self.size += entry_ids.itemsize
+
+
+class AsPathIndex(InvertedIndex):
+    """Inverted index of entry IDs by the ASNs in their AS paths.
+
+    ASNs are indexed by position: the first ASN (neighbor AS), the last
+    ASN (origin AS), and any ASN.
+    """
+
+    __slots__ = ("first", "origin", "anywhere")
+
+    def __init__(self):
+        """Initialize an empty index."""
+        super().__init__()
+        self.first = {}
+        self.origin = {}
+        self.anywhere = {}
+
+    def add(self, entry_id, as_paths):
+        """Index the AS paths of an entry.
+
+        Arguments:
+            entry_id {int} -- Entry ID, greater than any previously added
+            as_paths {Iterable} -- AS paths
+        """
+        first, origin, anywhere = set(), set(), set()
+
+        for as_path in as_paths:
+            asns = ASN.findall(as_path)
+            if asns:
+                first.add(int(asns[0]))
+                origin.add(int(asns[-1]))
+                anywhere.update(int(asn) for asn in asns)
+
+        for postings, asns in (
+            (self.first, first),
+            (self.origin, origin),
+            (self.anywhere, anywhere),
+        ):
+            for asn in asns:
+                self._post(postings, asn, entry_id)
+
+    def candidates(self, first=None, origin=None, anywhere=()):
+        """Get the IDs of entries that may match an AS path expression.
+
+        Keyword Arguments:
+            first {int} -- Required first ASN (default: {None})
+            origin {int} -- Required last ASN (default: {None})
+            anywhere {Iterable} -- Required ASNs (default: {()})
+
+        Returns:
+            {set|None} -- Entry IDs, or None if nothing is required
+        """
+        postings = [self.anywhere.get(asn, ()) for asn in anywhere]
+
+        if first is not None:
+            postings.append(self.first.get(first, ()))
+        if origin is not None:
+            postings.append(self.origin.get(origin, ()))
+
+        if not postings:
+            return None
+
+        postings.sort(key=len)
+        entry_ids = set(postings[0])
+
+        for other in postings[1:]:
+            if not entry_ids:
+                break
+            entry_ids.intersection_update(other)
+
+        return entry_ids
+
+
+class CommunityIndex(InvertedIndex):
+    """Inverted index of entry IDs by community.
+
+    If the estimated size of the index exceeds `max_size`, the index is
+    discarded and no longer used, since tables with many communities per
+    prefix can make it larger than the table itself.
+    """
+
+    __slots__ = ("max_size", "communities", "complete")
+
+    def __init__(self, max_size=None):
+        """Initialize an empty index.
+
+        Keyword Arguments:
+            max_size {int} -- Maximum estimated size in bytes (default: {None})
+        """
+        super().__init__()
+        self.max_size = max_size
+        self.communities = {}
+        self.complete = True
+
+    def add(self, entry_id, communities):
+        """Index the communities of an entry.
+
+        Arguments:
+            entry_id {int} -- Entry ID, greater than any previously added
+            communities {Iterable} -- Normalized communities
+        """
+        if not self.complete:
+            return
+
+        for community in set(communities):
+            self._post(self.communities, community, entry_id)
+
+        if self.max_size is not None and self.size > self.max_size:
+            self.complete = False
+            self.communities = {}
+            self.size = 0
+
+    def candidates(self, community):
+        """Get the IDs of entries with a community.
+
+        Arguments:
+            community {str} -- Normalized community
+
+        Returns:
+            {array|None} -- Entry IDs, or None if the index was discarded
+        """
+        if not self.complete:
+            return None
+        return self.communities.get(community, ())
+
+
+def plan_as_path_regex(pattern):
+    """Extract the ASNs a path must contain to match a regular expression.
+
+    Only ASNs delimited by `_`, `^`, `$` or a space are required, since an
+    undelimited ASN may match part of a longer one. Patterns using any other
+    regular expression syntax aren't planned.
+
+    Arguments:
+        pattern {str} -- Cisco-style AS path regular expression
+
+    Returns:
+        {dict|None} -- AsPathIndex.candidates arguments, or None
+    """
+    if not LITERAL_AS_PATH.fullmatch(pattern):
+        return None
+
+    plan = {"first": None, "origin": None, "anywhere": set()}
+
+    for match in ASN.finditer(pattern):
+        before = pattern[match.start() - 1 : match.start()]
+        after = pattern[match.end() : match.end() + 1]
+
+        if before in ("_", "^", " ") and after in ("_", "$", " "):
+            asn = int(match.group())
+            plan["anywhere"].add(asn)
+            if before == "^":
+                plan["first"] = asn
+            if after == "$":
+                plan["origin"] = asn
+
+    return plan
+
+
+def plan_as_path_mask(tokens):
+    """Extract the ASNs a path must contain to match a BIRD path mask.
+
+    Arguments:
+        tokens {list} -- Path mask tokens: ASNs, `*` or `?`
+
+    Returns:
+        {dict} -- AsPathIndex.candidates arguments
+    """
+    asns = [int(token) for token in tokens if token.isdigit()]
+    return {
+        "first": int(tokens[0]) if tokens and tokens[0].isdigit() else None,
+        "origin": int(tokens[-1]) if tokens and tokens[-1].isdigit() else None,
+        "anywhere": set(asns),
+    }
+
+
+class RibSnapshot:
+    """Routing table entries indexed by prefix & AS path.
+
+    Each entry's output is kept in full, so a snapshot takes at least as much
+    memory as the table's output. If the output stored exceeds `max_size`,
+    the snapshot is emptied and marked incomplete, rather than answering
+    queries from part of the table.
+    """
+
+    def __init__(
+        self, entries, header="", community_index_size=None, table=None, max_size=None
+    ):
+        """Index routing table entries.
+
+        Entries whose prefix isn't a valid IP prefix are ignored.
+
+        Arguments:
+            entries {Iterable} -- RibEntry records
+
+        Keyword Arguments:
+            header {str} -- Text preceding entries in output (default: {""})
+            community_index_size {int} -- Maximum community index size in
+            bytes (default: {None})
+            table {callable} -- Renders the output of bgp_aspath &
+            bgp_community queries, given the matching entries & a function
+            selecting their matching paths; None to output whole entries
+            (default: {None})
+            max_size {int} -- Maximum size of stored output in bytes
+            (default: {None})
+        """
+        self.header = header
+        self.table = table
+        self.created = time.monotonic()
+        self.size = 0
+        self.complete = True
+        self._entries = []
+        self._tries = {32: PrefixTrie(32), 128: PrefixTrie(128)}
+        self._as_paths = AsPathIndex()
+        self._communities = CommunityIndex(max_size=community_index_size)
+
+        for entry in entries:
+            try:
+                width, key, length = parse_prefix(entry.prefix)
+            except ValueError:
+                continue
+
+            self.size += len(entry.text)
+            if max_size is not None and self.size > max_size:
+                self.complete = False
+                self._clear()
+                break
+
+            entry_id = len(self._entries)
+            self._as_paths.add(entry_id, entry.as_paths)
+            self._communities.add(entry_id, entry.communities)
+
+            # Communities are only needed to build the index.
+            entry = entry._replace(communities=())
+            self._tries[width].insert(key, length, entry)
+            self._entries.append(entry)
+
+    def _clear(self):
+        """Discard every entry & index."""
+        self.size = 0
+        self._entries = []
+        self._tries = {32: PrefixTrie(32), 128: PrefixTrie(128)}
+        self._as_paths = AsPathIndex()
+        self._communities = CommunityIndex(max_size=self._communities.max_size)
+
+    def __len__(self):
+        """Get the number of prefixes.
+
+        Returns:
+            {int} -- Prefixes
+        """
+        return sum(len(trie) for trie in self._tries.values())
+
+    @property
+    def age(self):
+        """Get the seconds since the snapshot was taken.
+
+        Returns:
+            {float} -- Seconds
+        """
+        return time.monotonic() - self.created
+
+    def stats(self):
+        """Get snapshot size & index memory usage.
+
+        Returns:
+            {dict} -- Snapshot statistics
+        """
+        return {
+            "prefixes": len(self),
+            "size": self.size,
+            "complete": self.complete,
+            "as_path_index_size": self._as_paths.size,
+            "community_index_size": self._communities.size,
+            "community_index_complete": self._communities.complete,
+        }
+
+    def bgp_route(self, target, covering=False):
+        """Render the entries matching a bgp_route query target.
+
+        Addresses match their longest matching prefix. Prefixes match
+        themselves only, or every prefix containing them if `covering` is
+        set, as BIRD's `{target} ~ net` filter does.
+
+        Arguments:
+            target {str} -- IP address or prefix
+
+        Keyword Arguments:
+            covering {bool} -- Match all containing prefixes (default: {False})
+
+        Returns:
+            {str|None} -- Output, or None if target isn't an IP address or prefix
+        """
+        try:
+            width, key, length = parse_prefix(target)
+        except ValueError:
+            return None
+
+        trie = self._tries[width]
+
+        if covering:
+            entries = trie.covering(key, length)
+        else:
+            if "/" in target:
+                entry = trie.exact(key, length)
+            else:
+                entry = trie.longest(key, length)
+            entries = [entry] if entry is not None else []
+
+        return self._render(entries)
+
+    def bgp_aspath(self, target, mask=False):
+        """Render the entries with an AS path matching a bgp_aspath query target.
+
+        Candidate entries are selected from the AS path index by the ASNs the
+        target requires, and only those are matched against the target.
+        Matching entries are output whole, or only their matching paths if
+        the snapshot has a table renderer.
+
+        Arguments:
+            target {str} -- Cisco-style regular expression, or BIRD path mask
+
+        Keyword Arguments:
+            mask {bool} -- Target is a BIRD path mask (default: {False})
+
+        Returns:
+            {str|None} -- Output, or None if the target can't be planned
+        """
+        if mask:
+            tokens = target.split()
+            if tokens[:1] != ["[="] or tokens[-1:] != ["=]"]:
+                return None
+            tokens = tokens[1:-1]
+            if not all(token.isdigit() or token in ("*", "?") for token in tokens):
+                return None
+
+            plan = plan_as_path_mask(tokens)
+            expression = re.compile(
+                "".join(
+                    {"*": r"(?: \d+)*", "?": r" \d+"}.get(token, f" {token}")
+                    for token in tokens
+                )
+            )
+
+            def matches(as_path):
+                asns = "".join(f" {asn}" for asn in ASN.findall(as_path))
+                return expression.fullmatch(asns) is not None
+
+        else:
+            plan = plan_as_path_regex(target)
+            try:
+                expression = re.compile(target.replace("_", AS_PATH_DELIMITER))
+            except re.error:
+                return None
+
+            def matches(as_path):
+                return expression.search(as_path) is not None
+
+        entry_ids = self._as_paths.candidates(**plan) if plan is not None else None
+
+        if entry_ids is None:
+            return None
+
+        entries = (
+            self._entries[entry_id]
+            for entry_id in sorted(entry_ids)
+            if any(matches(as_path) for as_path in self._entries[entry_id].as_paths)
+        )
+
+        if self.table is not None:
+            return self.table(entries, lambda path: matches(path.as_path))
+        return self._render(entries)
+
+    def bgp_community(self, target, standard=False):
+        """Render the entries with a path carrying a bgp_community query target.
+
+        Arguments:
+            target {str} -- Standard, large or extended community
+
+        Keyword Arguments:
+            standard {bool} -- Only look up standard communities, as FRR's
+            `community` command only matches those (default: {False})
+
+        Returns:
+            {str|None} -- Output, or None if the community can't be looked up
+        """
+        community = community_key(target)
+
+        if community is None or (standard and community.count(":") != 1):
+            return None
+
+        entry_ids = self._communities.candidates(community)
+
+        if entry_ids is None:
+            return None
+
+        entries = (self._entries[entry_id] for entry_id in entry_ids)
+
+        if self.table is not None:
+            return self.table(entries, lambda path: community in path.communities)
+        return self._render(entries)
+
+    def _render(self, entries):
+        texts = [entry.text for entry in entries]
+
+        if not texts:
+            return ""
+
+        return "\n".join([self.header] + texts).strip()
+
+
+def rib_key(afi, vrf):
+    """Get the key identifying the table a query is answered from.
+
+    Arguments:
+        afi {str} -- AFI
+        vrf {str} -- VRF
+
+    Returns:
+        {tuple} -- AFI & VRF, or None for default AFIs
+    """
+    if afi.endswith("_default"):
+        return (afi, None)
+    return (afi, vrf)
+
+
+def dump_commands(mode, vrfs=(), bird_version=2):
+    """Get the commands that dump each snapshotted table.
+
+    Default IPv4 & IPv6 tables are always dumped. For FRR, the tables of
+    each listed VRF are also dumped; BIRD commands don't distinguish VRFs.
+
+    Arguments:
+        mode {str} -- Agent mode
+
+    Keyword Arguments:
+        vrfs {Iterable} -- VRF names (default: {()})
+        bird_version {int} -- BIRD version (default: {2})
+
+    Returns:
+        {dict} -- Command arguments, keyed by rib_key
+    """
+    commands = {}
+
+    for version in (4, 6):
+        afi = f"ipv{version}_default"
+
+        if mode == "frr":
+            commands[rib_key(afi, None)] = format_frr(
+                f"show bgp ipv{version} unicast detail"
+            )
+            for vrf in vrfs:
+                commands[rib_key(f"ipv{version}_vpn", vrf)] = format_frr(
+                    f"show bgp vrf {vrf} ipv{version} unicast detail"
+                )
+
+        elif mode == "bird":
+            cmd = "show route all"
+            if bird_version == 2:
+                cmd += f" table master{version}"
+            commands[rib_key(afi, None)] = format_bird(version, bird_version, cmd)
+
+    return {key: shlex.split(command) for key, command in commands.items()}
+
+
+def version_commands(mode, vrfs=(), bird_version=2):
+    """Get the commands that show a version signal of each table.
+
+    For FRR, this is the BGP table version. For BIRD, it is the route update
+    & withdrawal counters of each protocol.
+
+    Arguments:
+        mode {str} -- Agent mode
+
+    Keyword Arguments:
+        vrfs {Iterable} -- VRF names (default: {()})
+        bird_version {int} -- BIRD version (default: {2})
+
+    Returns:
+        {dict} -- Command arguments, keyed by rib_key
+    """
+    commands = {}
+
+    for version in (4, 6):
+        afi = f"ipv{version}_default"
+
+        if mode == "frr":
+            commands[rib_key(afi, None)] = format_frr(
+                f"show bgp ipv{version} unicast summary json"
+            )
+            for vrf in vrfs:
+                commands[rib_key(f"ipv{version}_vpn", vrf)] = format_frr(
+                    f"show bgp vrf {vrf} ipv{version} unicast summary json"
+                )
+
+        elif mode == "bird":
+            commands[rib_key(afi, None)] = format_bird(
+                version, bird_version, "show protocols all"
+            )
+
+    return {key: shlex.split(command) for key, command in commands.items()}
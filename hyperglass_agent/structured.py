@@ -0,0 +1,72 @@
+"""Structured, per-route query output."""
+
+# Standard Library
+import json
+
+try:
+    # Third Party
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields of each route record, in output order.
+ROUTE_FIELDS = (
+    "prefix",
+    "next_hop",
+    "as_path",
+    "communities",
+    "local_pref",
+    "med",
+    "age",
+    "best",
+)
+
+
+def route_record(**kwargs):
+    """Create a route record, with None for any missing field.
+
+    Keyword Arguments:
+        prefix {str} -- Prefix
+        next_hop {str} -- Next hop address
+        as_path {list} -- ASNs
+        communities {list} -- Normalized communities (see rib.community_key)
+        local_pref {int} -- Local preference
+        med {int} -- Multi-exit discriminator
+        age {int} -- Seconds since the route changed
+        best {bool} -- Route is the best path
+
+    Returns:
+        {dict} -- Route record
+    """
+    return {field: kwargs.get(field) for field in ROUTE_FIELDS}
+
+
+def loads(raw):
+    """Deserialize JSON, using orjson if it is installed.
+
+    Arguments:
+        raw {str} -- JSON
+
+    Raises:
+        ValueError: Raised if raw isn't valid JSON.
+
+    Returns:
+        {Any} -- Deserialized object
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dumps(obj):
+    """Serialize an object to compact JSON, using orjson if it is installed.
+
+    Arguments:
+        obj {Any} -- Object
+
+    Returns:
+        {str} -- JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
@@ -24,7 +24,16 @@ def top_level_async(func):
     func = asyncio.coroutine(func)
 
     def _wrapper(*args, **kwargs):
-        loop = asyncio.get_event_loop()
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            # Threads other than the main thread have no event loop, i.e.
+            # when the config is reloaded in an executor.
+            loop = asyncio.new_event_loop()
+            try:
+                return loop.run_until_complete(func(*args, **kwargs))
+            finally:
+                loop.close()
         return loop.run_until_complete(func(*args, **kwargs))
 
     return update_wrapper(_wrapper, func)
@@ -0,0 +1,70 @@
+"""Shared test fixtures."""
+
+# Standard Library
+import os
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Third Party
+import yaml
+import pytest
+
+# Config models read the application directory, & require its certificate &
+# key to exist, when they are imported.
+APP_DIRECTORY = tempfile.TemporaryDirectory()
+for name in ("agent_cert.pem", "agent_key.pem"):
+    (Path(APP_DIRECTORY.name) / name).touch()
+os.environ.setdefault("hyperglass_agent_directory", APP_DIRECTORY.name)
+
+# Signs test requests only.
+SECRET = "test"  # noqa: S105
+
+# Config file loaded by the web server.
+CONFIG = {
+    "secret": SECRET,
+    "ssl": {"enable": False},
+    "logging": {"directory": APP_DIRECTORY.name},
+    "metrics": True,
+}
+CONFIG_FILE = Path(APP_DIRECTORY.name) / "config.yaml"
+CONFIG_FILE.write_text(yaml.safe_dump(CONFIG))
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a new event loop."""
+    loop = asyncio.new_event_loop()
+
+    def run_until_complete(coro):
+        return loop.run_until_complete(coro)
+
+    yield run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def params():
+    """Create validated config parameters, without SSL."""
+    from hyperglass_agent.models.general import General
+
+    return General(ssl={"enable": False}, secret=SECRET)
+
+
+@pytest.fixture
+def config_file(monkeypatch):
+    """Restore the config file, active config & runtime after a test.
+
+    Returns:
+        {callable} -- Writes fields over the test config file
+    """
+    from hyperglass_agent import config, execute
+
+    monkeypatch.setattr(config, "_config", config.load_config())
+    monkeypatch.setattr(execute, "_runtime", execute.current_runtime())
+
+    def write(**fields):
+        CONFIG_FILE.write_text(yaml.safe_dump(dict(CONFIG, **fields)))
+
+    yield write
+    write()
@@ -0,0 +1,181 @@
+"""Test BIRD control socket replies & output parsing."""
+
+# Standard Library
+import asyncio
+from types import SimpleNamespace
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.exceptions import QueryError
+from hyperglass_agent.nos_utils.bird import (
+    BirdLine,
+    BirdConnection,
+    parse_bird_line,
+    format_bird_reply,
+    parse_bird_stream,
+)
+
+# Replies of a BIRD control socket, by command.
+REPLIES = {
+    "restrict": b"0016 Access restricted\n",
+    "show route for 192.0.2.1": (
+        b"1007-Table master4:\n"
+        b" 192.0.2.0/24         unicast [peer1 2020-01-01] * (100) [AS65001i]\n"
+        b" \tvia 198.51.100.1 on eth0\n"
+        b"0000 \n"
+    ),
+    "show route for 192.0.2.2": b"8001 Network not found\n",
+    "show rout": b"9001 syntax error, unexpected CF_SYM_UNDEFINED\n",
+}
+
+BANNER = b"0001 BIRD 2.0.7 ready.\n"
+
+QUERY = SimpleNamespace(target="192.0.2.1", afi="ipv4_default")
+
+
+@pytest.mark.parametrize(
+    "raw,parsed",
+    (
+        (b"1007-Table master4:\n", (1007, "Table master4:", False)),
+        (b" \tvia 198.51.100.1 on eth0\n", (None, "\tvia 198.51.100.1 on eth0", False)),
+        (b"0000 \n", (0, "", True)),
+        (b"0000\n", (0, "", True)),
+        (b"9001 syntax error\n", (9001, "syntax error", True)),
+    ),
+)
+def test_parse_bird_line(raw, parsed):
+    """Lines are split into reply code, text & whether the reply is complete."""
+    assert parse_bird_line(raw) == parsed
+
+
+def test_format_bird_reply():
+    """Lines are joined as birdc prints them, without the end of reply line."""
+    lines = [
+        BirdLine(1007, "Table master4:"),
+        BirdLine(1007, "192.0.2.0/24 unicast"),
+        BirdLine(0, ""),
+    ]
+    assert format_bird_reply(lines) == "Table master4:\n192.0.2.0/24 unicast"
+
+
+@pytest.fixture
+def bird_socket(tmp_path, run):
+    """Serve a stand-in BIRD control socket.
+
+    Returns:
+        {SimpleNamespace} -- Socket path & commands received
+    """
+    socket = SimpleNamespace(path=str(tmp_path / "bird.ctl"), commands=[])
+
+    async def answer(reader, writer):
+        writer.write(BANNER)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode().strip()
+            socket.commands.append(command)
+            writer.write(REPLIES.get(command, b"9001 syntax error\n"))
+        writer.close()
+
+    server = run(asyncio.start_unix_server(answer, path=socket.path))
+    yield socket
+    server.close()
+    run(server.wait_closed())
+
+
+def test_connection_restricts(bird_socket, run):
+    """Connections are restricted before any command is sent."""
+
+    async def query():
+        conn = BirdConnection(bird_socket.path, timeout=5)
+        try:
+            return await conn.run("show route for 192.0.2.1")
+        finally:
+            await conn.close()
+
+    reply = run(query())
+
+    assert bird_socket.commands == ["restrict", "show route for 192.0.2.1"]
+    assert reply == [
+        BirdLine(1007, "Table master4:"),
+        BirdLine(
+            1007, "192.0.2.0/24         unicast [peer1 2020-01-01] * (100) [AS65001i]"
+        ),
+        BirdLine(1007, "\tvia 198.51.100.1 on eth0"),
+        BirdLine(0, ""),
+    ]
+
+
+def test_connection_error_replies(bird_socket, run):
+    """Error replies are returned as their text, as birdc prints them."""
+
+    async def query():
+        conn = BirdConnection(bird_socket.path, timeout=5)
+        try:
+            return await asyncio.gather(
+                conn.run("show route for 192.0.2.2"), conn.run("show rout")
+            )
+        finally:
+            await conn.close()
+
+    not_found, syntax_error = run(query())
+
+    assert not_found == [BirdLine(8001, "Network not found")]
+    assert format_bird_reply(not_found) == "Network not found"
+    assert syntax_error[0].code == 9001
+    assert format_bird_reply(syntax_error).startswith("syntax error")
+
+
+def test_connection_pipelined_replies(bird_socket, run):
+    """Replies to commands sent without waiting are matched in order."""
+
+    async def query():
+        conn = BirdConnection(bird_socket.path, timeout=5)
+        try:
+            commands = ["show route for 192.0.2.2", "show route for 192.0.2.1"] * 3
+            return await asyncio.gather(*(conn.run(c) for c in commands))
+        finally:
+            await conn.close()
+
+    replies = run(query())
+
+    assert [reply[0].code for reply in replies] == [8001, 1007] * 3
+
+
+def test_connection_rejects_multiple_lines(run):
+    """Commands spanning several lines are rejected before connecting."""
+    conn = BirdConnection("/nonexistent", timeout=5)
+
+    with pytest.raises(QueryError):
+        run(conn.run("show route\nconfigure"))
+
+
+def stream_of(data):
+    """Create a stream reader of raw output."""
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    stream.feed_eof()
+    return stream
+
+
+def test_parse_bird_stream(run):
+    """The banner & surrounding whitespace are removed from streamed output."""
+
+    async def parse():
+        stream = stream_of(b"BIRD 2.0.7 ready.\n\nTable master4:\n192.0.2.0/24\n\n")
+        return await parse_bird_stream(stream, QUERY, "{target} not found. ({afi})")
+
+    assert run(parse()) == "Table master4:\n192.0.2.0/24"
+
+
+def test_parse_bird_stream_not_found(run):
+    """Streams with only the banner are answered with the not found message."""
+
+    async def parse(data):
+        return await parse_bird_stream(stream_of(data), QUERY, "{target} ({afi})")
+
+    assert run(parse(b"BIRD 2.0.7 ready.\n\n")) == "192.0.2.1 (IPv4)"
+    assert run(parse(b"")) is None
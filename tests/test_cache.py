@@ -0,0 +1,266 @@
+"""Test query output caches."""
+
+# Standard Library
+import os
+import time
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.cache import ResultCache, SharedResultCache, cache_key
+from hyperglass_agent.models.request import Request
+
+
+def make_key(target):
+    """Create a cache key shaped like `cache.cache_key`'s."""
+    return ("frr", "ipv4_default", "default", "bgp_community", None, target)
+
+
+def make_value(size):
+    """Create a value whose slots are distinguishable."""
+    return "".join(chr(ord("a") + index % 26) for index in range(size))
+
+
+@pytest.fixture(params=(ResultCache, SharedResultCache))
+def cache(request):
+    """Create an empty cache of each backend."""
+    if request.param is SharedResultCache:
+        return SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    return ResultCache(max_size=64 * 1024)
+
+
+def test_cache_key_is_case_sensitive():
+    """Queries differing only in the case of their VRF or target aren't shared."""
+    query = {"query_type": "bgp_community", "afi": "ipv4_vpn", "source": None}
+    keys = {
+        cache_key("frr", Request(vrf=vrf, target=target, **query))
+        for vrf, target in (
+            ("blue", "65000:1"),
+            ("Blue", "65000:1"),
+            ("blue", "RT:65000:1"),
+            ("blue", "rt:65000:1"),
+        )
+    }
+
+    assert len(keys) == 4
+    assert ("frr", "ipv4_vpn", "Blue", "bgp_community", None, "65000:1") in keys
+
+
+def test_get_set_delete(cache):
+    """Stored values are returned until they are deleted."""
+    key = make_key("65000:1")
+
+    assert cache.get(key) is None
+    cache.set(key, "output", 60)
+    assert cache.get(key) == "output"
+    assert key in cache
+    assert len(cache) == 1
+
+    cache.delete(key)
+    assert cache.get(key) is None
+    assert len(cache) == 0
+    assert cache.size == 0
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 2)
+
+
+def test_expiry(cache, monkeypatch):
+    """Entries expire after their time-to-live, & are not stored without one."""
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.set(make_key("65000:1"), "output", 60)
+    cache.set(make_key("65000:2"), "output", 0)
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 59)
+    assert cache.get(make_key("65000:1")) == "output"
+    assert cache.get(make_key("65000:2")) is None
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get(make_key("65000:1")) is None
+    assert make_key("65000:1") not in cache
+
+
+def test_invalidate(cache):
+    """Entries whose key matches a predicate are removed."""
+    for target in ("65000:1", "65000:2", "65000:3"):
+        cache.set(make_key(target), target, 60)
+
+    assert cache.invalidate(lambda key: key[-1] != "65000:2") == 2
+    assert cache.get(make_key("65000:2")) == "65000:2"
+    assert len(cache) == 1
+
+
+def test_memory_evicts_least_recently_used():
+    """Entries are evicted in least recently used order when the cache is full."""
+    keys = [make_key(f"65000:{index}") for index in range(3)]
+    value = "x" * 1000
+    size = ResultCache._sizeof(keys[0], value)
+    cache = ResultCache(max_size=size * 2)
+
+    cache.set(keys[0], value, 60)
+    cache.set(keys[1], value, 60)
+    cache.get(keys[0])
+    cache.set(keys[2], value, 60)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == value
+    assert cache.get(keys[2]) == value
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_skips_values_larger_than_cache():
+    """Values larger than the whole cache are counted as skipped."""
+    cache = ResultCache(max_size=1024)
+    cache.set(make_key("65000:1"), "x" * 2048, 60)
+
+    assert len(cache) == 0
+    assert cache.stats()["skipped"] == 1
+
+
+def test_shared_evicts_least_recently_used_of_set():
+    """A full set evicts its least recently used entry."""
+    cache = SharedResultCache(max_size=4 * 1024, slot_size=1024)
+    keys = [make_key(f"65000:{index}") for index in range(cache.WAYS + 1)]
+
+    for key in keys[: cache.WAYS]:
+        cache.set(key, "output", 60)
+    for key in keys[1 : cache.WAYS]:
+        cache.get(key)
+    cache.set(keys[-1], "output", 60)
+
+    assert cache.sets == 1
+    assert cache.get(keys[0]) is None
+    assert all(cache.get(key) == "output" for key in keys[1:])
+    assert cache.stats()["evictions"] == 1
+    assert len(cache) == cache.WAYS
+
+
+def test_shared_slot_being_written_is_a_miss():
+    """Readers don't return a slot whose sequence number is odd."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    key = make_key("65000:1")
+    cache.set(key, "output", 60)
+
+    offset, _ = cache._find(*cache._encode(key))
+    sequence = cache.SEQUENCE.unpack_from(cache._buffer, offset)[0]
+    cache.SEQUENCE.pack_into(cache._buffer, offset, sequence + 1)
+    assert cache.get(key) is None
+
+    cache.SEQUENCE.pack_into(cache._buffer, offset, sequence + 2)
+    assert cache.get(key) == "output"
+
+
+def test_shared_corrupted_slot_is_a_miss():
+    """Readers don't return a slot whose contents don't match its checksum."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    key = make_key("65000:1")
+    cache.set(key, "output", 60)
+
+    offset, _ = cache._find(*cache._encode(key))
+    end = offset + cache.SLOT.size + len(repr(key)) + cache.PARTS.size
+    cache._buffer[end : end + 6] = b"OUTPUT"
+
+    assert cache.get(key) is None
+
+
+def test_shared_between_processes():
+    """Entries stored by a forked process are found by its parent."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+
+    pid = os.fork()
+    if pid == 0:
+        cache.set(make_key("65000:1"), make_value(5000), 60)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert cache.get(make_key("65000:1")) == make_value(5000)
+    assert len(cache) == 1
+
+
+def test_shared_entry_spans_slots():
+    """Values larger than a slot are stored across several slots."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    value = make_value(5000)
+
+    cache.set(make_key("65000:1"), value, 60)
+
+    assert cache.get(make_key("65000:1")) == value
+    assert cache.keys() == [make_key("65000:1")]
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["skipped"] == 0
+
+
+def test_shared_entry_replaced_by_smaller_value():
+    """Replacing a spanning entry removes the slots it no longer uses."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    key = make_key("65000:1")
+
+    cache.set(key, make_value(5000), 60)
+    cache.set(key, "small", 60)
+
+    assert cache.get(key) == "small"
+    assert cache.stats()["entries"] == 1
+    assert cache.size == len(repr(key)) + cache.PARTS.size + 5
+
+
+def test_shared_entry_missing_slot_is_a_miss():
+    """An entry is a miss if any of its slots was evicted."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    key = make_key("65000:1")
+    cache.set(key, make_value(5000), 60)
+
+    encoded, key_hash = cache._encode(key)
+    cache._delete_slot(*cache._part_key(encoded, key_hash, 2))
+
+    assert cache.get(key) is None
+
+
+def test_shared_entry_spanning_too_many_slots_is_skipped():
+    """Values needing more slots than there are sets are counted as skipped."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    key = make_key("65000:1")
+    cache.set(key, "small", 60)
+
+    cache.set(key, make_value(20000), 60)
+
+    assert cache.get(key) is None
+    assert cache.stats()["skipped"] == 1
+    assert cache.stats()["entries"] == 0
+    assert cache.size == 0
+
+
+def test_shared_invalidate_removes_every_slot():
+    """Invalidating a spanning entry frees all of its slots."""
+    cache = SharedResultCache(max_size=64 * 1024, slot_size=1024)
+    cache.set(make_key("65000:1"), make_value(5000), 60)
+    cache.set(make_key("65000:2"), make_value(100), 60)
+
+    removed = cache.invalidate(lambda key: key[-1] == "65000:1")
+
+    assert removed == 1
+    assert cache.get(make_key("65000:2")) == make_value(100)
+    assert cache.stats()["entries"] == 1
+    assert cache.size == len(repr(make_key("65000:2"))) + cache.PARTS.size + 100
+
+
+def test_shared_eviction_removes_every_slot():
+    """Evicting any slot of a spanning entry frees all of its slots."""
+    cache = SharedResultCache(max_size=16 * 1024, slot_size=1024)
+    spanning = make_key("65000:0")
+    cache.set(spanning, make_value(3000), 60)
+
+    index = 0
+    while spanning in cache:
+        index += 1
+        cache.set(make_key(f"65000:{index}"), "output", 60)
+
+    used = sum(
+        cache.SLOT.unpack_from(cache._buffer, offset)[2] != 0
+        for offset in range(cache.COUNTERS.size, len(cache._buffer), cache.slot_size)
+    )
+    keys = cache.keys()
+
+    assert spanning not in keys
+    assert used == len(keys)
+    assert cache.size == sum(len(repr(key)) + cache.PARTS.size + 6 for key in keys)
+    assert cache.stats()["entries"] == len(keys)
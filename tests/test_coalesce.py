@@ -0,0 +1,124 @@
+"""Test coalescing of identical concurrent queries."""
+
+# Standard Library
+import asyncio
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.coalesce import SingleFlight
+
+
+class Counter:
+    """Coroutine function counting its executions."""
+
+    def __init__(self, delay=0.01, error=None):
+        """Initialize with no executions."""
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, value):
+        """Return a value after a delay, or raise the error."""
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return value
+
+
+def test_identical_calls_share_one_execution(run):
+    """Concurrent calls with the same key get the result of one execution."""
+    flight = SingleFlight()
+    func = Counter()
+
+    async def calls():
+        return await asyncio.gather(*(flight.run("key", func, "a") for _ in range(5)))
+
+    assert run(calls()) == ["a"] * 5
+    assert func.calls == 1
+    assert len(flight) == 0
+
+
+def test_different_keys_execute_separately(run):
+    """Calls with different keys are not coalesced."""
+    flight = SingleFlight()
+    func = Counter()
+
+    async def calls():
+        return await asyncio.gather(flight.run(1, func, "a"), flight.run(2, func, "b"))
+
+    assert run(calls()) == ["a", "b"]
+    assert func.calls == 2
+
+
+def test_sequential_calls_execute_again(run):
+    """A completed execution's result isn't reused."""
+    flight = SingleFlight()
+    func = Counter(delay=0)
+
+    run(flight.run("key", func, "a"))
+    run(flight.run("key", func, "b"))
+
+    assert func.calls == 2
+
+
+def test_exception_is_raised_to_every_caller(run):
+    """Every caller waiting on a failed execution gets its exception."""
+    flight = SingleFlight()
+    func = Counter(error=ValueError("failed"))
+
+    async def calls():
+        return await asyncio.gather(
+            *(flight.run("key", func, "a") for _ in range(3)), return_exceptions=True
+        )
+
+    results = run(calls())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert func.calls == 1
+    assert len(flight) == 0
+
+
+def test_cancelled_caller_does_not_cancel_others(run):
+    """The execution continues while any caller is still waiting on it."""
+    flight = SingleFlight()
+    func = Counter()
+
+    async def calls():
+        first = asyncio.ensure_future(flight.run("key", func, "a"))
+        second = asyncio.ensure_future(flight.run("key", func, "a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert run(calls()) == "a"
+    assert func.calls == 1
+    assert func.cancelled == 0
+
+
+def test_execution_cancelled_without_callers(run):
+    """The execution is cancelled once every caller is cancelled."""
+    flight = SingleFlight()
+    func = Counter(delay=1)
+
+    async def calls():
+        callers = [asyncio.ensure_future(flight.run("key", func, "a")) for _ in "ab"]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    run(calls())
+
+    assert func.cancelled == 1
+    assert len(flight) == 0
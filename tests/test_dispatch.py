@@ -0,0 +1,84 @@
+"""Test the per-AFI & query type executors built from the config."""
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.dispatch import build_dispatch
+from hyperglass_agent.constants import AFI_DISPLAY_MAP, SUPPORTED_QUERY
+from hyperglass_agent.exceptions import ConfigError
+from hyperglass_agent.models.request import Request
+from hyperglass_agent.models.commands import Commands
+
+
+def make_query(query_type, target, afi="ipv4_default"):
+    """Create a validated query."""
+    return Request(query_type=query_type, vrf="default", afi=afi, target=target)
+
+
+def test_dispatch_default_commands(params):
+    """Every AFI & query type has an executor for its default command."""
+    dispatch = build_dispatch(params, Commands())
+    executor = dispatch[("ipv4_default", "bgp_route")]
+
+    assert set(dispatch) == {
+        (afi, query_type) for afi in AFI_DISPLAY_MAP for query_type in SUPPORTED_QUERY
+    }
+    assert executor.command(make_query("bgp_route", "192.0.2.1")) == [
+        "vtysh",
+        "-uc",
+        "show bgp ipv4 unicast 192.0.2.1",
+    ]
+    assert executor.ttl == params.cache.ttl.bgp_route
+    assert executor.deadline == params.deadline.bgp_route
+
+
+def test_dispatch_custom_command(params):
+    """Changed commands are executed, & aren't answered as default commands."""
+    commands = Commands(frr={"ipv4_default": {"bgp_route": "show ip bgp {target}"}})
+    dispatch = build_dispatch(params, commands)
+    executor = dispatch[("ipv4_default", "bgp_route")]
+
+    assert executor.stock is False
+    assert all(
+        executor.stock for key, executor in dispatch.items() if key[1] != "bgp_route"
+    )
+    assert executor.command(make_query("bgp_route", "192.0.2.1")) == [
+        "vtysh",
+        "-uc",
+        "show ip bgp 192.0.2.1",
+    ]
+
+
+def test_dispatch_unknown_field(params):
+    """Commands referencing fields queries don't have are rejected."""
+    commands = Commands(frr={"ipv4_default": {"ping": "ping {destination}"}})
+
+    with pytest.raises(ConfigError, match="destination"):
+        build_dispatch(params, commands)
+
+
+def test_dispatch_formats_target(params):
+    """Targets are formatted for the daemon, without modifying the query."""
+    params = params.copy(update={"mode": "bird"})
+    executor = build_dispatch(params, Commands())[("ipv4_default", "bgp_community")]
+    query = make_query("bgp_community", "65000:1")
+
+    assert executor.command(query) == [
+        "birdc",
+        "show route all where (65000,1) ~ bgp_community",
+    ]
+    assert query.target == "65000:1"
+
+
+def test_dispatch_structured(params):
+    """FRR commands of BGP queries request JSON output in structured mode."""
+    params = params.copy(update={"structured": True})
+    dispatch = build_dispatch(params, Commands())
+
+    assert dispatch[("ipv4_default", "bgp_route")].command(
+        make_query("bgp_route", "192.0.2.1")
+    ) == ["vtysh", "-uc", "show bgp ipv4 unicast 192.0.2.1 json"]
+    assert dispatch[("ipv4_default", "ping")].template.command == (
+        "ping -4 -c 5 -I {source} {target}"
+    )
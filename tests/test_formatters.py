@@ -0,0 +1,92 @@
+"""Test command templates & the formatting of daemon commands."""
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.models._formatters import (
+    CommandTemplate,
+    unformat_frr,
+    unformat_bird,
+)
+
+
+def test_template_argv():
+    """Fields are substituted within the argument they appear in."""
+    template = CommandTemplate('vtysh -uc "show bgp ipv4 unicast {target}"')
+
+    assert template.shell is False
+    assert template.argv(target="192.0.2.0/24; reboot") == [
+        "vtysh",
+        "-uc",
+        "show bgp ipv4 unicast 192.0.2.0/24; reboot",
+    ]
+    assert template.argv(target="192.0.2.1") == [
+        "vtysh",
+        "-uc",
+        "show bgp ipv4 unicast 192.0.2.1",
+    ]
+
+
+def test_template_string_quotes_arguments():
+    """Commands run without a shell are quoted when formatted as a string."""
+    template = CommandTemplate("ping -c 5 {target}")
+
+    assert template.string(target="192.0.2.1 ; reboot") == (
+        "ping -c 5 '192.0.2.1 ; reboot'"
+    )
+
+
+@pytest.mark.parametrize(
+    "command",
+    (
+        "ping -c 5 {target} | head -n 3",
+        "ping -c 5 {target} && echo done",
+        "ping -c 5 {target} > /dev/null",
+        "ping -c 5 $TARGET",
+        "ping -c `echo 5` {target}",
+        "ping -c 5 '{target}",
+    ),
+)
+def test_template_shell_fallback(command):
+    """Commands using shell syntax are formatted unquoted, to run with a shell."""
+    template = CommandTemplate(command)
+
+    assert template.shell is True
+    assert template.string(target="192.0.2.1") == command.format(target="192.0.2.1")
+
+
+def test_template_names():
+    """Fields are named by the query attribute they reference."""
+    template = CommandTemplate("traceroute -s {source} {target.compressed} {afi[0]}")
+
+    assert template.names == {"source", "target", "afi"}
+
+
+@pytest.mark.parametrize(
+    "argv,command",
+    (
+        (["vtysh", "-uc", "show bgp 192.0.2.1"], "show bgp 192.0.2.1"),
+        (["/usr/bin/vtysh", "--command", "show bgp"], "show bgp"),
+        (["vtysh", "-c", "show bgp", "-c", "show bgp"], None),
+        (["vtysh", "-u", "show bgp"], None),
+        (["ping", "-c", "192.0.2.1"], None),
+    ),
+)
+def test_unformat_frr(argv, command):
+    """Only single vtysh commands are extracted."""
+    assert unformat_frr(argv) == command
+
+
+@pytest.mark.parametrize(
+    "argv,command",
+    (
+        (["birdc", "show route"], ("birdc", "show route")),
+        (["/usr/sbin/birdc6", "show route"], ("birdc6", "show route")),
+        (["birdc", "-s", "/run/bird.ctl", "show route"], None),
+        (["ping", "192.0.2.1"], None),
+    ),
+)
+def test_unformat_bird(argv, command):
+    """Only single birdc commands are extracted."""
+    assert unformat_bird(argv) == command
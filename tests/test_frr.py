@@ -0,0 +1,171 @@
+"""Test FRR (vtysh) utilities."""
+
+# Standard Library
+import sys
+from pathlib import Path
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.rib import RibSnapshot
+from hyperglass_agent.exceptions import QueryError, ExecutionError
+from hyperglass_agent.nos_utils.frr import VtyshPool, VtyshSession, parse_frr_table
+
+BENCHMARKS = Path(__file__).parent.parent / "benchmarks"
+
+sys.path.insert(0, str(BENCHMARKS))
+
+# Third Party
+from tables import frr_reply  # noqa: E402
+
+# Interactive vtysh answering `show` commands, & writing an error to stderr
+# for any other command.
+VTYSH_SCRIPT = """
+import sys
+for line in sys.stdin:
+    command = line.strip()
+    if command.startswith("echo "):
+        print(command[5:], flush=True)
+    elif command.startswith("show "):
+        print("BGP routing table entry for " + command.split()[-1], flush=True)
+    elif command != "terminal length 0":
+        print("% Unknown command: " + command, file=sys.stderr, flush=True)
+"""
+VTYSH = [sys.executable, "-c", VTYSH_SCRIPT]
+
+TABLE_SIZE = 3000
+
+# Output of a prefix with two iBGP paths, as in `show bgp ... detail`.
+MULTIPATH_ENTRY = """\
+BGP table version is 7, local router ID is 192.0.2.254, vrf id 0
+Default local pref 100, local AS 65000
+BGP routing table entry for 203.0.113.0/24
+Paths: (2 available, best #2, table default)
+  Advertised to non peer-group peers:
+  192.0.2.1 192.0.2.2
+  65001 64500, (Received from a RR-client)
+    192.0.2.1 from 192.0.2.1 (192.0.2.1)
+      Origin IGP, metric 10, localpref 100, valid, internal
+      Community: 65000:1
+      Last update: Wed Jan  1 00:00:00 2020
+  65002 64500
+    192.0.2.2 from 192.0.2.2 (192.0.2.2)
+      Origin incomplete, localpref 200, weight 100, valid, internal, best (Local Pref)
+      Community: 65000:2 no-export
+      Last update: Wed Jan  1 00:00:00 2020
+"""
+
+FIRST_PATH = (
+    "* i203.0.113.0/24   192.0.2.1               10    100      0 65001 64500 i"
+)
+SECOND_PATH = (
+    "*>i203.0.113.0/24   192.0.2.2                     200    100 65002 64500 ?"
+)
+
+
+def stand_in_snapshot(version):
+    """Build a snapshot from the stand-in's table dump."""
+    raw = "".join(frr_reply(f"show bgp ipv{version} unicast detail", TABLE_SIZE))
+    header, entries, table = parse_frr_table(raw)
+    return RibSnapshot(entries, header=header, table=table)
+
+
+def stand_in_output(command):
+    """Get the stand-in's output of a command, as parsed by the agent."""
+    return "".join(frr_reply(command, TABLE_SIZE)).strip()
+
+
+@pytest.mark.parametrize("separator", ("\n", "\r", "\r\n"))
+def test_session_rejects_multiple_lines(run, separator):
+    """Commands spanning lines would run each line as a vtysh command."""
+    session = VtyshSession(VTYSH, timeout=5)
+    with pytest.raises(QueryError):
+        run(session.run(f"show bgp ipv4 unicast 16.0.0.1{separator}configure"))
+
+
+def test_pool_keeps_session_after_rejected_command(run):
+    """A rejected command is never sent, so its session is kept."""
+    pool = VtyshPool(VTYSH, size=1, timeout=5)
+    run(pool.start())
+    try:
+        session = pool.sessions[0]
+        pid = session._proc.pid
+
+        with pytest.raises(QueryError):
+            run(pool.run("show bgp ipv4 unicast 16.0.0.1\nshow bgp ipv4 unicast"))
+
+        output = run(pool.run("show bgp ipv4 unicast 16.0.0.1"))
+        assert output == "BGP routing table entry for 16.0.0.1"
+        assert session._proc.pid == pid
+    finally:
+        run(pool.stop())
+
+
+def test_pool_raises_vtysh_errors(run):
+    """Errors vtysh writes to stderr are raised, & its session is kept."""
+    pool = VtyshPool(VTYSH, size=1, timeout=5)
+    run(pool.start())
+    try:
+        session = pool.sessions[0]
+        pid = session._proc.pid
+
+        with pytest.raises(ExecutionError, match="% Unknown command: shw bgp"):
+            run(pool.run("shw bgp ipv4 unicast 16.0.0.1"))
+
+        output = run(pool.run("show bgp ipv4 unicast 16.0.0.1"))
+        assert output == "BGP routing table entry for 16.0.0.1"
+        assert session._proc.pid == pid
+    finally:
+        run(pool.stop())
+
+
+@pytest.mark.parametrize("version", (4, 6))
+@pytest.mark.parametrize(
+    "query_type, target",
+    (
+        ("bgp_aspath", "_64513$"),
+        ("bgp_aspath", "_64999$"),
+        ("bgp_community", "65000:7"),
+    ),
+)
+def test_snapshot_matches_table_output(version, query_type, target):
+    """Snapshots answer regexp & community queries as FRR's table output."""
+    snapshot = stand_in_snapshot(version)
+    command = "regexp" if query_type == "bgp_aspath" else "community"
+
+    output = getattr(snapshot, query_type)(target)
+
+    assert output.startswith("BGP table version is 1")
+    command = f"show bgp ipv{version} unicast {command} {target}"
+    assert output == stand_in_output(command)
+
+
+@pytest.mark.parametrize("version, target", ((4, "16.0.1.1"), (6, "2001:db8:0:100::1")))
+def test_snapshot_matches_prefix_output(version, target):
+    """Snapshots answer route queries as the prefix's detail output."""
+    snapshot = stand_in_snapshot(version)
+    output = snapshot.bgp_route(target)
+
+    assert output.startswith("BGP routing table entry for")
+    assert output == stand_in_output(f"show bgp ipv{version} unicast {target}")
+
+
+def test_snapshot_table_includes_matching_paths_only():
+    """Only matching paths are rows, & the prefix is shown on the first."""
+    header, entries, table = parse_frr_table(MULTIPATH_ENTRY)
+    snapshot = RibSnapshot(entries, header=header, table=table)
+
+    first = snapshot.bgp_aspath("^65001_").splitlines()
+    assert first[0] == (
+        "BGP table version is 7, local router ID is 192.0.2.254, vrf id 0"
+    )
+    assert first[-3:] == [FIRST_PATH, "", "Displayed  1 routes and 2 total paths"]
+
+    second = snapshot.bgp_community("65000:2").splitlines()
+    assert second[-3:] == [SECOND_PATH, "", "Displayed  1 routes and 2 total paths"]
+
+    both = snapshot.bgp_aspath("_64500$").splitlines()
+    assert both[-4:-2] == [FIRST_PATH, SECOND_PATH[:3] + " " * 17 + SECOND_PATH[20:]]
+
+    assert snapshot.bgp_community("65000:3") == ""
@@ -0,0 +1,160 @@
+"""Test adaptive concurrency limits."""
+
+# Standard Library
+import asyncio
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.limiter import AdaptiveLimiter
+from hyperglass_agent.exceptions import QueueFull, QueueTimeout, ExecutionError
+
+
+def make_limiter(**kwargs):
+    """Create a limiter with small limits."""
+    settings = {
+        "minimum": 1,
+        "maximum": 8,
+        "queue_size": 4,
+        "queue_timeout": 1,
+        "tolerance": 2,
+    }
+    settings.update(kwargs)
+    return AdaptiveLimiter("ping", **settings)
+
+
+def test_queries_over_the_limit_wait_in_order(run):
+    """Queued queries are executed in order as slots are released."""
+    limiter = make_limiter(maximum=1)
+    started = []
+
+    async def query(name):
+        started.append(name)
+        await asyncio.sleep(0.01)
+
+    async def queries():
+        await asyncio.gather(*(limiter.run(query, name) for name in "abc"))
+
+    run(queries())
+
+    assert started == ["a", "b", "c"]
+    assert limiter.in_flight == 0
+    assert limiter.waiting == 0
+
+
+def test_full_queue_is_rejected(run):
+    """Queries are rejected once the queue is full."""
+    limiter = make_limiter(maximum=1, queue_size=1)
+
+    async def queries():
+        running = asyncio.ensure_future(limiter.run(asyncio.sleep, 0.05))
+        queued = asyncio.ensure_future(limiter.run(asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull) as err:
+            await limiter.run(asyncio.sleep, 0)
+        await asyncio.gather(running, queued)
+        return err.value
+
+    err = run(queries())
+
+    assert err.code == 429
+    assert err.retry_after >= 1
+    assert limiter.in_flight == 0
+
+
+def test_queue_timeout(run):
+    """Queries waiting longer than the queue timeout are rejected."""
+    limiter = make_limiter(maximum=1, queue_timeout=0.01)
+
+    async def queries():
+        running = asyncio.ensure_future(limiter.run(asyncio.sleep, 0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueTimeout):
+            await limiter.run(asyncio.sleep, 0)
+        await running
+
+    run(queries())
+
+    assert limiter.waiting == 0
+    assert limiter.in_flight == 0
+
+
+def test_limit_decreases_on_congestion_and_recovers():
+    """Slow or failed queries cut the limit, which then grows additively."""
+    limiter = make_limiter()
+
+    limiter.in_flight = 3
+    limiter.release(0.01)
+    limiter.release(0.1)
+    assert limiter.limit == 4
+    limiter.release(0.01, failed=True)
+    assert limiter.limit == 2
+
+    for _ in range(20):
+        limiter.in_flight += 1
+        limiter.release(0.01)
+
+    assert 2 < limiter.limit <= 8
+    assert limiter.baseline == pytest.approx(0.01, rel=0.3)
+
+
+def test_limit_is_bounded():
+    """The limit stays between the minimum & maximum."""
+    limiter = make_limiter(minimum=2)
+
+    for latency in (0.01, 1, 1, 1, 1):
+        limiter.in_flight += 1
+        limiter.release(latency)
+    assert limiter.limit == 2
+
+    for _ in range(100):
+        limiter.in_flight += 1
+        limiter.release(0.01)
+    assert limiter.limit == 8
+
+
+def test_execution_error_counts_as_congestion(run):
+    """Queries failing with an execution error cut the limit."""
+    limiter = make_limiter()
+
+    async def failing():
+        raise ExecutionError("Daemon unavailable")
+
+    with pytest.raises(ExecutionError):
+        run(limiter.run(failing))
+
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_query_is_not_a_latency_sample(run):
+    """Queries cancelled by their deadline release their slot unmeasured."""
+    limiter = make_limiter()
+
+    async def cancelled():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.run(asyncio.sleep, 1), 0.01)
+
+    run(cancelled())
+
+    assert limiter.in_flight == 0
+    assert limiter.baseline is None
+    assert limiter.latency is None
+    assert limiter.limit == 8
+
+
+def test_cancelled_queries_do_not_decrease_limit(run):
+    """A query slower than earlier cancelled ones isn't congestion."""
+    limiter = make_limiter()
+
+    async def queries():
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(limiter.run(asyncio.sleep, 1), 0.01)
+        await limiter.run(asyncio.sleep, 0.05)
+
+    run(queries())
+
+    assert limiter.baseline >= 0.05
+    assert limiter.limit == 8
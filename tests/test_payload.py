@@ -0,0 +1,85 @@
+"""Test response compression & JWT encoding."""
+
+# Standard Library
+import gzip
+import base64
+import random
+
+# Third Party
+import jwt
+import pytest
+
+# Project
+from hyperglass_agent.payload import compress, _jwt_decode, _jwt_encode
+from hyperglass_agent.exceptions import SecurityError
+
+# Compressible output, larger than the default minimum size.
+OUTPUT = "BGP routing table entry for 192.0.2.0/24\n" * 100
+
+
+def gunzip(compressed):
+    """Decode a base64-encoded gzip response."""
+    return gzip.decompress(base64.b64decode(compressed)).decode()
+
+
+def test_compress_first_supported_encoding(params):
+    """The first accepted encoding the agent supports is used."""
+    encoding, compressed = compress(OUTPUT, ["br", "gzip"], params)
+
+    assert encoding == "gzip"
+    assert len(compressed) < len(OUTPUT)
+    assert gunzip(compressed) == OUTPUT
+
+
+@pytest.mark.parametrize("accepted", ([], ["br"]))
+def test_compress_without_supported_encoding(params, accepted):
+    """Responses aren't compressed unless a supported encoding is accepted."""
+    assert compress(OUTPUT, accepted, params) == (None, OUTPUT)
+
+
+def test_compress_small_response(params):
+    """Responses smaller than the minimum size aren't compressed."""
+    assert compress(OUTPUT[:100], ["gzip"], params) == (None, OUTPUT[:100])
+
+
+def test_compress_incompressible_response(params):
+    """Responses which compression doesn't make smaller aren't compressed."""
+    # Only generates test data, & must be reproducible.
+    rng = random.Random(0)  # noqa: S311
+    output = "".join(chr(rng.randrange(33, 127)) for _ in range(2048))
+
+    assert compress(output, ["gzip"], params) == (None, output)
+
+
+def test_compress_disabled(params):
+    """Responses aren't compressed if compression is disabled."""
+    compression = params.compression.copy(update={"enable": False})
+    params = params.copy(update={"compression": compression})
+
+    assert compress(OUTPUT, ["gzip"], params) == (None, OUTPUT)
+
+
+def test_jwt_round_trip(params):
+    """Uncompressed responses are decoded unchanged, without an encoding."""
+    encoded = _jwt_encode(OUTPUT, params=params)
+    claims = jwt.decode(encoded, "test", algorithms=["HS256"])
+
+    assert _jwt_decode(encoded, params=params) == OUTPUT
+    assert "encoding" not in claims
+
+
+def test_jwt_compressed_payload(params):
+    """Compressed responses carry their encoding in the `encoding` claim."""
+    encoded = _jwt_encode(OUTPUT, ["gzip"], params=params)
+    claims = jwt.decode(encoded, "test", algorithms=["HS256"])
+
+    assert claims["encoding"] == "gzip"
+    assert gunzip(claims["payload"]) == OUTPUT
+
+
+def test_jwt_wrong_secret(params):
+    """Tokens signed with another secret are rejected."""
+    encoded = jwt.encode({"payload": OUTPUT}, "other", algorithm="HS256")
+
+    with pytest.raises(SecurityError):
+        _jwt_decode(encoded.decode(), params=params)
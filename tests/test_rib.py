@@ -0,0 +1,206 @@
+"""Test routing table snapshots & their indexes."""
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent.rib import (
+    RibEntry,
+    PrefixTrie,
+    RibSnapshot,
+    parse_prefix,
+    community_key,
+    plan_as_path_regex,
+)
+
+ENTRIES = (
+    RibEntry("10.0.0.0/8", "10.0.0.0/8 A", ("65001 64500",), ("65000:1",)),
+    RibEntry("10.1.0.0/16", "10.1.0.0/16 B", ("65002 64501",), ("65000:2",)),
+    RibEntry("10.1.1.0/24", "10.1.1.0/24 C", ("65001 64501",), ("65000:1",)),
+    RibEntry(
+        "2001:db8::/32",
+        "2001:db8::/32 D",
+        ("65001 64500", "65003 64502"),
+        ("65000:1", "65000:1:2"),
+    ),
+    RibEntry("invalid", "invalid E", ("65001",), ()),
+)
+
+
+def make_trie(prefixes):
+    """Create a trie of prefixes, each valued by itself."""
+    trie = PrefixTrie(32)
+    for prefix in prefixes:
+        trie.insert(*parse_prefix(prefix)[1:], prefix)
+    return trie
+
+
+@pytest.mark.parametrize(
+    "prefixes",
+    (
+        ("10.0.0.0/8", "10.1.0.0/16", "10.1.1.0/24", "10.2.0.0/16", "0.0.0.0/0"),
+        ("10.1.1.0/24", "10.2.0.0/16", "0.0.0.0/0", "10.1.0.0/16", "10.0.0.0/8"),
+    ),
+)
+def test_trie_lookups(prefixes):
+    """Lookups are independent of the order prefixes are inserted in."""
+    trie = make_trie(prefixes)
+
+    assert len(trie) == 5
+    assert trie.longest(*parse_prefix("10.1.1.1")[1:]) == "10.1.1.0/24"
+    assert trie.longest(*parse_prefix("10.1.2.1")[1:]) == "10.1.0.0/16"
+    assert trie.longest(*parse_prefix("192.0.2.1")[1:]) == "0.0.0.0/0"
+    assert trie.exact(*parse_prefix("10.1.0.0/16")[1:]) == "10.1.0.0/16"
+    assert trie.exact(*parse_prefix("10.3.0.0/16")[1:]) is None
+    assert trie.covering(*parse_prefix("10.1.1.0/24")[1:]) == [
+        "0.0.0.0/0",
+        "10.0.0.0/8",
+        "10.1.0.0/16",
+        "10.1.1.0/24",
+    ]
+
+
+def test_trie_replaces_values():
+    """Inserting a stored prefix replaces its value without growing the trie."""
+    trie = make_trie(("10.0.0.0/8", "10.1.0.0/16"))
+    trie.insert(*parse_prefix("10.0.0.0/8")[1:], "replaced")
+
+    assert len(trie) == 2
+    assert trie.exact(*parse_prefix("10.0.0.0/8")[1:]) == "replaced"
+
+
+def test_trie_branch_nodes_have_no_value():
+    """Nodes where prefixes diverge aren't prefixes themselves."""
+    trie = make_trie(("10.1.0.0/16", "10.2.0.0/16"))
+
+    assert len(trie) == 2
+    assert trie.exact(*parse_prefix("10.0.0.0/14")[1:]) is None
+    assert trie.longest(*parse_prefix("10.3.0.1")[1:]) is None
+
+
+@pytest.mark.parametrize(
+    "community,key",
+    (
+        ("65000:01", "65000:1"),
+        ("no-export", "65535:65281"),
+        ("65000:1:2", "65000:1:2"),
+        ("RT:192.0.2.1:100", "rt:192.0.2.1:100"),
+        ("65000", None),
+        ("foo:1", None),
+    ),
+)
+def test_community_key(community, key):
+    """Communities are normalized to the format they are indexed in."""
+    assert community_key(community) == key
+
+
+def test_plan_as_path_regex():
+    """Only delimited ASNs of literal expressions are required."""
+    assert plan_as_path_regex("^65001_64500$") == {
+        "first": 65001,
+        "origin": 64500,
+        "anywhere": {65001, 64500},
+    }
+    assert plan_as_path_regex("_6500") == {
+        "first": None,
+        "origin": None,
+        "anywhere": set(),
+    }
+    assert plan_as_path_regex("^6500[12]_") is None
+
+
+def test_snapshot_bgp_route():
+    """Routes are matched by prefix, longest match, or covering prefixes."""
+    snapshot = RibSnapshot(ENTRIES, header="Header")
+
+    assert len(snapshot) == 4
+    assert snapshot.bgp_route("10.1.1.0/24") == "Header\n10.1.1.0/24 C"
+    assert snapshot.bgp_route("10.1.2.3") == "Header\n10.1.0.0/16 B"
+    assert snapshot.bgp_route("10.1.1.0/24", covering=True) == (
+        "Header\n10.0.0.0/8 A\n10.1.0.0/16 B\n10.1.1.0/24 C"
+    )
+    assert snapshot.bgp_route("10.2.0.0/16") == ""
+    assert snapshot.bgp_route("not a prefix") is None
+
+
+def test_snapshot_bgp_aspath():
+    """Entries with any matching path are output whole."""
+    snapshot = RibSnapshot(ENTRIES)
+
+    assert snapshot.bgp_aspath("_64500$") == "10.0.0.0/8 A\n2001:db8::/32 D"
+    assert snapshot.bgp_aspath("^65001_") == (
+        "10.0.0.0/8 A\n10.1.1.0/24 C\n2001:db8::/32 D"
+    )
+    assert snapshot.bgp_aspath("[= 65002 * =]", mask=True) == "10.1.0.0/16 B"
+    assert snapshot.bgp_aspath("[= * 6450? =]", mask=True) is None
+    assert snapshot.bgp_aspath("_6450[0-9]_") is None
+
+
+def test_snapshot_bgp_community():
+    """Entries are found through the community index."""
+    snapshot = RibSnapshot(ENTRIES)
+
+    assert snapshot.bgp_community("65000:01") == (
+        "10.0.0.0/8 A\n10.1.1.0/24 C\n2001:db8::/32 D"
+    )
+    assert snapshot.bgp_community("65000:1:2") == "2001:db8::/32 D"
+    assert snapshot.bgp_community("65000:3") == ""
+    assert snapshot.bgp_community("not a community") is None
+
+
+def test_snapshot_bgp_community_standard():
+    """Only standard communities are looked up for FRR's `community` command."""
+    snapshot = RibSnapshot(ENTRIES)
+
+    assert snapshot.bgp_community("65000:01", standard=True) == (
+        "10.0.0.0/8 A\n10.1.1.0/24 C\n2001:db8::/32 D"
+    )
+    assert snapshot.bgp_community("no-export", standard=True) == ""
+    assert snapshot.bgp_community("65000:1:2", standard=True) is None
+    assert snapshot.bgp_community("rt:65000:1", standard=True) is None
+
+
+def test_snapshot_discards_large_community_index():
+    """Community queries aren't answered once the index is discarded."""
+    snapshot = RibSnapshot(ENTRIES, community_index_size=1)
+
+    assert snapshot.stats()["community_index_complete"] is False
+    assert snapshot.stats()["community_index_size"] == 0
+    assert snapshot.bgp_community("65000:1") is None
+
+
+def test_snapshot_discards_large_table():
+    """Snapshots whose output exceeds their maximum size hold no entries."""
+    snapshot = RibSnapshot(ENTRIES, max_size=30)
+
+    assert snapshot.complete is False
+    assert len(snapshot) == 0
+    assert snapshot.stats()["size"] == 0
+    assert snapshot.bgp_route("10.0.0.0/8") == ""
+
+    snapshot = RibSnapshot(ENTRIES, max_size=60)
+
+    assert snapshot.complete is True
+    assert snapshot.stats()["size"] == 53
+
+
+def test_snapshot_table_renderer():
+    """A table renderer is given the matching entries & a path predicate."""
+    rendered = []
+
+    def table(entries, matches):
+        rendered.extend((entry.prefix, matches) for entry in entries)
+        return "table"
+
+    snapshot = RibSnapshot(ENTRIES, table=table)
+
+    assert snapshot.bgp_aspath("_64502$") == "table"
+    assert [prefix for prefix, _ in rendered] == ["2001:db8::/32"]
+
+    class Path:
+        def __init__(self, as_path):
+            self.as_path = as_path
+
+    matches = rendered[0][1]
+    assert matches(Path("65003 64502"))
+    assert not matches(Path("65001 64500"))
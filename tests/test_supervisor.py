@@ -0,0 +1,155 @@
+"""Test restarting & signalling of forked workers."""
+
+# Standard Library
+import os
+import time
+import signal
+from types import SimpleNamespace
+
+# Third Party
+import pytest
+
+# Project
+from hyperglass_agent import execute
+from hyperglass_agent.api import supervisor
+from hyperglass_agent.api.supervisor import Supervisor
+
+CONFIG = SimpleNamespace(host="127.0.0.1", port=0)
+
+
+class RecordingSupervisor(Supervisor):
+    """Supervisor whose workers record their starts & signals, without serving."""
+
+    def __init__(self, directory, crashes=0):
+        """Initialize a supervisor of one worker, which crashes `crashes` times."""
+        super().__init__(CONFIG, 1)
+        self.directory = directory
+        self.crashes = crashes
+
+    def _run_server(self, index):
+        """Record the worker's start, then crash or wait to be stopped."""
+        signal.signal(signal.SIGHUP, lambda *_: record(self.directory / "hups"))
+
+        starts = record(self.directory / "starts")
+        if len(starts) <= self.crashes:
+            raise RuntimeError("Worker crashed")
+
+        while True:
+            signal.pause()
+
+
+def record(path):
+    """Append the current process's pid to a file.
+
+    Returns:
+        {list} -- Recorded pids
+    """
+    with path.open("a") as file:
+        file.write(f"{os.getpid()}\n")
+    return read(path)
+
+
+def read(path):
+    """Read the pids recorded in a file."""
+    return [int(pid) for pid in path.read_text().split()] if path.exists() else []
+
+
+def wait_for(path, count, timeout=10):
+    """Wait until a file has `count` recorded pids.
+
+    Returns:
+        {list} -- Recorded pids
+    """
+    deadline = time.monotonic() + timeout
+    while len(read(path)) < count:
+        assert time.monotonic() < deadline, f"{path.name}: {read(path)}"
+        time.sleep(0.01)
+    return read(path)
+
+
+@pytest.fixture
+def supervise(monkeypatch):
+    """Run supervisors in forked processes, & stop them after each test."""
+    monkeypatch.setattr(supervisor, "MAX_RESTART_DELAY", 0)
+    pids = []
+
+    def fork(instance):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                instance.run()
+                code = 0
+            finally:
+                os._exit(code)
+        pids.append(pid)
+        return pid
+
+    yield fork
+
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+
+
+def stop(pid):
+    """Stop a supervisor.
+
+    Returns:
+        {int} -- Exit status
+    """
+    os.kill(pid, signal.SIGTERM)
+    return os.waitpid(pid, 0)[1]
+
+
+def test_restart_delay_doubles(monkeypatch):
+    """Workers exiting soon after starting are restarted after longer delays."""
+    instance = Supervisor(CONFIG, 1)
+    delays = []
+    monkeypatch.setattr(time, "sleep", delays.append)
+    monkeypatch.setattr(instance, "_spawn", lambda index: None)
+
+    def exit_after(uptime):
+        instance._started[0] = time.monotonic() - uptime
+        instance._restart(0, 256)
+
+    for _ in range(7):
+        exit_after(0)
+    exit_after(supervisor.MIN_UPTIME)
+    exit_after(0)
+
+    assert delays == [1, 2, 4, 8, 16, 30, 30, 0, 1]
+
+
+def test_crashed_worker_is_restarted(supervise, tmp_path):
+    """Workers are restarted until one runs, & stopped with the supervisor."""
+    pid = supervise(RecordingSupervisor(tmp_path, crashes=2))
+
+    starts = wait_for(tmp_path / "starts", 3)
+
+    assert len(set(starts)) == 3
+    assert stop(pid) == 0
+    with pytest.raises(ProcessLookupError):
+        os.kill(starts[-1], 0)
+
+
+def test_reload_is_forwarded_to_workers(supervise, tmp_path, monkeypatch):
+    """SIGHUP is forwarded to workers, & restarted workers reload the config."""
+    monkeypatch.setattr(
+        execute, "refresh_runtime", lambda: record(tmp_path / "refreshes")
+    )
+    pid = supervise(RecordingSupervisor(tmp_path))
+    worker = wait_for(tmp_path / "starts", 1)[0]
+
+    os.kill(pid, signal.SIGHUP)
+    assert wait_for(tmp_path / "hups", 1) == [worker]
+    assert read(tmp_path / "refreshes") == []
+
+    os.kill(worker, signal.SIGKILL)
+    restarted = wait_for(tmp_path / "starts", 2)[1]
+
+    assert read(tmp_path / "refreshes") == [restarted]
+    assert stop(pid) == 0
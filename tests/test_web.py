@@ -0,0 +1,298 @@
+"""Test the query, batch, stream, metrics & admin endpoints."""
+
+# Standard Library
+import json
+import asyncio
+
+# Third Party
+import jwt
+import httpx
+import pytest
+
+# Project
+from hyperglass_agent import config, execute
+from hyperglass_agent.api import web
+from hyperglass_agent.payload import _jwt_decode
+from hyperglass_agent.exceptions import ResponseEmpty, ExecutionError
+
+QUERY = {
+    "query_type": "bgp_route",
+    "vrf": "default",
+    "afi": "ipv4_default",
+    "target": "192.0.2.1",
+}
+
+
+def make_query(target, **fields):
+    """Create a query of a target."""
+    return dict(QUERY, target=target, **fields)
+
+
+def encode(payload, signing_key=None):
+    """Sign a request payload, with the configured secret by default."""
+    if signing_key is None:
+        signing_key = config.params.secret.get_secret_value()
+    token = jwt.encode({"payload": json.dumps(payload)}, signing_key, "HS256")
+    return {"encoded": token.decode()}
+
+
+def decode(encoded):
+    """Decode a signed response payload."""
+    return _jwt_decode(encoded, params=config.params)
+
+
+@pytest.fixture
+def post(run):
+    """Post a signed payload to an endpoint.
+
+    Returns:
+        {callable} -- Posts a payload & returns the response
+    """
+
+    async def send(path, payload, signing_key=None):
+        async with httpx.AsyncClient(app=web.api, base_url="http://agent") as client:
+            return await client.post(path, json=encode(payload, signing_key))
+
+    return lambda path, payload, **kwargs: run(send(path, payload, **kwargs))
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    """Answer queries with their target after a delay given by their target.
+
+    Targets starting with `error` raise ResponseEmpty instead.
+
+    Returns:
+        {list} -- Targets in the order their queries completed
+    """
+    completed = []
+
+    async def run_query(query, runtime=None):
+        name, _, delay = query.target.partition(":")
+        await asyncio.sleep(float(delay or 0))
+        completed.append(query.target)
+        if name == "error":
+            raise ResponseEmpty("No output for {target}", target=query.target)
+        return f"output of {query.target}"
+
+    monkeypatch.setattr(web, "run_query", run_query)
+    return completed
+
+
+def parse_events(text):
+    """Parse server-sent events.
+
+    Returns:
+        {list} -- Event types & decoded data
+    """
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = (line.split(": ", 1)[1] for line in block.splitlines())
+        events.append((event, decode(data)))
+    return events
+
+
+def test_query(post, executed):
+    """Queries are answered with their signed output."""
+    response = post("/query/", QUERY)
+
+    assert response.status_code == 200
+    assert decode(response.json()["encoded"]) == "output of 192.0.2.1"
+
+
+def test_query_wrong_secret(post, executed):
+    """Queries signed with another secret are rejected before they are run."""
+    response = post("/query/", QUERY, signing_key="other")
+
+    assert response.status_code == 500
+    assert response.json() == {"error": "Signature verification failed"}
+    assert executed == []
+
+
+def test_batch_keeps_query_order(post, executed):
+    """Results are in the order of the queries, not of their completion."""
+    targets = ["a:0.03", "b:0.01", "c:0.02"]
+    response = post("/query/batch/", [make_query(target) for target in targets])
+    results = json.loads(decode(response.json()["encoded"]))
+
+    assert executed == ["b:0.01", "c:0.02", "a:0.03"]
+    assert results == [{"output": f"output of {target}"} for target in targets]
+
+
+def test_batch_partial_failure(post, executed):
+    """Failed & invalid queries return their own errors, without failing others."""
+    queries = [
+        make_query("a"),
+        make_query("error"),
+        {"query_type": "bgp_route", "target": "b"},
+        make_query("c", query_type="unsupported"),
+    ]
+    response = post("/query/batch/", {"queries": queries})
+    results = json.loads(decode(response.json()["encoded"]))
+
+    assert response.status_code == 200
+    assert results[0] == {"output": "output of a"}
+    assert results[1] == {"error": "No output for error", "code": 204}
+    assert results[2]["code"] == 400
+    assert results[3]["code"] == 400
+    assert executed == ["a", "error"]
+
+
+def test_batch_too_large(post, executed):
+    """Batches larger than the maximum are rejected whole."""
+    response = post("/query/batch/", [QUERY] * 33)
+
+    assert response.status_code == 400
+    assert executed == []
+
+
+def stream_of(*chunks, error=None):
+    """Create a stream_query replacement yielding chunks, then raising an error."""
+
+    async def stream_query(query, runtime=None):
+        for chunk in chunks:
+            await asyncio.sleep(0)
+            yield chunk
+        if error is not None:
+            raise error
+
+    return stream_query
+
+
+def test_stream_events(post, monkeypatch):
+    """Output is streamed as signed events, ending with an end event."""
+    monkeypatch.setattr(web, "stream_query", stream_of("first\n", "second\n"))
+    response = post("/query/stream/", QUERY)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert parse_events(response.text) == [
+        ("output", "first\n"),
+        ("output", "second\n"),
+        ("end", ""),
+    ]
+
+
+def test_stream_error_after_output(post, monkeypatch):
+    """Errors after output has started are sent as an error event."""
+    error = ExecutionError("Process exited")
+    monkeypatch.setattr(web, "stream_query", stream_of("first\n", error=error))
+    response = post("/query/stream/", QUERY)
+
+    assert response.status_code == 200
+    assert parse_events(response.text) == [
+        ("output", "first\n"),
+        ("error", "Process exited"),
+        ("end", ""),
+    ]
+
+
+def test_stream_error_before_output(post, monkeypatch):
+    """Errors before any output are returned as HTTP errors."""
+    error = ExecutionError("Process exited")
+    monkeypatch.setattr(web, "stream_query", stream_of(error=error))
+    response = post("/query/stream/", QUERY)
+
+    assert response.status_code == error.code
+    assert response.json() == {"error": "Process exited"}
+
+
+def test_stream_cancelled_on_disconnect(run, monkeypatch):
+    """The streamed query is closed once the client disconnects."""
+    monkeypatch.setattr(web, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+    async def stream():
+        closed = asyncio.Event()
+
+        async def endless(query, runtime=None):
+            try:
+                yield "first\n"
+                await asyncio.sleep(60)
+                yield "never"
+            finally:
+                closed.set()
+
+        monkeypatch.setattr(web, "stream_query", endless)
+
+        body = json.dumps(encode(QUERY)).encode()
+        received = asyncio.Event()
+        sent = []
+
+        async def receive():
+            if not sent:
+                sent.append(body)
+                return {"type": "http.request", "body": body, "more_body": False}
+            await received.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message.get("body"):
+                received.set()
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/query/stream/",
+            "headers": [(b"content-type", b"application/json")],
+            "query_string": b"",
+        }
+        await asyncio.wait_for(web.api(scope, receive, send), 5)
+        return closed.is_set()
+
+    assert run(stream()) is True
+
+
+def test_metrics(post, executed, run):
+    """Metrics are exposed in the text format, & count errors by type."""
+
+    async def get():
+        async with httpx.AsyncClient(app=web.api, base_url="http://agent") as client:
+            return await client.get("/metrics")
+
+    def errors(text):
+        prefix = 'hyperglass_agent_errors_total{error="ResponseEmpty",'
+        lines = [line for line in text.splitlines() if line.startswith(prefix)]
+        return sum(float(line.rsplit(" ", 1)[1]) for line in lines)
+
+    before = run(get())
+    post("/query/", make_query("error"))
+    after = run(get())
+
+    assert after.status_code == 200
+    assert after.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    assert "# TYPE hyperglass_agent_query_seconds histogram" in after.text
+    assert errors(after.text) == errors(before.text) + 1
+
+
+def test_reload_swaps_runtime(post, config_file):
+    """Reloading builds a new runtime, & lists settings needing a restart."""
+    previous = execute.current_runtime()
+    config_file(port=9000, not_found_message="Missing {target}")
+
+    response = post("/admin/reload/", {"action": "reload"})
+    result = json.loads(decode(response.json()["encoded"]))
+
+    assert result == {"action": "reload", "restart_required": ["port"]}
+    assert execute.current_runtime() is not previous
+    assert execute.current_runtime().params.not_found_message == "Missing {target}"
+    assert config.params.not_found_message == "Missing {target}"
+
+
+def test_reload_requires_secret(post, config_file):
+    """Reload requests must be signed with the active secret."""
+    previous = execute.current_runtime()
+
+    response = post("/admin/reload/", {"action": "reload"}, signing_key="other")
+
+    assert response.status_code == 500
+    assert execute.current_runtime() is previous
+
+
+def test_reload_invalid_config(post, config_file):
+    """The active runtime is kept if the config file is invalid."""
+    previous = execute.current_runtime()
+    config_file(workers=0)
+
+    response = post("/admin/reload/", {"action": "reload"})
+
+    assert response.status_code >= 400
+    assert execute.current_runtime() is previous